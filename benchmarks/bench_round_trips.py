@@ -0,0 +1,170 @@
+"""
+Stub round-trips, bytes and operations/sec of the rw_memory / rw_registers / breakpoint API, against the simulated
+target of tests/fake_gdb.py with a fixed latency on every packet.
+Run with: python benchmarks/bench_round_trips.py [--target qemu] [--latency 0.0005] [--output after.json]
+                                                  [--compare before.json]
+
+Every operation is measured twice:
+    cold - the target stopped again right before each call (a 'stepi' that isn't counted), so caches are empty
+    warm - the calls follow each other in the same stop
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+BENCHMARKS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIRECTORY))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCHMARKS_DIRECTORY), 'tests'))
+
+import fake_gdb  # noqa: E402
+from fake_target import VMWARE, QEMU, FakeTarget  # noqa: E402
+
+MODES = ('cold', 'warm')
+# Deterministic for a given tree, so --compare reports any change in them
+COUNTED_METRICS = ('round_trips_per_op', 'bytes_per_op')
+
+DATA = (0x600000, 0x300000)
+DATA_SIZE = 0x10000
+CODE = (0x401000, 0x200000)
+READ_BYTES_LENGTHS = (1, 8, 0x100, 0x1000, DATA_SIZE)
+
+
+def load_guest(target: FakeTarget) -> None:
+    """
+    A long-mode guest with 64 KiB of data, stopped in its code
+    :return:
+    """
+    target.map_virtual(*CODE, data=b'\xC3' * 0x100)
+    target.map_virtual(*DATA, length=DATA_SIZE, data=bytes(range(256)) * (DATA_SIZE // 256))
+    target.registers.update(rip=CODE[0], rsp=DATA[0] + DATA_SIZE - 0x100, eflags=0x246, cs=0x33, ss=0x2B)
+    target.system['gdtr'] = (DATA[0], 0x37)
+    target.system['idtr'] = (DATA[0] + 0x1000, 0xFFF)
+    return
+
+
+def operations(gdbp) -> dict:
+    """
+    :return dict: name: callable, for everything that is measured
+    """
+    ops = {}
+    for length in READ_BYTES_LENGTHS:
+        ops[f'read_bytes({hex(length)})'] = lambda length=length: gdbp.read_bytes(DATA[0], length)
+    for bits in (8, 16, 32, 64):
+        ops[f'read{bits}'] = lambda reader=getattr(gdbp, f'read{bits}'): reader(DATA[0] + 0x10)
+    for name in ('cr0', 'cr2', 'cr3', 'cr4', 'efer', 'gdtr', 'idtr', 'ldtr'):
+        ops[f'get_{name}'] = getattr(gdbp, f'get_{name}')
+
+    # Setters write back what the register already holds, so the guest doesn't change between calls
+    for name in gdbp.REGISTERS:
+        getter, setter = getattr(gdbp, f'get_{name}'), getattr(gdbp, f'set_{name}')
+        ops[f'get_{name}'] = getter
+        ops[f'set_{name}'] = lambda getter=getter, setter=setter, value=getter(): setter(value)
+
+    # GDB inserts the Z1 packet when the target resumes, so this is the cost of creating and deleting it
+    ops['hw_bp'] = lambda: gdbp.delete_bp(gdbp.hw_bp(CODE[0] + 0x10))
+    return ops
+
+
+def measure(target: FakeTarget, op, iterations: int, cold: bool) -> dict:
+    """
+    :return dict: round trips and bytes per call, calls per second (of the time spent inside the calls)
+    """
+    round_trips = transferred = 0
+    elapsed = 0.0
+    for _ in range(iterations):
+        if cold:
+            fake_gdb.execute('stepi')
+        target.reset_counters()
+        started = time.perf_counter()
+        op()
+        elapsed += time.perf_counter() - started
+        round_trips += target.round_trips
+        transferred += target.bytes_sent + target.bytes_received
+    return {'round_trips_per_op': round(round_trips / iterations, 3),
+            'bytes_per_op': round(transferred / iterations, 1),
+            'ops_per_second': round(iterations / elapsed, 1) if elapsed else None}
+
+
+def run(personality: str, latency: float, iterations: int, pattern: str = None) -> dict:
+    target = FakeTarget(personality, latency)
+    target.record = False
+    target.program = load_guest
+    fake_gdb.install(target)
+    fake_gdb.execute('run')
+
+    import gdbp
+    gdbp.init_rw_memory()
+
+    results = {}
+    for name, op in operations(gdbp).items():
+        if pattern and not re.search(pattern, name):
+            continue
+        try:
+            op()
+        except Exception as e:
+            results[name] = {'error': f'{type(e).__name__}: {e}'}
+            continue
+        results[name] = {mode: measure(target, op, iterations, mode == 'cold') for mode in MODES}
+
+    return {'target': personality, 'latency': latency, 'iterations': iterations, 'operations': results}
+
+
+def print_table(report: dict) -> None:
+    print(f"{'operation':<24}" + ''.join(f'{mode + " trips":>12}{mode + " bytes":>12}{mode + " ops/s":>12}'
+                                         for mode in MODES))
+    for name, result in report['operations'].items():
+        if 'error' in result:
+            print(f"{name:<24}{result['error']}")
+            continue
+        print(f'{name:<24}' + ''.join(f"{result[mode]['round_trips_per_op']:>12}{result[mode]['bytes_per_op']:>12}"
+                                      f"{result[mode]['ops_per_second'] or '-':>12}" for mode in MODES))
+    return
+
+
+def print_comparison(before: dict, after: dict) -> None:
+    """
+    Round trips and bytes are deterministic, so any difference is a real change; ops/sec is noise unless it is large
+    """
+    if before['target'] != after['target']:
+        print(f"Comparing a {before['target']} report with a {after['target']} one")
+    changed = False
+    for name, result in after['operations'].items():
+        previous = before['operations'].get(name)
+        if previous is None or 'error' in result or 'error' in previous:
+            continue
+        for mode in MODES:
+            for metric in COUNTED_METRICS:
+                old, new = previous[mode][metric], result[mode][metric]
+                if old != new:
+                    changed = True
+                    print(f'{name:<24}{mode:<6}{metric:<20}{old:>12} -> {new}')
+    if not changed:
+        print('No change in round trips or bytes')
+    return
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', choices=(VMWARE, QEMU), default=VMWARE)
+    parser.add_argument('--latency', type=float, default=0.0002, help='Seconds the stub takes to answer a packet')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--filter', help='Only the operations matching this regular expression')
+    parser.add_argument('--output', help='Write the JSON report here')
+    parser.add_argument('--compare', help='A JSON report to compare against')
+    args = parser.parse_args()
+
+    report = run(args.target, args.latency, args.iterations, args.filter)
+    print_table(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Per-hit cost of counting breakpoint hits: a Python stop() callback against trace_hits().
+Run with: gdb -q -batch -x benchmarks/bench_trace_hits.py [-ex 'py HITS = 50000']
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import gdb
+
+BENCHMARKS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIRECTORY))
+
+import gdbp  # noqa: E402
+
+HITS = globals().get('HITS', 20000)
+SOURCE = os.path.join(BENCHMARKS_DIRECTORY, 'trace_loop.c')
+TRACED_FUNCTION = 'traced_function'
+
+
+class CountingBreakpoint(gdb.Breakpoint):
+    """
+    The usual way - a Python callback on every hit
+    """
+
+    def __init__(self, spec: str):
+        super(CountingBreakpoint, self).__init__(spec, internal=True)
+        self.hits = 0
+
+    def stop(self):
+        self.hits += 1
+        return False
+
+
+def build(directory: str) -> str:
+    binary = os.path.join(directory, 'trace_loop')
+    subprocess.check_call(['gcc', '-O1', '-g', '-no-pie', '-o', binary, SOURCE])
+    return binary
+
+
+def run_to_exit() -> float:
+    started = time.perf_counter()
+    # Not to_string - it would capture the dprintf samples before they reach the log file
+    gdb.execute(f'run {HITS}')
+    return time.perf_counter() - started
+
+
+def main():
+    gdb.execute('set pagination off')
+    gdb.execute('set confirm off')
+    with tempfile.TemporaryDirectory() as directory:
+        gdb.execute(f'file {build(directory)}', to_string=True)
+        # There is no process yet - gdb.lookup_symbol (get_symbol_address) needs a frame
+        address = int(gdb.parse_and_eval(f'&{TRACED_FUNCTION}'))
+        baseline = run_to_exit()
+        results = []
+
+        bp = CountingBreakpoint(f'*{hex(address)}')
+        seconds = run_to_exit()
+        results.append(('Python stop() callback', seconds, bp.hits))
+        bp.delete()
+
+        tracer = gdbp.trace_hits([address])
+        seconds = run_to_exit()
+        results.append(('trace_hits (ignore count)', seconds, tracer.counts()[address]))
+        tracer.stop()
+
+        tracer = gdbp.trace_hits([address], registers=('rdi',), log_path=os.path.join(directory, 'trace.log'))
+        seconds = run_to_exit()
+        tracer.stop()
+        results.append(('trace_hits (dprintf, 1 register)', seconds, len(tracer.samples[address])))
+
+    print(f'{HITS} hits, {baseline:.3f}s without breakpoints')
+    for name, seconds, hits in results:
+        per_hit = (seconds - baseline) / max(hits, 1) * 1e6
+        print(f'{name:<36} {seconds:8.3f}s  {hits:>8} hits  {per_hit:8.1f} us/hit')
+
+
+main()
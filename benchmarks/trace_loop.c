@@ -0,0 +1,17 @@
+#include <stdlib.h>
+
+void __attribute__((noinline)) traced_function(long iteration)
+{
+	asm volatile ("" : : "r" (iteration));
+}
+
+int main(int argc, char **argv)
+{
+	long iterations = argc > 1 ? atol(argv[1]) : 10000;
+
+	for (long i = 0; i < iterations; i++) {
+		traced_function(i);
+	}
+
+	return 0;
+}
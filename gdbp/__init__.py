@@ -13,3 +13,11 @@ sys.path.append(directory)
 from .general import *
 from .rw_memory import *
 from .rw_registers import *
+from .paging import *
+from .dump import *
+from .structs import *
+from .snapshot import *
+from .rsp import *
+from .parallel import *
+from .breakpoints import *
+from .descriptors import *
@@ -0,0 +1,345 @@
+"""
+Asyncio memory and register access over direct stub connections, so one event loop can drive many gdbstubs at once.
+Once the stub agrees to no-ack mode, packets are pipelined - several are in flight on a connection at a time.
+"""
+import asyncio
+import binascii
+import collections
+import re
+
+from .general import VMWARE_MONITOR_OUT
+from .rsp import (PACKET_TIMEOUT, GdbpRspError, RspMemoryError, SocketRspChannel, is_error_reply,
+                  parse_stub_address)
+from .rw_memory import READ_MANY_MAX_GAP, _decode_run, _fallback_spans, _plan_reads
+from .standalone import TARGET_XML, register_layout
+
+# Packets in flight on one connection. The stub answers them in order
+MAX_IN_FLIGHT = 8
+STREAM_LIMIT = 0x100000
+
+_HREF_PATTERN = re.compile(rb'href="([^"]+)"')
+
+
+class AsyncRspChannel:
+    """
+    Connection straight to a gdbstub, for asyncio code. Create it with ``await connect(address)``
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, max_in_flight: int,
+                 vmware=None):
+        self.reader = reader
+        self.writer = writer
+        self.max_in_flight = max_in_flight
+        # Until no-ack mode is on, a lost packet is resent - so only one may be in flight
+        self.in_flight = asyncio.Semaphore(1)
+        self.pending = collections.deque()
+        self.ack = True
+        self.last_packet = None
+        self.packet_size = 0x1000
+        self.architecture = None
+        self.registers = {}
+        # The ``_receive`` task, and why it stopped
+        self.receiver = None
+        self.error = None
+        # VMware's stub (True) or QEMU's (False). None = ask the stub when it matters
+        self.vmware = vmware
+
+    async def _read_packet(self) -> bytes:
+        while True:
+            byte = await self.reader.readexactly(1)
+            if byte == b'-' and self.last_packet is not None:
+                self.writer.write(self.last_packet)
+            if byte != b'$':
+                continue
+
+            payload = (await self.reader.readuntil(b'#'))[:-1]
+            checksum = int(await self.reader.readexactly(2), 16)
+            if checksum == sum(payload) & 0xFF:
+                if self.ack:
+                    self.writer.write(b'+')
+                return SocketRspChannel._decode(bytearray(payload))
+            if self.ack:
+                self.writer.write(b'-')
+
+    async def _receive(self) -> None:
+        """
+        Hand every reply to the oldest request still waiting - the stub answers in order
+        """
+        try:
+            while True:
+                payload = await self._read_packet()
+                if not self.pending:
+                    # Unsolicited, e.g. a late stop reply
+                    continue
+                future, output = self.pending[0]
+                if output is not None and payload.startswith(b'O') and payload != b'OK':
+                    output.append(binascii.unhexlify(payload[1:]))
+                    continue
+                self.pending.popleft()
+                if not future.done():
+                    future.set_result(payload)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError) as exception:
+            self.error = GdbpRspError(f"The connection to the stub failed: {exception!r}")
+            while self.pending:
+                future, _ = self.pending.popleft()
+                if not future.done():
+                    future.set_exception(self.error)
+
+    async def send(self, packet: str, output: list = None) -> bytes:
+        """
+        :param str packet: Packet payload, without the '$' and checksum framing
+        :param list output: Collects the payloads of 'O' (console output) packets sent before the reply
+        :return bytes: Payload of the reply
+        """
+        framed = SocketRspChannel._frame(packet.encode('latin-1'))
+        async with self.in_flight:
+            # Nothing would ever answer - the receiver is gone
+            if self.receiver is not None and self.receiver.done():
+                raise self.error or GdbpRspError("The connection to the stub is closed")
+            future = asyncio.get_running_loop().create_future()
+            self.pending.append((future, output))
+            self.last_packet = framed
+            self.writer.write(framed)
+            return await future
+
+    async def monitor(self, command: str) -> str:
+        """
+        :return str: Output of the monitor command ("monitor <command>" in GDB)
+        """
+        output = []
+        reply = await self.send('qRcmd,' + binascii.hexlify(command.encode()).decode(), output)
+        if not reply:
+            raise GdbpRspError("The stub doesn't support monitor commands")
+        if is_error_reply(reply):
+            raise GdbpRspError(f"monitor {command} failed: {reply.decode('latin-1')}")
+        if reply != b'OK':
+            output.append(binascii.unhexlify(reply))
+        return b''.join(output).decode('latin-1')
+
+    def max_memory_payload(self) -> int:
+        # 'm' replies are hex - two characters per byte
+        return max((self.packet_size - 32) // 2, 1)
+
+    async def _read_chunk(self, address: int, length: int) -> bytes:
+        reply = await self.send(f'm{address:x},{length:x}')
+        if is_error_reply(reply) or not reply:
+            raise RspMemoryError(f'Cannot access memory at address {hex(address)}')
+        return binascii.unhexlify(reply)
+
+    async def read_memory(self, address: int, length: int) -> bytes:
+        """
+        :return bytes: ``length`` bytes at ``address``. Reads longer than a packet are pipelined
+        """
+        step = self.max_memory_payload()
+        chunks = await asyncio.gather(*(self._read_chunk(chunk, min(step, address + length - chunk))
+                                        for chunk in range(address, address + length, step)))
+        return b''.join(chunks)
+
+    async def write_memory(self, address: int, data: bytes) -> None:
+        data = bytes(data)
+        step = self.max_memory_payload()
+        replies = await asyncio.gather(*(
+            self.send(f'M{address + offset:x},{len(data[offset:offset + step]):x}:'
+                      f'{binascii.hexlify(data[offset:offset + step]).decode()}')
+            for offset in range(0, len(data), step)))
+        for offset, reply in zip(range(0, len(data), step), replies):
+            if reply != b'OK':
+                raise RspMemoryError(f'Cannot access memory at address {hex(address + offset)}')
+        return
+
+    async def is_vmware(self) -> bool:
+        """
+        :return bool: Whether the stub is VMware's - asked once ("monitor help"), unless ``connect`` was told
+        """
+        if self.vmware is None:
+            try:
+                self.vmware = await self.monitor("help") == VMWARE_MONITOR_OUT
+            except GdbpRspError:
+                self.vmware = False
+        return self.vmware
+
+    async def set_phys_mode(self, phys: bool) -> None:
+        """
+        Switch the stub to physical (True) or virtual (False) memory
+        :return:
+        """
+        if await self.is_vmware():
+            await self.monitor("phys" if phys else "virt")
+            return
+
+        reply = await self.send(f"Qqemu.PhyMemMode:{int(bool(phys))}")
+        if reply != b'OK':
+            raise GdbpRspError(f"The stub didn't switch to {'physical' if phys else 'virtual'} memory: {reply!r}")
+        return
+
+    async def _read_xml(self, annex: str):
+        data = b''
+        while True:
+            reply = await self.send(f'qXfer:features:read:{annex}:{len(data):x},fff')
+            if not reply or reply[:1] not in b'ml':
+                return None
+            data += reply[1:]
+            if reply[:1] == b'l':
+                return data
+
+    async def _load_layout(self) -> None:
+        # Fetch the description and everything it includes, then lay it out like the standalone backend
+        documents = {}
+        annexes = [TARGET_XML]
+        while annexes:
+            contents = await asyncio.gather(*(self._read_xml(annex) for annex in annexes))
+            documents.update(zip(annexes, contents))
+            annexes = [href.decode() for content in contents if content is not None
+                       for href in _HREF_PATTERN.findall(content) if href.decode() not in documents]
+        self.architecture, self.registers = register_layout(documents.get)
+        return
+
+    async def close(self) -> None:
+        self.receiver.cancel()
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+        return
+
+
+async def connect(address, timeout: float = PACKET_TIMEOUT, max_in_flight: int = MAX_IN_FLIGHT,
+                  vmware=None) -> AsyncRspChannel:
+    """
+    :param address: (host, port), "host:port" or a Unix socket path of the stub
+    :param float timeout: Seconds to wait for the connection and the handshake
+    :param int max_in_flight: Packets to pipeline on the connection, once the stub is in no-ack mode
+    :param vmware: The stub is VMware's (True) or QEMU's (False). default = ask the stub when switching memory modes.
+    :return AsyncRspChannel: The connection
+    """
+    address = parse_stub_address(address)
+    if isinstance(address, tuple):
+        opening = asyncio.open_connection(*address, limit=STREAM_LIMIT)
+    else:
+        opening = asyncio.open_unix_connection(address, limit=STREAM_LIMIT)
+    reader, writer = await asyncio.wait_for(opening, timeout)
+
+    channel = AsyncRspChannel(reader, writer, max_in_flight, vmware)
+    channel.receiver = asyncio.get_running_loop().create_task(channel._receive())
+
+    async def handshake():
+        features = (await channel.send('qSupported:xmlRegisters=i386')).decode('latin-1').split(';')
+        for feature in features:
+            if feature.startswith('PacketSize='):
+                channel.packet_size = int(feature.split('=', 1)[1], 16)
+        if 'QStartNoAckMode+' in features and await channel.send('QStartNoAckMode') == b'OK':
+            channel.ack = False
+            channel.in_flight = asyncio.Semaphore(max_in_flight)
+        await channel._load_layout()
+
+    try:
+        await asyncio.wait_for(handshake(), timeout)
+    except BaseException:
+        await channel.close()
+        raise
+    return channel
+
+
+async def read_bytes(channel: AsyncRspChannel, address: int, length: int) -> bytes:
+    """
+    :return bytes: The first ``length`` bytes starting at ``address``
+    """
+    return await channel.read_memory(address, length)
+
+
+async def _read_run(channel: AsyncRspChannel, start: int, end: int) -> list:
+    """
+    ``rw_memory._read_pieces`` over an asyncio connection - the pages are read pipelined
+    :return list: (piece_start, piece_bytes or None if unreadable) pairs covering the run
+    """
+    try:
+        return [(start, await channel.read_memory(start, end - start))]
+    except RspMemoryError:
+        spans = _fallback_spans(start, end)
+        if not spans:
+            return [(start, None)]
+
+    async def read_piece(piece_start: int, piece_end: int):
+        try:
+            return piece_start, await channel.read_memory(piece_start, piece_end - piece_start)
+        except RspMemoryError:
+            return piece_start, None
+
+    return list(await asyncio.gather(*(read_piece(piece_start, piece_end) for piece_start, piece_end in spans)))
+
+
+async def read_many(channel: AsyncRspChannel, requests, max_gap: int = READ_MANY_MAX_GAP, skip_errors=False) -> list:
+    """
+    ``rw_memory.read_many`` over an asyncio connection - the merged runs are read concurrently
+    :param requests: Iterable of (address, length) or (address, fmt) pairs, where fmt is a ``struct`` format string
+    :param int max_gap: Maximum number of unrequested bytes to read in order to merge two ranges
+    :param bool skip_errors: Return None for unreadable requests instead of raising
+    :return list: In request order - bytes, or the decoded value for (address, fmt) requests
+    """
+    runs, decoders = _plan_reads(requests, max_gap)
+    results = [None] * len(decoders)
+    all_pieces = await asyncio.gather(*(_read_run(channel, run_start, run_end) for run_start, run_end, _ in runs))
+    for pieces, (_, _, run) in zip(all_pieces, runs):
+        _decode_run(pieces, run, decoders, results, skip_errors)
+    return results
+
+
+def _decode_register(register, text: bytes) -> int:
+    """
+    :param text: The register's hex digits in a 'g'\\'p' reply
+    :return int: Its raw value
+    """
+    # 'xx' bytes - the stub can't read the register
+    if b'x' in text:
+        raise GdbpRspError(f"Register {register.name} is unavailable")
+    try:
+        return int.from_bytes(binascii.unhexlify(text), 'little')
+    except binascii.Error:
+        raise GdbpRspError(f"Bad value of register {register.name}: {text.decode('latin-1')!r}") from None
+
+
+async def get_registers(channel: AsyncRspChannel, names=None) -> dict:
+    """
+    :param names: Registers to read. default = every available register in the 'g' block (one packet)
+    :return dict: Raw register values by name
+    """
+    block = await channel.send('g')
+    if not block or is_error_reply(block):
+        raise GdbpRspError(f"Couldn't read the registers: {block.decode('latin-1')!r}")
+
+    def in_block(register) -> bool:
+        return 2 * (register.offset + register.size) <= len(block)
+
+    def block_text(register) -> bytes:
+        return block[2 * register.offset:2 * (register.offset + register.size)]
+
+    if names is None:
+        names = [name for name, register in channel.registers.items()
+                 if in_block(register) and b'x' not in block_text(register)]
+
+    values = {}
+    single = []
+    for name in names:
+        register = channel.registers.get(name)
+        if register is None:
+            raise ValueError(f"Bad register: {name}")
+        if in_block(register):
+            values[name] = _decode_register(register, block_text(register))
+        else:
+            single.append(register)
+
+    # Registers past the end of the 'g' block are read one by one - pipelined
+    replies = await asyncio.gather(*(channel.send(f'p{register.number:x}') for register in single))
+    for register, reply in zip(single, replies):
+        if not reply or is_error_reply(reply):
+            raise GdbpRspError(f"Couldn't read register {register.name}: {reply.decode('latin-1')!r}")
+        values[register.name] = _decode_register(register, reply)
+    return values
+
+
+async def get_register(channel: AsyncRspChannel, name: str) -> int:
+    """
+    :return int: Raw value of register ``name``
+    """
+    return (await get_registers(channel, [name]))[name]
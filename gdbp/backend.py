@@ -0,0 +1,17 @@
+import os
+
+# "rsp" forces the standalone backend even inside GDB; by default it's used only when GDB isn't loaded
+BACKEND_ENV = 'GDBP_BACKEND'
+# "host:port" or a Unix socket path - the stub the standalone backend connects to on first use
+STUB_ENV = 'GDBP_STUB'
+
+if os.environ.get(BACKEND_ENV) == 'rsp':
+    from . import standalone as gdb
+    STANDALONE = True
+else:
+    try:
+        import gdb
+        STANDALONE = False
+    except ImportError:
+        from . import standalone as gdb
+        STANDALONE = True
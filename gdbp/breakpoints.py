@@ -0,0 +1,502 @@
+import array
+import collections
+import os
+import tempfile
+import threading
+
+from .backend import gdb
+
+# DR0-DR3
+HW_BREAKPOINT_SLOTS = 4
+# Breakpoint types that take a debug register slot
+HW_SLOT_TYPES = tuple(getattr(gdb, name) for name in ('BP_HARDWARE_BREAKPOINT', 'BP_HARDWARE_WATCHPOINT',
+                                                     'BP_READ_WATCHPOINT', 'BP_ACCESS_WATCHPOINT')
+                      if hasattr(gdb, name))
+
+# GDB keeps ignore counts in an int - this many crossings are never reached
+IGNORE_FOREVER = 0x7FFFFFFF
+TRACE_PREFIX = 'gdbp-trace'
+
+
+class GdbpNoFreeHwSlot(RuntimeError):
+    pass
+
+
+class HwBreakpoint:
+    """
+    A logical hardware breakpoint of a ``HwBreakpointManager``
+    """
+
+    __slots__ = ('address', 'bp', 'number', 'enabled', 'active')
+
+    def __init__(self, address: int, bp: gdb.Breakpoint):
+        self.address = address
+        self.bp = bp
+        # bp.number raises once the breakpoint is deleted
+        self.number = bp.number
+        # Wanted by the user
+        self.enabled = True
+        # Holds a debug register slot right now
+        self.active = False
+
+    def __repr__(self):
+        state = 'active' if self.active else 'waiting' if self.enabled else 'disabled'
+        return f'<HwBreakpoint {hex(self.address)} #{self.number} {state}>'
+
+
+class HwBreakpointManager:
+    """
+    Hardware breakpoints with debug register slot accounting.
+    Without ``multiplex`` a breakpoint that doesn't fit in the slots fails when it's added, rather than on resume.
+    With ``multiplex`` the extra breakpoints wait, and every stop rotates the waiting ones into the slots - each
+    breakpoint is then armed only part of the time, so hits while it's waiting are missed.
+    Enabling and disabling many breakpoints is done with a single "enable"\\"disable" command.
+    Enabled hardware breakpoints and watchpoints the manager doesn't own (other managers, "hbreak", "watch") are
+    counted as taken slots. ``general.hw_bp``\\``delete_bp`` go through ``HW_BREAKPOINTS``.
+    Breakpoints deleted behind the manager's back ("delete", ``bp.delete()``) give their slot back.
+    A multiplexing manager rotates on every stop until ``close``.
+    """
+
+    def __init__(self, slots: int = HW_BREAKPOINT_SLOTS, multiplex=False):
+        """
+        :param int slots: Number of hardware breakpoint slots
+        :param multiplex: rotate more breakpoints than slots through the slots on every stop. default = False.
+        """
+        self.slots = slots
+        self.multiplex = multiplex
+        self.by_address = {}
+        self.by_number = {}
+        # Slot holders, oldest first - the first to give up their slot on rotation
+        self.active = collections.OrderedDict()
+        # Enabled breakpoints waiting for a slot
+        self.waiting = collections.deque()
+        if multiplex:
+            gdb.events.stop.connect(self.rotate)
+        # gdb.events.breakpoint_deleted was added in GDB 7.6 - before it, deleted breakpoints are found by
+        # ``_forget_deleted``
+        if hasattr(gdb.events, 'breakpoint_deleted'):
+            gdb.events.breakpoint_deleted.connect(self.on_breakpoint_deleted)
+
+    def close(self) -> None:
+        """
+        Delete every breakpoint of the manager and stop rotating them on stops
+        :return:
+        """
+        self.clear()
+        if self.multiplex:
+            gdb.events.stop.disconnect(self.rotate)
+            self.multiplex = False
+        if hasattr(gdb.events, 'breakpoint_deleted'):
+            gdb.events.breakpoint_deleted.disconnect(self.on_breakpoint_deleted)
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc_info):
+        self.close()
+
+    def _forget(self, entry: HwBreakpoint) -> None:
+        del self.by_address[entry.address]
+        del self.by_number[entry.number]
+        if entry.active:
+            entry.active = False
+            del self.active[entry.address]
+        elif entry in self.waiting:
+            self.waiting.remove(entry)
+        return
+
+    def on_breakpoint_deleted(self, bp: gdb.Breakpoint) -> None:
+        """
+        gdb.events.breakpoint_deleted handler - forget a breakpoint of the manager that was deleted by someone else.
+        Its slot is taken by a waiting breakpoint on the next stop (no commands are run from inside a "delete")
+        :return:
+        """
+        entry = self.by_number.get(bp.number)
+        if entry is not None:
+            self._forget(entry)
+        return
+
+    def _forget_deleted(self) -> None:
+        for entry in [entry for entry in self.by_address.values() if not entry.bp.is_valid()]:
+            self._forget(entry)
+        return
+
+    def _foreign_slots(self) -> int:
+        """
+        :return int: Slots taken by enabled hardware breakpoints and watchpoints that aren't the manager's
+        """
+        # gdb.breakpoints returned None instead of an empty tuple before GDB 7.12
+        return sum(1 for bp in gdb.breakpoints() or ()
+                   if bp.type in HW_SLOT_TYPES and bp.enabled and bp.number not in self.by_number)
+
+    def free_slots(self) -> int:
+        """
+        :return int: Debug register slots no breakpoint holds
+        """
+        self._forget_deleted()
+        return max(self.slots - len(self.active) - self._foreign_slots(), 0)
+
+    @staticmethod
+    def _batch(command: str, entries) -> None:
+        numbers = ' '.join(str(entry.bp.number) for entry in entries if entry.bp.is_valid())
+        if numbers:
+            gdb.execute(f'{command} {numbers}', to_string=True)
+        return
+
+    def _activate(self, entries) -> None:
+        for entry in entries:
+            entry.active = True
+            self.active[entry.address] = entry
+        self._batch('enable', entries)
+        return
+
+    def _deactivate(self, entries) -> None:
+        for entry in entries:
+            entry.active = False
+            del self.active[entry.address]
+        self._batch('disable', entries)
+        return
+
+    def _fill_slots(self) -> None:
+        promoted = []
+        free = self.free_slots()
+        while self.waiting and len(promoted) < free:
+            promoted.append(self.waiting.popleft())
+        self._activate(promoted)
+        return
+
+    def add(self, address: int) -> HwBreakpoint:
+        """
+        :param int address: Address to break on
+        :return HwBreakpoint: The breakpoint (the existing one, if ``address`` already has one)
+        """
+        free = self.free_slots()
+        entry = self.by_address.get(address)
+        if entry is not None:
+            return entry
+
+        if not free and not self.multiplex:
+            raise GdbpNoFreeHwSlot(f"All {self.slots} hardware breakpoint slots are in use "
+                                   f"({', '.join(hex(active) for active in self.active) or 'not by this manager'})")
+
+        bp = gdb.Breakpoint(f'*{hex(address)}', type=gdb.BP_HARDWARE_BREAKPOINT)
+        entry = HwBreakpoint(address, bp)
+        self.by_address[address] = entry
+        self.by_number[bp.number] = entry
+
+        if free:
+            entry.active = True
+            self.active[address] = entry
+        else:
+            # Created enabled - only disabled breakpoints are free of a slot
+            bp.enabled = False
+            self.waiting.append(entry)
+        return entry
+
+    def add_many(self, addresses) -> list:
+        """
+        :return list: The breakpoints of ``addresses``
+        """
+        return [self.add(address) for address in addresses]
+
+    def remove(self, address: int) -> None:
+        entry = self.by_address[address]
+        self._forget(entry)
+        if entry.bp.is_valid():
+            entry.bp.delete()
+        self._fill_slots()
+        return
+
+    def clear(self) -> None:
+        """
+        Delete every breakpoint of the manager, with a single command
+        :return:
+        """
+        entries = list(self.by_address.values())
+        # Emptied first, so that on_breakpoint_deleted has nothing left to forget
+        self.by_address.clear()
+        self.by_number.clear()
+        self.active.clear()
+        self.waiting.clear()
+        self._batch('delete', entries)
+        return
+
+    def enable(self, addresses) -> None:
+        """
+        Enable breakpoints - the ones that fit in the free slots are armed with a single command
+        :param addresses: Addresses of breakpoints of the manager
+        :return:
+        """
+        addresses = set(addresses)
+        for address in addresses:
+            entry = self.by_address[address]
+            if not entry.enabled:
+                entry.enabled = True
+                self.waiting.append(entry)
+        free = self.free_slots()
+        if len(self.waiting) > free and not self.multiplex:
+            for entry in [entry for entry in self.waiting if entry.address in addresses]:
+                entry.enabled = False
+                self.waiting.remove(entry)
+            raise GdbpNoFreeHwSlot(f"Not enough free hardware breakpoint slots ({free})")
+        self._fill_slots()
+        return
+
+    def disable(self, addresses) -> None:
+        """
+        Disable breakpoints with a single command, and give their slots to waiting ones
+        :param addresses: Addresses of breakpoints of the manager
+        :return:
+        """
+        entries = [self.by_address[address] for address in addresses]
+        for entry in entries:
+            entry.enabled = False
+            if entry in self.waiting:
+                self.waiting.remove(entry)
+        self._deactivate([entry for entry in entries if entry.active])
+        self._fill_slots()
+        return
+
+    def arm_all(self) -> None:
+        """
+        Re-arm the slot holders after ``disarm_all``, with a single command
+        :return:
+        """
+        self._batch('enable', list(self.active.values()))
+        return
+
+    def disarm_all(self) -> None:
+        """
+        Disarm every breakpoint of the manager with a single command, keeping the slot assignment for ``arm_all``
+        :return:
+        """
+        self._batch('disable', list(self.active.values()))
+        return
+
+    def rotate(self, *_event) -> None:
+        """
+        Give the slots of the longest-armed breakpoints to waiting ones. Also used as a gdb.events.stop handler
+        :return:
+        """
+        if not self.waiting:
+            return
+
+        # Slots given back by deleted breakpoints
+        self._fill_slots()
+        count = min(len(self.waiting), len(self.active))
+        retired = list(self.active.values())[:count]
+        promoted = [self.waiting.popleft() for _ in range(count)]
+        for entry in retired:
+            entry.active = False
+            del self.active[entry.address]
+        self.waiting.extend(retired)
+        self._batch('disable', retired)
+        self._activate(promoted)
+        return
+
+    def lookup(self, address: int):
+        """
+        :return HwBreakpoint: The breakpoint at ``address``, or None
+        """
+        return self.by_address.get(address)
+
+    def stopped_at(self, event=None):
+        """
+        :param event: A gdb.BreakpointEvent. default = look the current pc up
+        :return HwBreakpoint: The breakpoint of the manager that stopped the target, or None
+        """
+        for bp in getattr(event, 'breakpoints', ()):
+            entry = self.by_number.get(bp.number)
+            if entry is not None:
+                return entry
+        if event is not None and hasattr(event, 'breakpoints'):
+            return None
+        return self.by_address.get(int(gdb.selected_frame().pc()))
+
+    def __len__(self):
+        return len(self.by_address)
+
+
+HW_BREAKPOINTS = HwBreakpointManager()
+
+
+class HitTracer:
+    """
+    Counts breakpoint hits without running Python on every hit.
+    Without registers, each breakpoint gets an ignore count that is never reached: GDB counts the hits and resumes by
+    itself. With registers, a dprintf (an hbreak with a silent printf-and-continue command list, for ``hardware``)
+    prints them into a GDB log file, which ``collect`` parses into arrays only when asked.
+    While sampling, don't resume the target with ``gdb.execute(..., to_string=True)`` - the output of such a command,
+    samples included, is captured before it reaches the log.
+    """
+
+    def __init__(self, addresses, registers=(), hardware=False, log_path: str = None):
+        """
+        :param addresses: Addresses to count hits of
+        :param registers: Registers to sample on every hit ('rdi', ...). default = count only.
+        :param hardware: use hardware breakpoints. default = False.
+        :param str log_path: File for the register samples. default = a temporary file.
+        While sampling, GDB's output is redirected into it.
+        """
+        self.addresses = list(addresses)
+        self.registers = tuple(registers)
+        self.samples = {address: array.array('Q') for address in self.addresses}
+        self.bps = []
+        self.log_path = None
+        self.log_offset = 0
+        self.timer = None
+        # Counts of the deleted breakpoints, once stopped
+        self.final_counts = None
+
+        if self.registers:
+            if log_path is None:
+                log_fd, log_path = tempfile.mkstemp(prefix='gdbp-trace-', suffix='.log')
+                os.close(log_fd)
+            self.log_path = log_path
+            self._start_logging()
+
+        try:
+            for index, address in enumerate(self.addresses):
+                self.bps.append(self._create(index, address, hardware))
+        except BaseException:
+            self.stop()
+            raise
+
+    def _start_logging(self) -> None:
+        gdb.execute(f'set logging file {self.log_path}', to_string=True)
+        gdb.execute('set logging overwrite on', to_string=True)
+        gdb.execute('set logging redirect on', to_string=True)
+        try:
+            gdb.execute('set logging enabled on', to_string=True)
+        except gdb.error:
+            # Before GDB 12
+            gdb.execute('set logging on', to_string=True)
+        return
+
+    def _stop_logging(self) -> None:
+        try:
+            gdb.execute('set logging enabled off', to_string=True)
+        except gdb.error:
+            gdb.execute('set logging off', to_string=True)
+        return
+
+    def _create(self, index: int, address: int, hardware) -> gdb.Breakpoint:
+        location = f'*{hex(address)}'
+        if not self.registers:
+            bp = gdb.Breakpoint(location, type=gdb.BP_HARDWARE_BREAKPOINT if hardware else gdb.BP_BREAKPOINT)
+            bp.ignore_count = IGNORE_FOREVER
+            return bp
+
+        line_format = ' '.join([TRACE_PREFIX, str(index)] + ['%#lx'] * len(self.registers))
+        arguments = ', '.join(f'${register}' for register in self.registers)
+        if hardware:
+            # dprintf is software only
+            bp = gdb.Breakpoint(location, type=gdb.BP_HARDWARE_BREAKPOINT)
+            bp.silent = True
+            bp.commands = f'printf "{line_format}\\n", {arguments}\ncontinue'
+            return bp
+
+        gdb.execute(f'dprintf {location},"{line_format}\\n", {arguments}', to_string=True)
+        return gdb.breakpoints()[-1]
+
+    def counts(self) -> dict:
+        """
+        :return dict: Hits of every address, as counted by GDB
+        """
+        if self.final_counts is not None:
+            return dict(self.final_counts)
+        return {address: bp.hit_count for address, bp in zip(self.addresses, self.bps) if bp.is_valid()}
+
+    def reset(self) -> None:
+        """
+        Zero the hit counts and drop the samples
+        :return:
+        """
+        self.collect()
+        for bp in self.bps:
+            if bp.is_valid():
+                bp.hit_count = 0
+        for samples in self.samples.values():
+            del samples[:]
+        return
+
+    def collect(self) -> int:
+        """
+        Parse the samples logged since the last call into ``samples`` - per address, an array of the sampled
+        registers of every hit, one after the other
+        :return int: Number of new samples
+        """
+        if self.log_path is None:
+            return 0
+
+        new = 0
+        with open(self.log_path) as log_file:
+            log_file.seek(self.log_offset)
+            for line in log_file:
+                if not line.endswith('\n'):
+                    # Half-written - read it again next time
+                    break
+                self.log_offset += len(line)
+                fields = line.split()
+                if len(fields) != 2 + len(self.registers) or fields[0] != TRACE_PREFIX:
+                    continue
+                self.samples[self.addresses[int(fields[1])]].extend(int(field, 16) for field in fields[2:])
+                new += 1
+        return new
+
+    def report(self) -> None:
+        """
+        Print the hit counts (and the number of samples) of every address
+        :return:
+        """
+        self.collect()
+        for address, hits in self.counts().items():
+            samples = len(self.samples[address]) // len(self.registers) if self.registers else 0
+            print(f"[gdbp: trace_hits()] - {hex(address)}: {hits} hit(s)" +
+                  (f", {samples} sample(s)" if self.registers else ""))
+        return
+
+    def report_every(self, seconds: float, callback=None) -> None:
+        """
+        Call ``callback`` (default = ``report``) every ``seconds`` while the target runs, on GDB's thread
+        :return:
+        """
+        callback = callback or self.report
+
+        def tick():
+            gdb.post_event(callback)
+            self.timer = threading.Timer(seconds, tick)
+            self.timer.daemon = True
+            self.timer.start()
+
+        self.timer = threading.Timer(seconds, tick)
+        self.timer.daemon = True
+        self.timer.start()
+        return
+
+    def stop(self) -> None:
+        """
+        Delete the breakpoints and stop logging. Counts and samples stay readable
+        :return:
+        """
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.final_counts is None:
+            self.final_counts = self.counts()
+        self.collect()
+        for bp in self.bps:
+            if bp.is_valid():
+                bp.delete()
+        if self.log_path is not None:
+            self._stop_logging()
+        return
+
+
+def trace_hits(addresses, registers=(), hardware=False, log_path: str = None) -> HitTracer:
+    """
+    Count hits of ``addresses`` (and sample ``registers`` on every hit) natively in GDB - see ``HitTracer``
+    :return HitTracer: The tracer. Resume the target, then read ``counts()``\\``samples`` or call ``report()``
+    """
+    return HitTracer(addresses, registers, hardware, log_path)
@@ -0,0 +1,311 @@
+import array
+import collections
+import struct
+
+from .backend import gdb
+from .general import GDBP_OBJ, extract_segment_selector_details
+from .paging import _is_long_mode, _read_efer
+from .rw_memory import read_bytes
+from .rw_registers import (MASK_32BIT, MASK_64BIT, REGISTER_SNAPSHOT, REGISTERS, SEGMENT_REGISTERS, get_gdtr,
+                           get_idtr, get_ldtr, get_register_value)
+
+GDT = 'gdt'
+LDT = 'ldt'
+IDT = 'idt'
+
+DESCRIPTOR_SIZE = 8
+# Every IDT gate in long mode is 16 bytes. In the GDT/LDT only the system descriptors are - they take two slots
+LONG_GATE_SIZE = 16
+
+# System descriptor types (S = 0)
+TYPE_LDT = 0x2
+TYPE_TASK_GATE = 0x5
+TYPE_TSS_AVAILABLE = 0x9
+TYPE_TSS_BUSY = 0xB
+GATE_TYPES = (0x4, 0x6, 0x7, 0xC, 0xE, 0xF)
+# System descriptors that hold a base and a limit, and are 16 bytes in long mode
+SEGMENT_SYSTEM_TYPES = (TYPE_LDT, 0x1, 0x3, TYPE_TSS_AVAILABLE, TYPE_TSS_BUSY)
+
+FLAG_AVL = 0x1
+FLAG_L = 0x2
+FLAG_DB = 0x4
+FLAG_G = 0x8
+
+SELECTOR_TI = 0x4
+SELECTOR_RPL_MASK = 0x3
+# In long mode only FS and GS have a base - it comes from IA32_FS_BASE\IA32_GS_BASE, not from the descriptor
+BASE_REGISTERS = {'fs': 'fs_base', 'gs': 'gs_base'}
+
+Descriptor = collections.namedtuple('Descriptor', ['index', 'base', 'limit', 'type', 's', 'dpl', 'present', 'flags',
+                                                   'selector', 'offset', 'ist'])
+Descriptor.__doc__ = """
+One decoded descriptor. limit is in bytes (the granularity is applied), flags holds AVL\\L\\D-B\\G as FLAG_* bits.
+selector, offset and ist are set for gates (every IDT entry, call gates in the GDT\\LDT) and 0 otherwise
+"""
+
+_QWORDS = struct.Struct('<Q')
+
+
+class DescriptorTable:
+    """
+    A GDT, LDT or IDT decoded into parallel arrays - one element per descriptor slot.
+    In long mode a 16-byte system descriptor of the GDT\\LDT takes two slots; the second one is left as read.
+    """
+
+    def __init__(self, kind: str, base: int, limit: int, data: bytes, long_mode: bool):
+        """
+        :param str kind: GDT, LDT or IDT
+        :param int base: Linear address of the table
+        :param int limit: The table's limit, as in the GDTR\\IDTR\\LDTR
+        :param bytes data: The table's contents
+        :param bool long_mode: Decode the 16-byte IDT gates and system descriptors of IA-32e mode
+        """
+        if kind not in (GDT, LDT, IDT):
+            raise ValueError(f"Bad descriptor table: {kind}")
+        self.kind = kind
+        self.base = base
+        self.limit = limit
+        self.long_mode = long_mode
+        self.entry_size = LONG_GATE_SIZE if kind == IDT and long_mode else DESCRIPTOR_SIZE
+
+        count = len(data) // self.entry_size
+        self.bases = array.array('Q', bytes(8 * count))
+        self.limits = array.array('Q', bytes(8 * count))
+        self.offsets = array.array('Q', bytes(8 * count))
+        self.selectors = array.array('H', bytes(2 * count))
+        self.types = array.array('B', bytes(count))
+        self.s = array.array('B', bytes(count))
+        self.dpls = array.array('B', bytes(count))
+        self.present = array.array('B', bytes(count))
+        self.flags = array.array('B', bytes(count))
+        self.ists = array.array('B', bytes(count))
+        self._decode(data, count)
+
+    def _decode(self, data: bytes, count: int) -> None:
+        words = [word for (word,) in _QWORDS.iter_unpack(data[:(len(data) // DESCRIPTOR_SIZE) * DESCRIPTOR_SIZE])]
+        step = self.entry_size // DESCRIPTOR_SIZE
+        for index in range(count):
+            low = words[index * step]
+            descriptor_type = (low >> 40) & 0xF
+            s = (low >> 44) & 0x1
+            self.types[index] = descriptor_type
+            self.s[index] = s
+            self.dpls[index] = (low >> 45) & 0x3
+            self.present[index] = (low >> 47) & 0x1
+            flags = (low >> 52) & 0xF
+            self.flags[index] = flags
+
+            # The upper 8 bytes of a long-mode gate or system descriptor - the next slot in the GDT\LDT
+            if self.long_mode and index * step + 1 < len(words):
+                high = words[index * step + 1]
+            else:
+                high = 0
+
+            if self.kind == IDT or (not s and descriptor_type in GATE_TYPES):
+                self.selectors[index] = (low >> 16) & 0xFFFF
+                offset = (low & 0xFFFF) | (((low >> 48) & 0xFFFF) << 16)
+                if self.long_mode:
+                    offset |= (high & 0xFFFFFFFF) << 32
+                    self.ists[index] = (low >> 32) & 0x7
+                self.offsets[index] = offset
+                continue
+            if not s and descriptor_type == TYPE_TASK_GATE:
+                self.selectors[index] = (low >> 16) & 0xFFFF
+                continue
+
+            base = ((low >> 16) & 0xFFFFFF) | (((low >> 56) & 0xFF) << 24)
+            if self.long_mode and not s and descriptor_type in SEGMENT_SYSTEM_TYPES:
+                base |= (high & 0xFFFFFFFF) << 32
+            limit = (low & 0xFFFF) | (((low >> 48) & 0xF) << 16)
+            if flags & FLAG_G:
+                limit = (limit << 12) | 0xFFF
+            self.bases[index] = base
+            self.limits[index] = limit
+        return
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def __getitem__(self, index: int) -> Descriptor:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"{self.kind} index {index} is out of range (the table has {len(self)} entries)")
+        return Descriptor(index, self.bases[index], self.limits[index], self.types[index], self.s[index],
+                          self.dpls[index], self.present[index], self.flags[index], self.selectors[index],
+                          self.offsets[index], self.ists[index])
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+    def handlers_outside(self, start: int, end: int) -> list:
+        """
+        Find the gates whose handler isn't in [start, end) - e.g. IDT vectors hooked outside the kernel image
+        :return list: (index, handler offset) pairs of the present gates
+        """
+        return [(index, offset) for index, offset in enumerate(self.offsets)
+                if self.present[index] and not self.s[index] and self.types[index] in GATE_TYPES
+                and not start <= offset < end]
+
+
+class DescriptorTableCache:
+    """
+    Decoded descriptor tables by (kind, base, limit, mode), and resolved selectors by (GDTR, LDTR, selector, mode),
+    served until the target stops, resumes or its memory is changed from GDB
+    """
+
+    def __init__(self):
+        self.tables = {}
+        self.selectors = {}
+        self.hits = 0
+        self.misses = 0
+
+    def flush(self, *_event) -> None:
+        """
+        Drop every decoded table and selector. Also used as a gdb.events handler, hence the ignored event argument
+        :return:
+        """
+        self.tables.clear()
+        self.selectors.clear()
+        return
+
+
+DESCRIPTOR_CACHE = DescriptorTableCache()
+
+gdb.events.stop.connect(DESCRIPTOR_CACHE.flush)
+gdb.events.cont.connect(DESCRIPTOR_CACHE.flush)
+# gdb.events.memory_changed is missing from older GDB versions
+if hasattr(gdb.events, 'memory_changed'):
+    gdb.events.memory_changed.connect(DESCRIPTOR_CACHE.flush)
+
+
+def flush_descriptor_cache() -> None:
+    """
+    Forget every decoded table, e.g. after the guest changed a descriptor behind GDB's back
+    :return:
+    """
+    DESCRIPTOR_CACHE.flush()
+    return
+
+
+def read_descriptor_table(base: int, limit: int, kind: str = GDT, long_mode=None) -> DescriptorTable:
+    """
+    Read a whole descriptor table with a single ``read_bytes`` and decode every entry
+    :param int base: Linear address of the table
+    :param int limit: The table's limit (its size - 1), as in the GDTR\\IDTR\\LDTR
+    :param str kind: GDT, LDT or IDT. default = GDT.
+    :param long_mode: Decode IA-32e descriptors. default = whether the target is in long mode (IA32_EFER.LMA).
+    :return DescriptorTable: The decoded table, cached until the target stops or resumes
+    """
+    if long_mode is None:
+        long_mode = _is_long_mode(_read_efer())
+
+    key = (kind, base, limit, bool(long_mode), GDBP_OBJ.phys)
+    table = DESCRIPTOR_CACHE.tables.get(key)
+    if table is not None:
+        DESCRIPTOR_CACHE.hits += 1
+        return table
+
+    DESCRIPTOR_CACHE.misses += 1
+    table = DescriptorTable(kind, base, limit, read_bytes(base, limit + 1), bool(long_mode))
+    DESCRIPTOR_CACHE.tables[key] = table
+    return table
+
+
+def get_gdt(long_mode=None) -> DescriptorTable:
+    """
+    VMware only!
+    :return DescriptorTable: The GDT of the current logical processor
+    """
+    base, limit = get_gdtr()
+    return read_descriptor_table(base, limit, GDT, long_mode)
+
+
+def get_idt(long_mode=None) -> DescriptorTable:
+    """
+    VMware only!
+    :return DescriptorTable: The IDT of the current logical processor
+    """
+    base, limit = get_idtr()
+    return read_descriptor_table(base, limit, IDT, long_mode)
+
+
+def get_ldt(long_mode=None) -> DescriptorTable:
+    """
+    VMware only!
+    :return DescriptorTable: The LDT of the current logical processor. Empty if the LDTR holds the null selector
+    """
+    ldtr = get_ldtr()
+    if not ldtr.get('p') or not ldtr.get('sel', 0) & ~0x7:
+        return DescriptorTable(LDT, 0, 0, b'', bool(long_mode))
+    return read_descriptor_table(ldtr['base'], ldtr['limit'], LDT, long_mode)
+
+
+def resolve_selector(selector: int, gdtr: tuple = None, ldtr: tuple = None, long_mode=None) -> Descriptor:
+    """
+    Look a segment selector up in the GDT or LDT (by its TI bit)
+    :param int selector: The selector, e.g. ``get_fs()``
+    :param tuple gdtr: (base, limit) of the GDT. default = ``get_gdtr()`` (VMware only).
+    :param tuple ldtr: (base, limit) of the LDT. default = from ``get_ldtr()`` (VMware only), if TI is set.
+    :param long_mode: Decode IA-32e descriptors. default = whether the target is in long mode (IA32_EFER.LMA).
+    :return Descriptor: The selector's descriptor - base, limit (in bytes) and attributes
+    """
+    details = extract_segment_selector_details(selector)
+    if details['TI'] == 'GDT' and details['Index'] == 0:
+        raise ValueError(f"{hex(selector)} is a null selector")
+
+    if long_mode is None:
+        long_mode = _is_long_mode(_read_efer())
+    if details['TI'] == 'GDT':
+        table_register = tuple(gdtr) if gdtr is not None else tuple(get_gdtr())
+    elif ldtr is not None:
+        table_register = tuple(ldtr)
+    else:
+        current = get_ldtr()
+        table_register = (current['base'], current['limit']) if current.get('p') else None
+
+    key = (details['TI'], table_register, selector & ~SELECTOR_RPL_MASK, bool(long_mode), GDBP_OBJ.phys)
+    descriptor = DESCRIPTOR_CACHE.selectors.get(key)
+    if descriptor is not None:
+        DESCRIPTOR_CACHE.hits += 1
+        return descriptor
+
+    if table_register is None:
+        raise ValueError(f"{hex(selector)} selects the LDT, but there is no LDT")
+    table = read_descriptor_table(*table_register, GDT if details['TI'] == 'GDT' else LDT, long_mode)
+    descriptor = table[details['Index']]
+    DESCRIPTOR_CACHE.selectors[key] = descriptor
+    return descriptor
+
+
+def get_segment_base(segment: str, long_mode=None) -> int:
+    """
+    :param str segment: 'cs', 'ss', 'ds', 'es', 'fs' or 'gs'
+    :param long_mode: The target is in long mode. default = IA32_EFER.LMA.
+    :return int: The segment's effective base in the selected frame. In long mode FS\GS come from
+    $fs_base\$gs_base, and the other segments are flat
+    """
+    if segment not in SEGMENT_REGISTERS:
+        raise ValueError(f"Bad segment register: {segment}")
+    if long_mode is None:
+        long_mode = _is_long_mode(_read_efer())
+
+    if long_mode:
+        if segment not in BASE_REGISTERS:
+            return 0
+        return REGISTER_SNAPSHOT.read(gdb.selected_frame(), BASE_REGISTERS[segment]) & MASK_64BIT
+
+    return resolve_selector(get_register_value(REGISTERS[segment]), long_mode=False).base
+
+
+def segment_to_linear(segment: str, offset: int, long_mode=None) -> int:
+    """
+    Convert a segment-relative address (e.g. gs:[0x188]) to a linear address
+    :param str segment: 'cs', 'ss', 'ds', 'es', 'fs' or 'gs'
+    :param int offset: Offset into the segment
+    :param long_mode: The target is in long mode. default = IA32_EFER.LMA.
+    :return int: The linear address
+    """
+    if long_mode is None:
+        long_mode = _is_long_mode(_read_efer())
+    return (get_segment_base(segment, long_mode) + offset) & (MASK_64BIT if long_mode else MASK_32BIT)
@@ -0,0 +1,151 @@
+import contextlib
+import json
+import os
+import re
+import time
+
+from .backend import gdb
+from .general import GDBP_OBJ
+from .rw_memory import PAGE_SIZE, _read_run
+
+DUMP_CHUNK_SIZE = 0x100000
+MAP_SUFFIX = '.map'
+
+_PACKET_SIZE_PATTERN = re.compile(r'limited to (\d+) bytes')
+
+
+def get_max_read_payload() -> int:
+    """
+    :return int: Number of memory bytes a single 'm' packet can carry on the current connection
+    """
+    try:
+        out = gdb.execute("show remote memory-read-packet-size", to_string=True)
+    except gdb.error:
+        return PAGE_SIZE
+
+    match = _PACKET_SIZE_PATTERN.search(out)
+    if not match:
+        return PAGE_SIZE
+
+    # The reply is hex encoded - two characters per byte, plus the packet framing
+    return max((int(match.group(1)) - 4) // 2, 1)
+
+
+def _write_map(map_path: str, dump_map: dict) -> None:
+    tmp_path = map_path + '.tmp'
+    with open(tmp_path, 'w') as map_file:
+        json.dump(dump_map, map_file)
+    os.replace(tmp_path, map_path)
+    return
+
+
+def _add_unreadable(unreadable: list, start: int, end: int) -> None:
+    if unreadable and unreadable[-1][1] == start:
+        unreadable[-1][1] = end
+    else:
+        unreadable.append([start, end])
+    return
+
+
+def dump_memory(start: int, end: int, path: str, chunk: int = DUMP_CHUNK_SIZE, physical=False, resume=False) -> dict:
+    """
+    Stream the memory range [start, end) into a sparse file, ``chunk`` bytes per read.
+    Unreadable pages are left as holes and recorded in the side-car map file (``path`` + '.map'), which also
+    records the progress, so an interrupted dump can be continued with ``resume=True``.
+    :param int start: First address to dump
+    :param int end: Address to stop at (exclusive)
+    :param str path: Output file. Offset 0 holds ``start``
+    :param int chunk: Bytes per read. Rounded down to a multiple of the stub's maximum packet payload
+    :param physical: dump physical memory. default = False.
+    :param resume: continue a previous dump of the same range into ``path``. default = False.
+    :return dict: The side-car map, plus 'read' (bytes read by this call) and 'seconds'
+    """
+    if end <= start:
+        raise ValueError(f"Empty range: {hex(start)}-{hex(end)}")
+
+    payload = get_max_read_payload()
+    chunk = max(payload, chunk - chunk % payload)
+
+    map_path = path + MAP_SUFFIX
+    dump_map = {'start': start, 'end': end, 'physical': bool(physical), 'done': start, 'unreadable': []}
+    if resume and os.path.exists(map_path) and os.path.exists(path):
+        with open(map_path) as map_file:
+            previous_map = json.load(map_file)
+        if (previous_map['start'], previous_map['end'], previous_map['physical']) != (start, end, bool(physical)):
+            raise ValueError(f"{map_path} describes a different dump")
+        dump_map = previous_map
+        mode = 'r+b'
+    else:
+        mode = 'wb'
+
+    started = time.monotonic()
+    read = 0
+    with open(path, mode) as dump_file:
+        # Sparse - unreadable ranges never take up disk space
+        dump_file.truncate(end - start)
+
+        with GDBP_OBJ.phys_mode() if physical else contextlib.nullcontext():
+            address = dump_map['done']
+            while address < end:
+                chunk_end = min(address + chunk, end)
+                for piece_start, data in _read_run(address, chunk_end):
+                    if data is None:
+                        piece_end = min((piece_start & ~(PAGE_SIZE - 1)) + PAGE_SIZE, chunk_end)
+                        _add_unreadable(dump_map['unreadable'], piece_start, piece_end)
+                        continue
+                    dump_file.seek(piece_start - start)
+                    dump_file.write(data)
+                    read += len(data)
+
+                # The map must never claim data that isn't in the file yet
+                dump_file.flush()
+                address = dump_map['done'] = chunk_end
+                _write_map(map_path, dump_map)
+
+    result = dict(dump_map)
+    result['read'] = read
+    result['seconds'] = time.monotonic() - started
+    return result
+
+
+class DumpMemoryCommand(gdb.Command):
+    """
+    Dump a memory range to a sparse file, recording unreadable pages in PATH.map.
+    Usage: gdbp-dump-memory [-p] [-r] [-c CHUNK] START END PATH
+    -p: physical memory, -r: resume an interrupted dump, -c: bytes per read
+    """
+
+    def __init__(self):
+        super(DumpMemoryCommand, self).__init__("gdbp-dump-memory", gdb.COMMAND_DATA, gdb.COMPLETE_FILENAME)
+
+    def invoke(self, argument, from_tty):
+        self.dont_repeat()
+        argv = gdb.string_to_argv(argument)
+        physical = resume = False
+        chunk = DUMP_CHUNK_SIZE
+        positional = []
+        while argv:
+            arg = argv.pop(0)
+            if arg == '-p':
+                physical = True
+            elif arg == '-r':
+                resume = True
+            elif arg == '-c':
+                chunk = int(gdb.parse_and_eval(argv.pop(0)))
+            else:
+                positional.append(arg)
+
+        if len(positional) != 3:
+            raise gdb.GdbError("Usage: gdbp-dump-memory [-p] [-r] [-c CHUNK] START END PATH")
+
+        start = int(gdb.parse_and_eval(positional[0]))
+        end = int(gdb.parse_and_eval(positional[1]))
+        result = dump_memory(start, end, positional[2], chunk, physical, resume)
+
+        seconds = max(result['seconds'], 1e-9)
+        print(f"[gdbp: dump_memory()] - {hex(start)}-{hex(end)} -> {positional[2]}: "
+              f"read {result['read']:#x} bytes in {seconds:.2f}s ({result['read'] / seconds / 2 ** 20:.2f} MiB/s), "
+              f"{len(result['unreadable'])} unreadable range(s)")
+
+
+DumpMemoryCommand()
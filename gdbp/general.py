@@ -1,4 +1,8 @@
-import gdb
+import contextlib
+
+from .backend import gdb
+from .breakpoints import HW_BREAKPOINTS
+from .rsp import GdbpRspError, get_rsp_channel
 
 
 VMWARE_MONITOR_OUT = ('Supported monitor commands:\n   help\n   r\n   phys\n   virt\nPlease use "monitor help '
@@ -9,6 +13,8 @@ class GeneralGdbp:
     def __init__(self):
         self.init = False
         self.vmware = False
+        # The stub starts out in virtual mode
+        self.phys = False
 
     def init_detect_vmware_or_qemu(self) -> None:
         """
@@ -17,7 +23,7 @@ class GeneralGdbp:
         """
 
         if not self.init:
-            out_cmd = gdb.execute("monitor help", to_string=True)
+            out_cmd = get_rsp_channel().monitor("help")
             if out_cmd == VMWARE_MONITOR_OUT:
                 print("[gdbp: init_detect_vmware_or_qemu()] - Detected VMware")
                 self.set_vmware()
@@ -47,60 +53,306 @@ class GeneralGdbp:
         if self.init:
             return self.vmware
 
-    def turn_phys_mode_on(self) -> None:
+    def turn_phys_mode_on(self, force=False) -> None:
         """
         Set the gdbstub to work with the physical memory rather with the virtual one
+        :param force: send the command even if the stub is already known to be in physical mode. default = False.
         :return:
         """
 
+        if self.phys and not force:
+            return
+
         if self.vmware:
-            gdb.execute("monitor phys", to_string=True)
+            get_rsp_channel().monitor("phys")
         else:
-            gdb.execute("maint packet Qqemu.PhyMemMode:1", to_string=True)
+            get_rsp_channel().send("Qqemu.PhyMemMode:1")
+        self.phys = True
 
         return
 
-    def turn_phys_mode_off(self) -> None:
+    def turn_phys_mode_off(self, force=False) -> None:
         """
         Return the gdbstub to work with the virtual memory rather with the physical one
+        :param force: send the command even if the stub is already known to be in virtual mode. default = False.
         :return:
         """
 
+        if not self.phys and not force:
+            return
+
         if self.vmware:
-            gdb.execute("monitor virt", to_string=True)
+            get_rsp_channel().monitor("virt")
         else:
-            gdb.execute("maint packet Qqemu.PhyMemMode:0", to_string=True)
+            get_rsp_channel().send("Qqemu.PhyMemMode:0")
+        self.phys = False
 
         return
 
+    def set_phys_mode(self, phys: bool) -> None:
+        """
+        Switch the gdbstub to physical (True) or virtual (False) memory
+        :return:
+        """
+
+        if phys:
+            self.turn_phys_mode_on()
+        else:
+            self.turn_phys_mode_off()
 
-def get_symbol_address(symbol) -> int:
+        return
+
+    @contextlib.contextmanager
+    def phys_mode(self):
+        """
+        Context manager - work with the physical memory inside the block, then return to the previous mode.
+        Nested blocks don't switch the stub again.
+        """
+
+        was_phys = self.phys
+        self.turn_phys_mode_on()
+        try:
+            yield
+        finally:
+            if not was_phys:
+                self.turn_phys_mode_off()
+
+
+GDBP_OBJ = GeneralGdbp()
+
+
+def is_vmware_stub(channel) -> bool:
     """
-    :param str symbol: The symbol's name
-    :return int: The symbol's address
+    For channels GDBP_OBJ doesn't describe - other connections to the stub, or stubs gdbp talks to without GDB
+    :param RspChannel channel: A connection to the stub
+    :return bool: Whether the stub is VMware's (recognized by its "monitor help")
+    """
+    try:
+        return channel.monitor("help") == VMWARE_MONITOR_OUT
+    except GdbpRspError:
+        return False
+
+
+def set_channel_phys_mode(channel, phys: bool, vmware: bool) -> None:
+    """
+    Switch the stub behind ``channel`` to physical (True) or virtual (False) memory
+    :param bool vmware: The stub is VMware's - see ``is_vmware_stub``
+    :return:
+    """
+    if vmware:
+        # A failed monitor command raises GdbpRspError by itself
+        channel.monitor("phys" if phys else "virt")
+        return
+
+    reply = channel.send(f"Qqemu.PhyMemMode:{int(bool(phys))}")
+    if reply != b'OK':
+        # VMware (or an older QEMU) answers with an empty reply and stays in the previous mode
+        raise GdbpRspError(f"The stub didn't switch to {'physical' if phys else 'virtual'} memory: {reply!r}")
+    return
+
+
+class SymbolCache:
+    """
+    Addresses of the symbols resolved so far, grouped by the object file that defines them, plus an optional index
+    loaded from a System.map / kallsyms listing.
+    Loading an object file only drops the addresses it may change: those of object files that are gone or have the
+    same file name (a reloaded module), and those whose object file is unknown. The index is kept.
+    """
+
+    def __init__(self):
+        # Symbol name: address, across every object file
+        self.addresses = {}
+        # gdb.Objfile (None = unknown): names of its symbols in ``addresses``
+        self.objfiles = {}
+        self.index = {}
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, symbol: str, address: int, objfile=None) -> None:
+        """
+        :param objfile: The gdb.Objfile defining ``symbol``, or None if unknown
+        :return:
+        """
+        self.addresses[symbol] = address
+        self.objfiles.setdefault(objfile, set()).add(symbol)
+        return
+
+    def drop_objfile(self, objfile) -> None:
+        """
+        Forget the resolved addresses of one object file (None = the ones of unknown object files)
+        :return:
+        """
+        for symbol in self.objfiles.pop(objfile, ()):
+            self.addresses.pop(symbol, None)
+        return
+
+    def on_new_objfile(self, event) -> None:
+        """
+        gdb.events.new_objfile handler
+        :return:
+        """
+        new = event.new_objfile
+        for objfile in list(self.objfiles):
+            if objfile is None or not objfile.is_valid() or objfile.filename == new.filename:
+                self.drop_objfile(objfile)
+        return
+
+    def on_free_objfile(self, event) -> None:
+        """
+        gdb.events.free_objfile handler
+        :return:
+        """
+        self.drop_objfile(event.objfile)
+        return
+
+    def flush(self, *_event) -> None:
+        """
+        Forget every resolved address. Also used as a gdb.events handler, hence the ignored event argument
+        :return:
+        """
+        self.addresses.clear()
+        self.objfiles.clear()
+        return
+
+    def lookup(self, symbol: str):
+        """
+        :return int: The cached or indexed address of ``symbol``, or None
+        """
+        address = self.addresses.get(symbol)
+        if address is None:
+            address = self.index.get(symbol)
+        if address is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return address
+
+
+SYMBOL_CACHE = SymbolCache()
+
+gdb.events.new_objfile.connect(SYMBOL_CACHE.on_new_objfile)
+# gdb.events.clear_objfiles was added in GDB 7.6, gdb.events.free_objfile in GDB 13
+if hasattr(gdb.events, 'clear_objfiles'):
+    gdb.events.clear_objfiles.connect(SYMBOL_CACHE.flush)
+if hasattr(gdb.events, 'free_objfile'):
+    gdb.events.free_objfile.connect(SYMBOL_CACHE.on_free_objfile)
+
+
+def _lookup_symbol_address(symbol: str) -> tuple:
+    """
+    :return tuple: The symbol's address, and the gdb.Objfile defining it (None if unknown)
     """
     # gdb.lookup_symbol was added in GDB 7.2
     symbol_object = gdb.lookup_symbol(symbol)[0]
     if symbol_object:
-        return int(symbol_object.value().address)
+        symtab = getattr(symbol_object, 'symtab', None)
+        return int(symbol_object.value().address), symtab.objfile if symtab is not None else None
     else:
         # Workaround for non-debugging symbols
-        value_object = gdb.parse_and_eval('&' + symbol)
-        return int(value_object)
+        address = int(gdb.parse_and_eval('&' + symbol))
+        # gdb.Progspace.objfile_for_address was added in GDB 13
+        progspace = gdb.current_progspace() if hasattr(gdb, 'current_progspace') else None
+        if progspace is not None and hasattr(progspace, 'objfile_for_address'):
+            return address, progspace.objfile_for_address(address)
+        return address, None
+
+
+def get_symbol_address(symbol) -> int:
+    """
+    :param str symbol: The symbol's name
+    :return int: The symbol's address
+    """
+    address = SYMBOL_CACHE.lookup(symbol)
+    if address is None:
+        address, objfile = _lookup_symbol_address(symbol)
+        SYMBOL_CACHE.add(symbol, address, objfile)
+    return address
+
+
+def resolve_symbols(names, skip_errors=False) -> dict:
+    """
+    Resolve many symbols at once. Only the ones that aren't cached or indexed are looked up in GDB
+    :param names: Iterable of symbol names
+    :param bool skip_errors: Map unknown symbols to None instead of raising
+    :return dict: The symbols' addresses by name
+    """
+    addresses = {}
+    for name in names:
+        if name in addresses:
+            continue
+        try:
+            addresses[name] = get_symbol_address(name)
+        except gdb.error:
+            if not skip_errors:
+                raise
+            addresses[name] = None
+    return addresses
+
+
+def load_symbol_map(path: str = None, text: str = None, slide: int = 0) -> int:
+    """
+    Index the symbols of a System.map or /proc/kallsyms listing ("<address> <type> <name> [module]" per line),
+    so they resolve without debug info. Symbols already in the index keep their address
+    :param str path: The listing's file
+    :param str text: The listing itself, instead of ``path``
+    :param int slide: Added to every address, e.g. the KASLR slide when the listing is System.map. default = 0.
+    :return int: The number of symbols added to the index
+    """
+    if (path is None) == (text is None):
+        raise ValueError("Pass either path or text")
+    if path is not None:
+        with open(path) as symbol_map:
+            text = symbol_map.read()
+
+    added = 0
+    for line in text.splitlines():
+        fields = line.split()
+        if len(fields) < 3:
+            continue
+        try:
+            address = int(fields[0], 16)
+        except ValueError:
+            continue
+        if fields[2] not in SYMBOL_CACHE.index:
+            SYMBOL_CACHE.index[fields[2]] = address + slide
+            added += 1
+
+    print(f"[gdbp: load_symbol_map()] - Indexed {added} symbols")
+    return added
+
+
+def clear_symbol_cache(index=False) -> None:
+    """
+    Forget every resolved symbol address
+    :param index: also drop the symbols loaded with load_symbol_map. default = False.
+    :return:
+    """
+    SYMBOL_CACHE.flush()
+    if index:
+        SYMBOL_CACHE.index.clear()
+    return
 
 
 def hw_bp(addr: int) -> gdb.Breakpoint:
     """
-    Set hardware breakpoint via 'gdb.Breakpoint'
+    Set hardware breakpoint via 'gdb.Breakpoint', in a slot of HW_BREAKPOINTS (raises GdbpNoFreeHwSlot when they are
+    all taken)
     :param addr: int: address
-    :return: instance of 'gdb.Breakpoint' object
+    :return: instance of 'gdb.Breakpoint' object (the existing one, if ``addr`` already has one)
     """
     try:
-        addr_as_str_hex = hex(addr)
+        hex(addr)
     except (SyntaxError, TypeError) as e:
         print(e)
     else:
-        return gdb.Breakpoint(f'*{addr_as_str_hex}', type=gdb.BP_HARDWARE_BREAKPOINT)
+        return HW_BREAKPOINTS.add(addr).bp
+
+
+def _managed_hw_bp(bp_obj: gdb.Breakpoint):
+    """
+    :return HwBreakpoint: The HW_BREAKPOINTS entry of ``bp_obj`` (a valid breakpoint), or None
+    """
+    return HW_BREAKPOINTS.by_number.get(bp_obj.number)
 
 
 def disable_bp(bp_obj: gdb.Breakpoint) -> None:
@@ -110,7 +362,12 @@ def disable_bp(bp_obj: gdb.Breakpoint) -> None:
     :return:
     """
     if bp_obj.is_valid():
-        bp_obj.enabled = False
+        entry = _managed_hw_bp(bp_obj)
+        if entry is not None:
+            # Frees its slot for a waiting breakpoint
+            HW_BREAKPOINTS.disable([entry.address])
+        else:
+            bp_obj.enabled = False
     return
 
 
@@ -121,7 +378,11 @@ def delete_bp(bp_obj: gdb.Breakpoint) -> None:
     :return:
     """
     if bp_obj.is_valid():
-        bp_obj.delete()
+        entry = _managed_hw_bp(bp_obj)
+        if entry is not None:
+            HW_BREAKPOINTS.remove(entry.address)
+        else:
+            bp_obj.delete()
 
     return
 
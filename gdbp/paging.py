@@ -0,0 +1,183 @@
+import struct
+
+from .backend import gdb
+from . import rw_memory, rw_registers
+from .general import parse_cr0, parse_cr4, parse_ia32_efer
+
+PAGE_PRESENT = 0x1
+PAGE_SIZE_BIT = 0x80
+
+ENTRY_ADDRESS_MASK = 0x000FFFFFFFFFF000
+LEGACY_ENTRY_ADDRESS_MASK = 0xFFFFF000
+PDPT_ADDRESS_MASK = 0xFFFFFFE0
+
+SHIFT_4K = 12
+SHIFT_2M = 21
+SHIFT_4M = 22
+SHIFT_1G = 30
+# Checked in this order when looking up the translation cache
+PAGE_SHIFTS = (SHIFT_4K, SHIFT_2M, SHIFT_1G, SHIFT_4M)
+
+LEGACY_TABLE = struct.Struct('<1024L')
+PAE_PDPT = struct.Struct('<4Q')
+TABLE = struct.Struct('<512Q')
+
+
+class GdbpTranslationError(RuntimeError):
+    pass
+
+
+class TranslationCache:
+    """
+    TLB-like cache of page translations (per CR3), and of the paging-structure tables the walks went through.
+    Flushed whenever the target stops, resumes or its memory is changed from GDB.
+    """
+
+    def __init__(self):
+        self.translations = {}
+        self.tables = {}
+        self.hits = 0
+        self.misses = 0
+
+    def flush(self, *_event) -> None:
+        """
+        Drop every cached translation and table. Also used as a gdb.events handler, hence the ignored event argument
+        :return:
+        """
+        self.translations.clear()
+        self.tables.clear()
+        return
+
+    def lookup(self, cr3: int, vaddr: int):
+        """
+        :return int: The cached physical address of ``vaddr``, or None
+        """
+        for shift in PAGE_SHIFTS:
+            page_base = self.translations.get((cr3, shift, vaddr >> shift))
+            if page_base is not None:
+                self.hits += 1
+                return page_base | (vaddr & ((1 << shift) - 1))
+
+        self.misses += 1
+        return None
+
+    def insert(self, cr3: int, vaddr: int, shift: int, page_base: int) -> None:
+        self.translations[(cr3, shift, vaddr >> shift)] = page_base
+        return
+
+
+TRANSLATION_CACHE = TranslationCache()
+
+gdb.events.stop.connect(TRANSLATION_CACHE.flush)
+gdb.events.cont.connect(TRANSLATION_CACHE.flush)
+# gdb.events.memory_changed is missing from older GDB versions
+if hasattr(gdb.events, 'memory_changed'):
+    gdb.events.memory_changed.connect(TRANSLATION_CACHE.flush)
+
+
+def flush_translation_cache() -> None:
+    """
+    Forget every cached translation, e.g. after the guest's page tables were changed behind GDB's back
+    :return:
+    """
+    TRANSLATION_CACHE.flush()
+    return
+
+
+def _read_table(address: int, table_struct: struct.Struct) -> tuple:
+    """
+    :return tuple: Every entry of the paging-structure table at physical ``address``.
+    Must be called with the stub in physical mode.
+    """
+    key = (address, table_struct.size)
+    table = TRANSLATION_CACHE.tables.get(key)
+    if table is None:
+        data = rw_memory.read_bytes(address, table_struct.size)
+        table = TRANSLATION_CACHE.tables[key] = table_struct.unpack(data)
+    return table
+
+
+def _read_efer():
+    # Not every stub exposes IA32_EFER
+    try:
+        if rw_registers.GDBP_OBJ.is_vmware():
+            return rw_registers.SYSTEM_REGISTERS.get('efer')
+        return rw_registers.REGISTER_SNAPSHOT.read(gdb.selected_frame(), 'efer')
+    except (ValueError, gdb.error):
+        return None
+
+
+def _is_long_mode(efer) -> bool:
+    if efer is not None:
+        return parse_ia32_efer(efer)['LMA']
+    return 'x86-64' in gdb.selected_frame().architecture().name()
+
+
+def _entry(table_address: int, table_struct: struct.Struct, index: int, vaddr: int) -> int:
+    entry = _read_table(table_address, table_struct)[index]
+    if not entry & PAGE_PRESENT:
+        raise GdbpTranslationError(f"{hex(vaddr)} is not mapped (not-present entry {hex(entry)} "
+                                   f"in the table at {hex(table_address)})")
+    return entry
+
+
+def _walk_legacy(vaddr: int, cr3: int, pse: bool) -> tuple[int, int]:
+    pde = _entry(cr3 & LEGACY_ENTRY_ADDRESS_MASK, LEGACY_TABLE, (vaddr >> 22) & 0x3FF, vaddr)
+    if pse and pde & PAGE_SIZE_BIT:
+        # PSE-36: bits 20:13 of the PDE are bits 39:32 of the page
+        return (pde & 0xFFC00000) | (((pde >> 13) & 0xFF) << 32), SHIFT_4M
+
+    pte = _entry(pde & LEGACY_ENTRY_ADDRESS_MASK, LEGACY_TABLE, (vaddr >> 12) & 0x3FF, vaddr)
+    return pte & LEGACY_ENTRY_ADDRESS_MASK, SHIFT_4K
+
+
+def _walk(vaddr: int, table_address: int, top_shift: int) -> tuple[int, int]:
+    """
+    Walk 4\\5-level and the last two levels of PAE paging, from the table indexed by bits [top_shift + 8:top_shift]
+    :return tuple[int, int]: The physical base of the page, and log2 of its size
+    """
+    shift = top_shift
+    while True:
+        entry = _entry(table_address, TABLE, (vaddr >> shift) & 0x1FF, vaddr)
+        if shift == SHIFT_4K:
+            return entry & ENTRY_ADDRESS_MASK, SHIFT_4K
+        if shift in (SHIFT_2M, SHIFT_1G) and entry & PAGE_SIZE_BIT:
+            return entry & ENTRY_ADDRESS_MASK & ~((1 << shift) - 1), shift
+
+        table_address = entry & ENTRY_ADDRESS_MASK
+        shift -= 9
+
+
+def translate(vaddr: int, cr3: int = None) -> int:
+    """
+    Translate a virtual address to a physical one by walking the guest's page tables.
+    Supports legacy 32-bit (with PSE), PAE, 4-level and 5-level (LA57) paging and 4K\\2M\\4M\\1G pages.
+    :param int vaddr: Virtual address
+    :param int cr3: Address space to translate in. default = the CR3 of the current logical processor
+    :return int: Physical address
+    """
+    if cr3 is None:
+        cr3 = rw_registers.get_cr3()
+
+    paddr = TRANSLATION_CACHE.lookup(cr3, vaddr)
+    if paddr is not None:
+        return paddr
+
+    cr0 = parse_cr0(rw_registers.get_cr0())
+    if not cr0['PG']:
+        return vaddr
+
+    cr4 = parse_cr4(rw_registers.get_cr4())
+
+    with rw_memory.phys_mode():
+        if not cr4['PAE']:
+            page_base, shift = _walk_legacy(vaddr & 0xFFFFFFFF, cr3, cr4['PSE'])
+        elif _is_long_mode(_read_efer()):
+            top_shift = 48 if cr4['LA57'] else 39
+            page_base, shift = _walk(vaddr, cr3 & ENTRY_ADDRESS_MASK, top_shift)
+        else:
+            pdpte = _entry(cr3 & PDPT_ADDRESS_MASK, PAE_PDPT, (vaddr >> 30) & 0x3, vaddr)
+            page_base, shift = _walk(vaddr, pdpte & ENTRY_ADDRESS_MASK, SHIFT_2M)
+
+    TRANSLATION_CACHE.insert(cr3, vaddr, shift, page_base)
+    return page_base | (vaddr & ((1 << shift) - 1))
@@ -0,0 +1,141 @@
+import os
+import queue
+import threading
+import time
+
+from .general import is_vmware_stub, set_channel_phys_mode
+from .rsp import PACKET_TIMEOUT, SocketRspChannel
+from .rw_memory import PAGE_MASK, PAGE_SIZE, _read_pieces
+
+PARALLEL_CHUNK_SIZE = 0x40000
+DEFAULT_CONNECTIONS = 4
+
+
+class ParallelReader:
+    """
+    Reads a large memory range over several connections to the gdbstub at once, each with its own packet in flight.
+    For scripted acquisition - GDB keeps a single connection, so this talks to the stub directly.
+    """
+
+    def __init__(self, address, connections: int = DEFAULT_CONNECTIONS, chunk: int = PARALLEL_CHUNK_SIZE,
+                 physical=False, timeout: float = PACKET_TIMEOUT, vmware=None):
+        """
+        :param address: (host, port), "host:port" or a Unix socket path of the stub
+        :param int connections: Number of connections to open
+        :param int chunk: Bytes per work item. Rounded up to whole pages
+        :param physical: read physical memory. default = False.
+        :param float timeout: Seconds to wait for a reply
+        :param vmware: The stub is VMware's (True) or QEMU's (False). default = ask the stub, if ``physical``.
+        """
+        if connections < 1:
+            raise ValueError(f"Bad number of connections: {connections}")
+        self.chunk = max(PAGE_SIZE, (chunk + PAGE_SIZE - 1) & PAGE_MASK)
+        self.physical = physical
+        self.vmware = vmware
+        self.channels = []
+        try:
+            for _ in range(connections):
+                channel = SocketRspChannel(address, timeout)
+                self.channels.append(channel)
+                if physical:
+                    if self.vmware is None:
+                        self.vmware = is_vmware_stub(channel)
+                    set_channel_phys_mode(channel, True, self.vmware)
+        except BaseException:
+            self.close()
+            raise
+
+    def read(self, start: int, end: int, output=None) -> dict:
+        """
+        Read [start, end), sharded in chunks across the connections, and reassemble it in order.
+        :param int start: First address to read
+        :param int end: Address to stop at (exclusive)
+        :param output: A file path (written sparse - unreadable ranges are holes), a writable buffer of at least
+        ``end - start`` bytes (bytearray, mmap, ...), or None for a new bytearray. Offset 0 holds ``start``
+        :return dict: 'data' (the buffer, or None for a file), 'read' (bytes read), 'unreadable' ([start, end) pairs),
+        'seconds', 'bytes_per_second' and 'per_connection' (bytes read by each connection)
+        """
+        if end <= start:
+            raise ValueError(f"Empty range: {hex(start)}-{hex(end)}")
+
+        work = queue.Queue()
+        for chunk_start in range(start, end, self.chunk):
+            work.put((chunk_start, min(chunk_start + self.chunk, end)))
+
+        if output is None:
+            output = bytearray(end - start)
+        if isinstance(output, str):
+            data = None
+            fd = os.open(output, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+            os.ftruncate(fd, end - start)
+        else:
+            data = output
+            fd = None
+            if len(data) < end - start:
+                raise ValueError(f"The output buffer holds {hex(len(data))} bytes, {hex(end - start)} are needed")
+
+        view = memoryview(data) if data is not None else None
+        unreadable = []
+        per_connection = [0] * len(self.channels)
+        errors = []
+
+        def worker(index: int, channel: SocketRspChannel) -> None:
+            try:
+                while True:
+                    try:
+                        chunk_start, chunk_end = work.get_nowait()
+                    except queue.Empty:
+                        return
+                    for piece_start, piece in _read_pieces(channel.read_memory, chunk_start, chunk_end):
+                        if piece is None:
+                            unreadable.append((piece_start, min((piece_start & PAGE_MASK) + PAGE_SIZE, chunk_end)))
+                            continue
+                        offset = piece_start - start
+                        if fd is None:
+                            view[offset:offset + len(piece)] = piece
+                        else:
+                            os.pwrite(fd, piece, offset)
+                        per_connection[index] += len(piece)
+            except BaseException as exception:
+                errors.append(exception)
+
+        started = time.monotonic()
+        threads = [threading.Thread(target=worker, args=(index, channel), daemon=True)
+                   for index, channel in enumerate(self.channels)]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            if fd is not None:
+                os.close(fd)
+            if view is not None:
+                view.release()
+        seconds = max(time.monotonic() - started, 1e-9)
+
+        if errors:
+            raise errors[0]
+
+        merged = []
+        for piece_start, piece_end in sorted(unreadable):
+            if merged and merged[-1][1] == piece_start:
+                merged[-1][1] = piece_end
+            else:
+                merged.append([piece_start, piece_end])
+
+        read = sum(per_connection)
+        return {'data': data, 'read': read, 'unreadable': merged, 'seconds': seconds,
+                'bytes_per_second': read / seconds, 'per_connection': per_connection}
+
+    def close(self) -> None:
+        for channel in self.channels:
+            channel.close()
+        self.channels = []
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc_info):
+        self.close()
@@ -0,0 +1,381 @@
+import abc
+import binascii
+import os
+import re
+import socket
+
+from .backend import STANDALONE, STUB_ENV, gdb
+from . import stats
+
+PACKET_TIMEOUT = 5.0
+DEFAULT_PACKET_SIZE = 0x1000
+
+_RECEIVED_PATTERN = re.compile(r'received: "(.*)"', re.DOTALL)
+_ESCAPE_PATTERN = re.compile(r'\\(x[0-9a-fA-F]{2}|[0-7]{1,3}|.)', re.DOTALL)
+_ERROR_REPLY_PATTERN = re.compile(rb'E[0-9a-fA-F]{2}')
+_C_ESCAPES = {'n': '\n', 'r': '\r', 't': '\t', 'a': '\a', 'b': '\b', 'f': '\f', 'v': '\v', 'e': '\x1b'}
+
+
+# Bytes each instrumented channel method moved - see gdbp.stats
+def _packet_size(args, reply) -> int:
+    return len(args[1]) + len(reply or b'')
+
+
+def _monitor_size(args, output) -> int:
+    return len(args[1]) + len(output or '')
+
+
+def _read_size(args, data) -> int:
+    return len(data or b'')
+
+
+def _write_size(args, _result) -> int:
+    return len(args[2])
+
+
+_instrument_packet = stats.instrument('packet', _packet_size, skip=1)
+_instrument_monitor = stats.instrument('monitor', _monitor_size, skip=1)
+_instrument_read_memory = stats.instrument('read_memory', _read_size, skip=1)
+_instrument_write_memory = stats.instrument('write_memory', _write_size, skip=1)
+
+
+class GdbpRspError(RuntimeError):
+    pass
+
+
+# Memory errors are caught as gdb.MemoryError all over gdbp
+class RspMemoryError(GdbpRspError, gdb.MemoryError):
+    pass
+
+
+def _unescape_gdb_string(text: str) -> bytes:
+    """
+    :return bytes: The packet GDB printed, with its C-style escapes ("\\x01", "\\001", "\\"") decoded
+    """
+    def replace(match):
+        escape = match.group(1)
+        if escape[0] == 'x' and len(escape) == 3:
+            return chr(int(escape[1:], 16))
+        if escape[0] in '01234567':
+            return chr(int(escape, 8))
+        return _C_ESCAPES.get(escape, escape)
+
+    return _ESCAPE_PATTERN.sub(replace, text).encode('latin-1')
+
+
+def is_error_reply(reply: bytes) -> bool:
+    """
+    :return bool: Whether ``reply`` is an 'Enn' error - hex data may start with 'E' too
+    """
+    return len(reply) == 3 and _ERROR_REPLY_PATTERN.fullmatch(reply) is not None
+
+
+def _check_reply(reply: bytes, packet: str) -> bytes:
+    if is_error_reply(reply):
+        raise GdbpRspError(f"{packet!r} failed: {reply.decode('latin-1')}")
+    return reply
+
+
+def parse_stub_address(address):
+    """
+    :param address: (host, port), "host:port" or the path of a Unix socket
+    :return: (host, port) for a TCP stub, the path for a Unix socket
+    """
+    if isinstance(address, str) and ':' in address and not address.startswith('/'):
+        host, port = address.rsplit(':', 1)
+        return host or 'localhost', int(port)
+    if isinstance(address, list):
+        return tuple(address)
+    return address
+
+
+class RspChannel(abc.ABC):
+    """
+    Sends raw GDB remote serial protocol packets to the gdbstub, and returns the decoded replies.
+    Subclasses implement ``send`` and ``receive``; everything else is built on them.
+    """
+
+    @abc.abstractmethod
+    def send(self, packet: str) -> bytes:
+        """
+        :param str packet: Packet payload, without the '$' and checksum framing
+        :return bytes: Payload of the reply
+        """
+
+    @_instrument_monitor
+    def monitor(self, command: str) -> str:
+        """
+        :param str command: Monitor command ("monitor <command>" in GDB), sent as qRcmd
+        :return str: Output of the command
+        """
+        reply = self.send('qRcmd,' + binascii.hexlify(command.encode()).decode())
+        output = []
+        # Output may come in 'O' packets before the final 'OK', or hex encoded as the reply itself
+        while reply.startswith(b'O') and reply != b'OK':
+            output.append(binascii.unhexlify(reply[1:]))
+            reply = self.receive()
+        if not reply:
+            raise GdbpRspError("The stub doesn't support monitor commands")
+        _check_reply(reply, f'monitor {command}')
+        if reply != b'OK':
+            output.append(binascii.unhexlify(reply))
+        return b''.join(output).decode('latin-1')
+
+    @abc.abstractmethod
+    def receive(self) -> bytes:
+        """
+        :return bytes: Payload of the next packet the stub sends, for replies that span several packets
+        """
+
+    @_instrument_read_memory
+    def read_memory(self, address: int, length: int) -> bytes:
+        """
+        Read memory with 'm' packets
+        :return bytes: ``length`` bytes at ``address``
+        """
+        chunks = []
+        end = address + length
+        while address < end:
+            chunk_length = min(end - address, self.max_memory_payload())
+            reply = self.send(f'm{address:x},{chunk_length:x}')
+            if is_error_reply(reply) or not reply:
+                raise RspMemoryError(f'Cannot access memory at address {hex(address)}')
+            chunks.append(binascii.unhexlify(reply))
+            address += chunk_length
+        return b''.join(chunks)
+
+    @_instrument_write_memory
+    def write_memory(self, address: int, data: bytes) -> None:
+        """
+        Write memory with 'M' packets
+        :return:
+        """
+        data = bytes(data)
+        step = self.max_memory_payload()
+        for offset in range(0, len(data), step):
+            chunk = data[offset:offset + step]
+            reply = self.send(f'M{address + offset:x},{len(chunk):x}:{binascii.hexlify(chunk).decode()}')
+            if reply != b'OK':
+                raise RspMemoryError(f'Cannot access memory at address {hex(address + offset)}')
+        return
+
+    def read_registers(self) -> bytes:
+        """
+        :return bytes: The 'g' packet register block, in the target's byte order and register numbering
+        """
+        return binascii.unhexlify(_check_reply(self.send('g'), 'g'))
+
+    def read_register(self, number: int) -> bytes:
+        """
+        :param int number: Register number in the target description
+        :return bytes: The raw register, in the target's byte order
+        """
+        return binascii.unhexlify(_check_reply(self.send(f'p{number:x}'), f'p{number:x}'))
+
+    def max_memory_payload(self) -> int:
+        """
+        :return int: Number of memory bytes a single 'm' or 'M' packet can carry
+        """
+        return DEFAULT_PACKET_SIZE
+
+
+class GdbRspChannel(RspChannel):
+    """
+    Channel of the connection GDB itself holds - packets go through "maint packet".
+    Memory goes through GDB's own read\\write, which uses the binary packets and keeps GDB's caches coherent.
+    """
+
+    @_instrument_packet
+    def send(self, packet: str) -> bytes:
+        out = gdb.execute(f"maint packet {packet}", to_string=True)
+        match = _RECEIVED_PATTERN.search(out)
+        if not match:
+            raise GdbpRspError(f"Unexpected output of maint packet {packet}: {out!r}")
+        return _unescape_gdb_string(match.group(1))
+
+    def receive(self) -> bytes:
+        raise GdbpRspError("maint packet returns a single reply")
+
+    @_instrument_monitor
+    def monitor(self, command: str) -> str:
+        # Not qRcmd through ``send``: "maint packet" reads a single reply, so the 'O' packets after the first one
+        # (and the final 'OK') would be left on GDB's connection and taken as the replies to the next packets.
+        # GDB's own monitor command collects them all; its output is the stub's text as is
+        return gdb.execute(f"monitor {command}", to_string=True)
+
+    @_instrument_read_memory
+    def read_memory(self, address: int, length: int) -> bytes:
+        # gdb.Inferior.read_memory was added in GDB 7.2
+        return bytes(gdb.selected_inferior().read_memory(address, length))
+
+    @_instrument_write_memory
+    def write_memory(self, address: int, data: bytes) -> None:
+        gdb.selected_inferior().write_memory(address, data, len(data))
+        return
+
+
+class SocketRspChannel(RspChannel):
+    """
+    Channel straight to the gdbstub's TCP or Unix socket, for scripting without GDB.
+    The stub serves one debugger at a time - GDB must not be connected to it as well.
+    """
+
+    def __init__(self, address, timeout: float = PACKET_TIMEOUT):
+        """
+        :param address: (host, port) of a TCP stub, "host:port", or the path of a Unix socket
+        :param float timeout: Seconds to wait for a reply
+        """
+        address = parse_stub_address(address)
+        if isinstance(address, tuple):
+            self.sock = socket.create_connection(address, timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        else:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            self.sock.connect(address)
+
+        self.buffer = bytearray()
+        self.ack = True
+        self.packet_size = DEFAULT_PACKET_SIZE
+
+        features = self.send('qSupported:xmlRegisters=i386').decode('latin-1').split(';')
+        for feature in features:
+            if feature.startswith('PacketSize='):
+                self.packet_size = int(feature.split('=', 1)[1], 16)
+        if 'QStartNoAckMode+' in features and self.send('QStartNoAckMode') == b'OK':
+            self.ack = False
+
+    def _fill(self) -> None:
+        data = self.sock.recv(0x10000)
+        if not data:
+            raise GdbpRspError("The stub closed the connection")
+        self.buffer += data
+        return
+
+    @staticmethod
+    def _frame(packet: bytes) -> bytes:
+        escaped = bytearray()
+        for byte in packet:
+            if byte in b'#$}*':
+                escaped += bytes((ord('}'), byte ^ 0x20))
+            else:
+                escaped.append(byte)
+        return b'$' + bytes(escaped) + b'#' + b'%02x' % (sum(escaped) & 0xFF)
+
+    @_instrument_packet
+    def send(self, packet: str) -> bytes:
+        framed = self._frame(packet.encode('latin-1'))
+        while True:
+            self.sock.sendall(framed)
+            if not self.ack:
+                break
+            while not self.buffer or self.buffer[:1] not in b'+-$':
+                del self.buffer[:1]
+                if not self.buffer:
+                    self._fill()
+            ack = self.buffer[:1]
+            if ack == b'$':
+                # No ack before the reply - take it as one
+                break
+            del self.buffer[:1]
+            if ack == b'+':
+                break
+        return self.receive()
+
+    def receive(self) -> bytes:
+        while True:
+            start = self.buffer.find(b'$')
+            while start < 0:
+                self.buffer.clear()
+                self._fill()
+                start = self.buffer.find(b'$')
+
+            end = self.buffer.find(b'#', start)
+            while end < 0 or len(self.buffer) < end + 3:
+                self._fill()
+                end = self.buffer.find(b'#', start)
+
+            payload = self.buffer[start + 1:end]
+            checksum = int(self.buffer[end + 1:end + 3], 16)
+            del self.buffer[:end + 3]
+
+            if checksum == sum(payload) & 0xFF:
+                if self.ack:
+                    self.sock.sendall(b'+')
+                return self._decode(payload)
+            if self.ack:
+                self.sock.sendall(b'-')
+
+    @staticmethod
+    def _decode(payload: bytearray) -> bytes:
+        """
+        :return bytes: The payload with '}' escapes and '*' run-length encoding undone
+        """
+        if b'}' not in payload and b'*' not in payload:
+            return bytes(payload)
+
+        decoded = bytearray()
+        index = 0
+        while index < len(payload):
+            byte = payload[index]
+            if byte == ord('}'):
+                index += 1
+                decoded.append(payload[index] ^ 0x20)
+            elif byte == ord('*'):
+                index += 1
+                decoded += decoded[-1:] * (payload[index] - 29)
+            else:
+                decoded.append(byte)
+            index += 1
+        return bytes(decoded)
+
+    def max_memory_payload(self) -> int:
+        # 'm' replies are hex - two characters per byte
+        return max((self.packet_size - 32) // 2, 1)
+
+    def close(self) -> None:
+        self.sock.close()
+        return
+
+
+class _RspState:
+    channel = None
+
+
+def get_rsp_channel() -> RspChannel:
+    """
+    :return RspChannel: The channel gdbp talks to the stub through - GDB's own connection, unless
+    ``set_rsp_channel``\\``connect_rsp`` selected another
+    """
+    if _RspState.channel is None:
+        if not STANDALONE:
+            _RspState.channel = GdbRspChannel()
+        elif os.environ.get(STUB_ENV):
+            connect_rsp(os.environ[STUB_ENV])
+        else:
+            raise GdbpRspError(f"GDB isn't loaded - connect to the stub with connect_rsp() or set {STUB_ENV}")
+    return _RspState.channel
+
+
+def set_rsp_channel(channel: RspChannel) -> None:
+    """
+    :param RspChannel channel: Channel for gdbp to use from now on. None = GDB's own connection
+    :return:
+    """
+    _RspState.channel = channel
+    if STANDALONE:
+        # Whatever gdbp cached came from the previous connection
+        gdb.events.stop.fire()
+    return
+
+
+def connect_rsp(address, timeout: float = PACKET_TIMEOUT) -> SocketRspChannel:
+    """
+    Connect straight to a gdbstub and make gdbp use the connection
+    :param address: (host, port), "host:port" or a Unix socket path
+    :param float timeout: Seconds to wait for a reply
+    :return SocketRspChannel: The new channel
+    """
+    channel = SocketRspChannel(address, timeout)
+    set_rsp_channel(channel)
+    return channel
@@ -1,5 +1,262 @@
-import gdb
+import array
+import bisect
+import collections
+import contextlib
+import re
 import struct
+import sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .backend import gdb
+from .general import GDBP_OBJ
+from .rsp import get_rsp_channel
+
+PAGE_SIZE = 0x1000
+PAGE_MASK = ~(PAGE_SIZE - 1)
+
+DEFAULT_READ_CACHE_PAGES = 256
+# Reads larger than this go straight to the stub instead of flushing the whole cache
+MAX_CACHED_READ_PAGES = 16
+
+
+class PageCache:
+    """
+    LRU cache of whole target pages, sitting in front of ``read_bytes``.
+    Physical and virtual pages are kept apart. Disabled by default - see ``enable_read_cache``.
+    """
+
+    def __init__(self, max_pages=DEFAULT_READ_CACHE_PAGES):
+        self.enabled = False
+        self.max_pages = max_pages
+        self.pages = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self, *_event) -> None:
+        """
+        Drop every cached page. Also used as a gdb.events handler, hence the ignored event argument
+        :return:
+        """
+        self.pages.clear()
+        return
+
+    def get_page(self, page_address: int) -> bytes:
+        """
+        :param int page_address: Page-aligned address
+        :return bytes: The whole page, from the cache if possible
+        """
+        key = (GDBP_OBJ.phys, page_address)
+        data = self.pages.get(key)
+        if data is not None:
+            self.pages.move_to_end(key)
+            self.hits += 1
+            return data
+
+        self.misses += 1
+        data = get_rsp_channel().read_memory(page_address, PAGE_SIZE)
+        self.pages[key] = data
+        while len(self.pages) > self.max_pages:
+            self.pages.popitem(last=False)
+
+        return data
+
+    def read(self, address: int, length: int) -> bytes:
+        """
+        :param int address: Address to read from
+        :param int length: Number of bytes to read
+        :return bytes: The first ``length`` bytes starting at ``address``
+        """
+        first_page = address & PAGE_MASK
+        last_page = (address + length - 1) & PAGE_MASK
+        if length <= 0 or (last_page - first_page) // PAGE_SIZE >= MAX_CACHED_READ_PAGES:
+            return get_rsp_channel().read_memory(address, length)
+
+        try:
+            chunks = [self.get_page(page) for page in range(first_page, last_page + 1, PAGE_SIZE)]
+        except gdb.MemoryError:
+            # Part of a page is unreadable (e.g. the end of a mapping) - let the stub decide about the exact range
+            return get_rsp_channel().read_memory(address, length)
+
+        offset = address - first_page
+        if len(chunks) == 1:
+            return chunks[0][offset:offset + length]
+        return b''.join(chunks)[offset:offset + length]
+
+
+READ_CACHE = PageCache()
+
+gdb.events.stop.connect(READ_CACHE.invalidate)
+gdb.events.cont.connect(READ_CACHE.invalidate)
+# gdb.events.memory_changed is missing from older GDB versions
+if hasattr(gdb.events, 'memory_changed'):
+    gdb.events.memory_changed.connect(READ_CACHE.invalidate)
+
+
+def enable_read_cache(max_pages: int = DEFAULT_READ_CACHE_PAGES) -> None:
+    """
+    Serve reads from a page-granular LRU cache, invalidated on stop/continue/memory change and on every write
+    :param int max_pages: Maximum number of 4 KiB pages to keep
+    :return:
+    """
+    READ_CACHE.max_pages = max_pages
+    READ_CACHE.invalidate()
+    READ_CACHE.enabled = True
+    return
+
+
+def disable_read_cache() -> None:
+    """
+    Go back to reading every request directly from the stub
+    :return:
+    """
+    READ_CACHE.enabled = False
+    READ_CACHE.invalidate()
+    return
+
+
+class WriteBuffer:
+    """
+    Writes held back by ``batch_writes``, merged into sorted, non-overlapping, non-adjacent intervals
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.starts = []
+        self.chunks = []
+        # Whether the pending writes were made in physical mode
+        self.phys = False
+
+    def add(self, address: int, data: bytes) -> None:
+        if self.starts and self.phys != GDBP_OBJ.phys:
+            self.flush()
+        self.phys = GDBP_OBJ.phys
+
+        end = address + len(data)
+        first = bisect.bisect_left(self.starts, address)
+        if first and self.starts[first - 1] + len(self.chunks[first - 1]) >= address:
+            first -= 1
+        last = first
+        while last < len(self.starts) and self.starts[last] <= end:
+            last += 1
+
+        if first == last:
+            self.starts.insert(first, address)
+            self.chunks.insert(first, bytearray(data))
+            return
+
+        start = min(address, self.starts[first])
+        merged = bytearray(max(end, self.starts[last - 1] + len(self.chunks[last - 1])) - start)
+        for index in range(first, last):
+            offset = self.starts[index] - start
+            merged[offset:offset + len(self.chunks[index])] = self.chunks[index]
+        merged[address - start:end - start] = data
+
+        self.starts[first:last] = [start]
+        self.chunks[first:last] = [merged]
+        return
+
+    def overlay(self, address: int, data: bytes) -> bytes:
+        """
+        :return bytes: ``data`` read from ``address``, with the pending writes applied
+        """
+        if self.phys != GDBP_OBJ.phys:
+            return data
+
+        end = address + len(data)
+        index = bisect.bisect_right(self.starts, address)
+        if index:
+            index -= 1
+
+        patched = None
+        while index < len(self.starts) and self.starts[index] < end:
+            chunk_start = self.starts[index]
+            chunk = self.chunks[index]
+            overlap_start = max(chunk_start, address)
+            overlap_end = min(chunk_start + len(chunk), end)
+            if overlap_start < overlap_end:
+                if patched is None:
+                    patched = bytearray(data)
+                patched[overlap_start - address:overlap_end - address] = \
+                    chunk[overlap_start - chunk_start:overlap_end - chunk_start]
+            index += 1
+
+        return data if patched is None else bytes(patched)
+
+    def flush(self) -> None:
+        """
+        Write every pending interval - one write_memory per interval.
+        If a write fails inside a batch, the intervals that weren't written yet stay pending. Outside a batch (the
+        outermost block exiting) they are dropped, and attached to the exception as ``unsent_writes`` -
+        (address, bytes) pairs
+        :return:
+        """
+        if not self.starts:
+            return
+
+        written = 0
+        # The mode may have changed since the writes were made
+        was_phys = GDBP_OBJ.phys
+        if self.phys != was_phys:
+            GDBP_OBJ.set_phys_mode(self.phys)
+        try:
+            channel = get_rsp_channel()
+            for start, chunk in zip(self.starts, self.chunks):
+                channel.write_memory(start, bytes(chunk))
+                written += 1
+        except BaseException as e:
+            if not self.depth:
+                # Nothing would ever retry them
+                e.unsent_writes = [(start, bytes(chunk))
+                                   for start, chunk in zip(self.starts[written:], self.chunks[written:])]
+                # The written ones are removed by ``finally``
+                del self.starts[written:]
+                del self.chunks[written:]
+            raise
+        finally:
+            del self.starts[:written]
+            del self.chunks[:written]
+            if self.phys != was_phys:
+                GDBP_OBJ.set_phys_mode(was_phys)
+            if written:
+                READ_CACHE.invalidate()
+        return
+
+    def discard(self) -> None:
+        """
+        Drop every pending write
+        :return:
+        """
+        self.starts = []
+        self.chunks = []
+        return
+
+
+WRITE_BUFFER = WriteBuffer()
+
+
+@contextlib.contextmanager
+def batch_writes():
+    """
+    Context manager - hold back every write inside the block and write them, merged, when the outermost block exits.
+    Reads inside the block see the pending values. Yields the ``WriteBuffer``, whose ``flush()`` writes early.
+    An exception leaving the outermost block drops the pending writes instead - nothing of the batch is written
+    (except what an early ``flush()`` already wrote)
+    """
+    WRITE_BUFFER.depth += 1
+    try:
+        yield WRITE_BUFFER
+    except BaseException:
+        WRITE_BUFFER.depth -= 1
+        if not WRITE_BUFFER.depth:
+            WRITE_BUFFER.discard()
+        raise
+    WRITE_BUFFER.depth -= 1
+    if not WRITE_BUFFER.depth:
+        WRITE_BUFFER.flush()
 
 
 def read_bytes(address: int, length: int) -> bytes:
@@ -8,8 +265,260 @@ def read_bytes(address: int, length: int) -> bytes:
     :param int length: Number of bytes to read
     :return bytes: The first ``length`` bytes starting at ``address``
     """
-    # gdb.Inferior.read_memory was added in GDB 7.2
-    return bytes(gdb.selected_inferior().read_memory(address, length))
+    if READ_CACHE.enabled:
+        data = READ_CACHE.read(address, length)
+    else:
+        data = get_rsp_channel().read_memory(address, length)
+
+    if WRITE_BUFFER.depth and WRITE_BUFFER.starts:
+        return WRITE_BUFFER.overlay(address, data)
+    return data
+
+
+def write_bytes(address: int, data: bytes) -> None:
+    """
+    :param int address: Address to write to
+    :param bytes data: Bytes to write
+    :return
+    """
+    if WRITE_BUFFER.depth:
+        WRITE_BUFFER.add(address, data)
+        return
+
+    get_rsp_channel().write_memory(address, data)
+    READ_CACHE.invalidate()
+    return
+
+
+# Type names understood by Struct and read_array, and their ``struct`` format characters
+SCALAR_FORMATS = {
+    'u8': 'B', 's8': 'b',
+    'u16': 'H', 's16': 'h',
+    'u32': 'L', 's32': 'l',
+    'u64': 'Q', 's64': 'q',
+    'f32': 'f', 'f64': 'd',
+}
+
+# Ranges closer than this are read together - a few wasted bytes cost less than another round-trip
+READ_MANY_MAX_GAP = 64
+
+_STRUCT_CACHE = {}
+
+
+def _get_struct(fmt: str) -> struct.Struct:
+    compiled = _STRUCT_CACHE.get(fmt)
+    if compiled is None:
+        compiled = _STRUCT_CACHE[fmt] = struct.Struct(fmt)
+    return compiled
+
+
+def _fallback_spans(start: int, end: int) -> list:
+    """
+    :return list: (piece_start, piece_end) pages to read one by one once [start, end) couldn't be read in one go.
+    Empty if [start, end) is inside one page - then it is unreadable as a whole
+    """
+    if (start & PAGE_MASK) == ((end - 1) & PAGE_MASK):
+        return []
+    piece_starts = [start] + list(range((start & PAGE_MASK) + PAGE_SIZE, end, PAGE_SIZE))
+    return [(piece_start, min((piece_start & PAGE_MASK) + PAGE_SIZE, end)) for piece_start in piece_starts]
+
+
+def _read_pieces(read, start: int, end: int) -> list:
+    """
+    Read [start, end) in one go, or page by page if the whole range is unreadable
+    :param read: (address, length) -> bytes, raising gdb.MemoryError for unreadable memory
+    :return list: (piece_start, piece_bytes or None if unreadable) pairs covering the range
+    """
+    try:
+        return [(start, read(start, end - start))]
+    except gdb.MemoryError:
+        spans = _fallback_spans(start, end)
+        if not spans:
+            return [(start, None)]
+
+    pieces = []
+    for piece_start, piece_end in spans:
+        try:
+            pieces.append((piece_start, read(piece_start, piece_end - piece_start)))
+        except gdb.MemoryError:
+            pieces.append((piece_start, None))
+    return pieces
+
+
+def _read_run(start: int, end: int) -> list:
+    """
+    ``_read_pieces`` through ``read_bytes``
+    """
+    return _read_pieces(read_bytes, start, end)
+
+
+def _slice_pieces(pieces: list, address: int, length: int):
+    """
+    :return bytes: ``length`` bytes at ``address`` out of the pieces of a run, or None if any of them is unreadable
+    """
+    chunks = []
+    end = address + length
+    for piece_start, data in pieces:
+        # An unreadable piece may start mid-page (at the run's start) - it never reaches past its page
+        piece_end = (piece_start & PAGE_MASK) + PAGE_SIZE if data is None else piece_start + len(data)
+        if piece_end <= address or piece_start >= end:
+            continue
+        if data is None:
+            return None
+        chunks.append(data[max(address - piece_start, 0):end - piece_start])
+
+    return b''.join(chunks)
+
+
+def _plan_reads(requests, max_gap: int) -> tuple[list, list]:
+    """
+    Sort a read_many batch and merge it into runs
+    :return tuple[list, list]: The (run_start, run_end, [(address, length, index), ...]) runs, and the ``struct``
+    decoder (or None) of every request
+    """
+    spans = []
+    decoders = []
+    for index, (address, length_or_fmt) in enumerate(requests):
+        if isinstance(length_or_fmt, int):
+            decoders.append(None)
+            length = length_or_fmt
+        else:
+            decoder = _get_struct(length_or_fmt)
+            decoders.append(decoder)
+            length = decoder.size
+        spans.append((address, length, index))
+    spans.sort()
+
+    runs = []
+    for span in spans:
+        if runs and span[0] <= runs[-1][1] + max_gap:
+            run = runs[-1]
+            run[1] = max(run[1], span[0] + span[1])
+            run[2].append(span)
+        else:
+            runs.append([span[0], span[0] + span[1], [span]])
+
+    return runs, decoders
+
+
+def _decode_run(pieces: list, run: list, decoders: list, results: list, skip_errors) -> None:
+    """
+    Fill ``results`` with the requests of a run, out of the pieces it was read in
+    """
+    for address, length, index in run:
+        data = _slice_pieces(pieces, address, length)
+        if data is None:
+            if not skip_errors:
+                raise gdb.MemoryError('Cannot access memory at address {}'.format(hex(address)))
+            continue
+        decoder = decoders[index]
+        if decoder is None:
+            results[index] = data
+        else:
+            values = decoder.unpack(data)
+            results[index] = values[0] if len(values) == 1 else values
+    return
+
+
+def read_many(requests, max_gap: int = READ_MANY_MAX_GAP, skip_errors=False) -> list:
+    """
+    Read a batch of memory ranges with as few stub round-trips as possible.
+    Overlapping, adjacent and nearby (up to ``max_gap`` bytes apart) ranges are merged into a single read.
+    A merged read that fails is retried page by page, so one bad page only fails the requests that touch it.
+    :param requests: Iterable of (address, length) or (address, fmt) pairs, where fmt is a ``struct`` format string
+    :param int max_gap: Maximum number of unrequested bytes to read in order to merge two ranges
+    :param bool skip_errors: Return None for unreadable requests instead of raising gdb.MemoryError
+    :return list: In request order - bytes for (address, length) requests, the decoded value for (address, fmt)
+    requests (a tuple if the format holds more than one value)
+    """
+    runs, decoders = _plan_reads(requests, max_gap)
+    results = [None] * len(decoders)
+    for run_start, run_end, run in runs:
+        _decode_run(_read_run(run_start, run_end), run, decoders, results, skip_errors)
+
+    return results
+
+
+def phys_mode():
+    """
+    Context manager - read and write physical memory inside the block, switching the stub at most twice
+    """
+    return GDBP_OBJ.phys_mode()
+
+
+def read_phys(address: int, length: int) -> bytes:
+    """
+    :param int address: Physical address to read from
+    :param int length: Number of bytes to read
+    :return bytes: The first ``length`` bytes starting at physical ``address``
+    """
+    with GDBP_OBJ.phys_mode():
+        return read_bytes(address, length)
+
+
+def read_phys_many(requests, max_gap: int = READ_MANY_MAX_GAP, skip_errors=False) -> list:
+    """
+    ``read_many`` for physical addresses, under a single switch to physical mode
+    """
+    with GDBP_OBJ.phys_mode():
+        return read_many(requests, max_gap, skip_errors)
+
+
+# array.array type codes of the same size as the ``struct`` standard sizes
+_ARRAY_TYPECODES = {
+    'B': 'B', 'b': 'b', 'H': 'H', 'h': 'h',
+    'L': 'I' if array.array('I').itemsize == 4 else 'L', 'l': 'i' if array.array('i').itemsize == 4 else 'l',
+    'Q': 'Q', 'q': 'q', 'f': 'f', 'd': 'd',
+}
+# NumPy's type codes follow the C types ('L' is 8 bytes on LP64), so spell out the sizes
+_NUMPY_TYPES = {
+    'B': 'u1', 'b': 'i1', 'H': 'u2', 'h': 'i2',
+    'L': 'u4', 'l': 'i4', 'Q': 'u8', 'q': 'i8', 'f': 'f4', 'd': 'f8',
+}
+
+
+def read_array(address: int, count: int, dtype, stride: int = None, big=False):
+    """
+    Read ``count`` elements with a single ``read_bytes``.
+    :param int address: Address of the first element
+    :param int count: Number of elements
+    :param dtype: A type name from ``SCALAR_FORMATS`` ('u64', ...), a ``struct`` format character ('Q', ...) or,
+    if NumPy is installed, anything ``numpy.dtype`` accepts (e.g. a structured dtype for an array of structs)
+    :param int stride: Bytes from one element to the next. default = the element size.
+    Use it to pick one field out of an array of structs.
+    :param big : byte order big-endian. default = False.
+    :return: A read-only ``numpy.ndarray`` viewing the read buffer, or an ``array.array`` if NumPy isn't installed
+    """
+    code = SCALAR_FORMATS.get(dtype, dtype)
+
+    if numpy is not None:
+        element_type = numpy.dtype(('>' if big else '<') + _NUMPY_TYPES[code] if code in _NUMPY_TYPES else code)
+        itemsize = element_type.itemsize
+    else:
+        if code not in _ARRAY_TYPECODES:
+            raise ValueError(f"Unsupported type without NumPy: {dtype!r}")
+        itemsize = struct.calcsize('<' + code)
+
+    if stride is None:
+        stride = itemsize
+    if stride < itemsize:
+        raise ValueError(f"The stride ({stride}) is smaller than the element ({itemsize})")
+
+    data = read_bytes(address, (count - 1) * stride + itemsize) if count > 0 else b''
+
+    if numpy is not None:
+        if stride == itemsize:
+            return numpy.frombuffer(data, dtype=element_type, count=count)
+        return numpy.ndarray((count,), dtype=element_type, buffer=data, strides=(stride,))
+
+    elements = array.array(_ARRAY_TYPECODES[code])
+    if stride == itemsize:
+        elements.frombytes(data)
+    else:
+        elements.frombytes(b''.join(data[offset:offset + itemsize] for offset in range(0, count * stride, stride)))
+    if big != (sys.byteorder == 'big'):
+        elements.byteswap()
+    return elements
 
 
 def read8(address: int, big=False) -> int:
@@ -66,7 +575,7 @@ def write8(address: int, value: int) -> None:
     :param value: value of unsigned uint8
     :return
     """
-    gdb.selected_inferior().write_memory(address, struct.pack("<B", value), 1)
+    write_bytes(address, struct.pack("<B", value))
     return
 
 
@@ -76,7 +585,7 @@ def write16(address: int, value: int) -> None:
     :param value: value of unsigned uint16
     :return
     """
-    gdb.selected_inferior().write_memory(address, struct.pack("<H", value), 2)
+    write_bytes(address, struct.pack("<H", value))
     return
 
 
@@ -86,7 +595,7 @@ def write32(address: int, value: int) -> None:
     :param value: value of unsigned uint32
     :return
     """
-    gdb.selected_inferior().write_memory(address, struct.pack("<L", value), 4)
+    write_bytes(address, struct.pack("<L", value))
     return
 
 
@@ -96,5 +605,107 @@ def write64(address: int, value: int) -> None:
     :param value: value of unsigned uint64
     :return
     """
-    gdb.selected_inferior().write_memory(address, struct.pack("<Q", value), 8)
+    write_bytes(address, struct.pack("<Q", value))
     return
+
+
+SCAN_CHUNK_SIZE = 0x40000
+
+
+def compile_pattern(pattern, mask: bytes = None) -> tuple:
+    """
+    :param pattern: A signature string such as "48 8B 05 ?? ?? ?? ?? C3" or bytes. Each token of the string is a
+    byte of two hex digits, either of which may be ``?`` for a wildcard nibble ("4?" matches 0x40-0x4F, "?5" matches
+    0x05, 0x15, ... 0xF5). A lone ``?`` is a wildcard byte, like ``??``. Other one-character tokens are rejected
+    :param bytes mask: For a bytes pattern - 0xFF to match the byte exactly, 0x00 to match any byte, or any other
+    bit mask. default = match every byte exactly.
+    :return tuple: (pattern length, function returning the offsets of every match in a buffer)
+    """
+    if isinstance(pattern, str):
+        values = bytearray()
+        mask = bytearray()
+        for token in pattern.split():
+            if token == '?':
+                token = '??'
+            if len(token) != 2:
+                raise ValueError(f"Bad signature byte: {token!r} - a byte is two hex digits or '?' wildcards")
+            try:
+                values.append(int(token.replace('?', '0'), 16))
+            except ValueError:
+                raise ValueError(f"Bad signature byte: {token!r}") from None
+            mask.append((0x0F if token[0] == '?' else 0xFF) & (0xF0 if token[1] == '?' else 0xFF))
+        pattern = bytes(values)
+
+    if not pattern:
+        raise ValueError("Empty pattern")
+
+    if mask is None or all(byte == 0xFF for byte in mask):
+        def find_all(buffer):
+            offset = buffer.find(pattern)
+            while offset != -1:
+                yield offset
+                offset = buffer.find(pattern, offset + 1)
+
+        return len(pattern), find_all
+
+    if len(mask) != len(pattern):
+        raise ValueError("The mask must be as long as the pattern")
+
+    regex = []
+    for value, byte_mask in zip(pattern, mask):
+        if byte_mask == 0xFF:
+            regex.append(re.escape(bytes([value])))
+        elif byte_mask == 0:
+            regex.append(b'.')
+        else:
+            matching = bytes(byte for byte in range(0x100) if byte & byte_mask == value & byte_mask)
+            regex.append(b'[' + b''.join(re.escape(bytes([byte])) for byte in matching) + b']')
+    # A lookahead, so overlapping matches are found too
+    compiled = re.compile(b'(?=' + b''.join(regex) + b')', re.DOTALL)
+
+    def find_all(buffer):
+        for match in compiled.finditer(buffer):
+            yield match.start()
+
+    return len(pattern), find_all
+
+
+def scan(start: int, end: int, pattern, mask: bytes = None, chunk: int = SCAN_CHUNK_SIZE):
+    """
+    Search [start, end) for a byte signature, reading ``chunk`` bytes at a time and searching locally.
+    Matches that cross a chunk boundary are found too. Unreadable pages are skipped.
+    :param int start: First address to search
+    :param int end: Address to stop at (exclusive)
+    :param pattern: See ``compile_pattern``
+    :param bytes mask: See ``compile_pattern``
+    :param int chunk: Bytes per read
+    :return: Generator of match addresses, in ascending order
+    """
+    length, find_all = compile_pattern(pattern, mask)
+    keep = length - 1
+
+    # The last ``keep`` bytes of the previous readable piece - the beginning of a match that may continue
+    carry = b''
+    carry_end = None
+    address = start
+    while address < end:
+        chunk_end = min(address + chunk, end)
+        for piece_start, data in _read_run(address, chunk_end):
+            if data is None:
+                carry = b''
+                continue
+
+            if carry and carry_end == piece_start:
+                buffer_start = piece_start - len(carry)
+                buffer = carry + data
+            else:
+                buffer_start = piece_start
+                buffer = data
+
+            for offset in find_all(buffer):
+                yield buffer_start + offset
+
+            # A buffer shorter than the pattern is carried whole - a negative start would cut it short
+            carry = buffer[max(len(buffer) - keep, 0):] if keep else b''
+            carry_end = piece_start + len(data)
+        address = chunk_end
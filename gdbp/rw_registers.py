@@ -1,14 +1,19 @@
-import gdb
-import general
+import collections
+import re
+from .backend import gdb
+from . import general
+from . import stats
+from .rsp import GdbpRspError, get_rsp_channel
 
 MASK_64BIT = 0xFFFFFFFFFFFFFFFF
 MASK_32BIT = 0xFFFFFFFF
 MASK_16BIT = 0xFFFF
 MASK_8BIT = 0xFF
 
-GDBP_OBJ = general.GeneralGdbp()
+GDBP_OBJ = general.GDBP_OBJ
 
 
+@stats.instrument('parse', lambda args, _result: len(args[0]))
 def splice(string: str, start_token: str, end_token: str):
     start_pos = string.find(start_token)
     end_pos = string.rfind(end_token)
@@ -48,6 +53,7 @@ def read_register(register_name) -> int:
     return value
 
 
+@stats.instrument('write_register')
 def write_register(register_name, value):
     """
     :param str register_name: A valid register name (according to GDB)
@@ -72,1245 +78,401 @@ def get_curr_frame() -> gdb.Frame:
     else:
         return None
 
+RegisterDescriptor = collections.namedtuple('RegisterDescriptor', ['name', 'width', 'mask', 'parent', 'offset',
+                                                                   'zero_extend'])
+RegisterDescriptor.__doc__ = """
+Describes a register as a bit slice of the register that is actually read from the target.
+name: gdbp's name of the register, width: size in bits, mask: ``2 ** width - 1``, parent: the register to read,
+offset: bit offset inside the parent, zero_extend: writes replace the whole parent instead of merging into it
+"""
 
-def get_rax() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            rax = f.read_register('rax')
-            return int(rax) & MASK_64BIT
-        except Exception as e:
-            print(f"Error reading rax register: {e}")
-
-
-def get_eax() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            eax = f.read_register('eax')
-            return int(eax) & MASK_32BIT
-        except Exception as e:
-            print(f"Error reading eax register: {e}")
-
-
-def get_ax() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            ax = f.read_register('ax')
-            return int(ax) & MASK_16BIT
-        except Exception as e:
-            print(f"Error reading ax register: {e}")
-
-
-def get_ah() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            ah = f.read_register('ah')
-            return int(ah) & MASK_8BIT
-        except Exception as e:
-            print(f"Error reading ah register: {e}")
-
-
-def get_al() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            al = f.read_register('al')
-            return int(al) & MASK_8BIT
-        except Exception as e:
-            print(f"Error reading al register: {e}")
-
-
-def set_rax(value: int) -> None:
-    try:
-        gdb.execute(f"set $rax = {value}")
-    except Exception as e:
-        print(f"Error setting rax register: {e}")
-
-
-def set_eax(value: int) -> None:
-    try:
-        gdb.execute(f"set $eax = {value}")
-    except Exception as e:
-        print(f"Error setting eax register: {e}")
-
-
-def set_ax(value: int) -> None:
-    try:
-        gdb.execute(f"set $ax = {value}")
-    except Exception as e:
-        print(f"Error setting ax register: {e}")
-
-
-def set_al(value: int) -> None:
-    try:
-        gdb.execute(f"set $al = {value}")
-    except Exception as e:
-        print(f"Error setting al register: {e}")
-
-
-def get_rbx() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            rbx = f.read_register('rbx')
-            return int(rbx) & MASK_64BIT
-        except Exception as e:
-            print(f"Error reading rbx register: {e}")
-
-
-def get_ebx() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            ebx = f.read_register('ebx')
-            return int(ebx) & MASK_32BIT
-        except Exception as e:
-            print(f"Error reading ebx register: {e}")
-
-
-def get_bx() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            bx = f.read_register('bx')
-            return int(bx) & MASK_16BIT
-        except Exception as e:
-            print(f"Error reading bx register: {e}")
-
-
-def get_bl() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            bl = f.read_register('bl')
-            return int(bl) & MASK_8BIT
-        except Exception as e:
-            print(f"Error reading bl register: {e}")
-
-
-def set_rbx(value: int) -> None:
-    try:
-        gdb.execute(f"set $rbx = {value}")
-    except Exception as e:
-        print(f"Error setting rbx register: {e}")
-
-
-def set_ebx(value: int) -> None:
-    try:
-        gdb.execute(f"set $ebx = {value}")
-    except Exception as e:
-        print(f"Error setting ebx register: {e}")
-
-
-def set_bx(value: int) -> None:
-    try:
-        gdb.execute(f"set $bx = {value}")
-    except Exception as e:
-        print(f"Error setting bx register: {e}")
-
-
-def set_bl(value: int) -> None:
-    try:
-        gdb.execute(f"set $bl = {value}")
-    except Exception as e:
-        print(f"Error setting bl register: {e}")
-
-
-def get_rcx() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            rcx = f.read_register('rcx')
-            return int(rcx) & MASK_64BIT
-        except Exception as e:
-            print(f"Error reading rcx register: {e}")
-
-
-def get_ecx() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            ecx = f.read_register('ecx')
-            return int(ecx) & MASK_32BIT
-        except Exception as e:
-            print(f"Error reading ecx register: {e}")
-
-
-def get_cx() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            cx = f.read_register('cx')
-            return int(cx) & MASK_16BIT
-        except Exception as e:
-            print(f"Error reading cx register: {e}")
-
-
-def get_cl() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            cl = f.read_register('cl')
-            return int(cl) & MASK_8BIT
-        except Exception as e:
-            print(f"Error reading cl register: {e}")
-
-
-def set_rcx(value: int) -> None:
-    try:
-        gdb.execute(f"set $rcx = {value}")
-    except Exception as e:
-        print(f"Error setting rcx register: {e}")
-
-
-def set_ecx(value: int) -> None:
-    try:
-        gdb.execute(f"set $ecx = {value}")
-    except Exception as e:
-        print(f"Error setting ecx register: {e}")
-
-
-def set_cx(value: int) -> None:
-    try:
-        gdb.execute(f"set $cx = {value}")
-    except Exception as e:
-        print(f"Error setting cx register: {e}")
-
-
-def set_cl(value: int) -> None:
-    try:
-        gdb.execute(f"set $cl = {value}")
-    except Exception as e:
-        print(f"Error setting cl register: {e}")
-
-
-def get_rdx() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            rdx = f.read_register('rdx')
-            return int(rdx) & MASK_64BIT
-        except Exception as e:
-            print(f"Error reading rdx register: {e}")
-
-
-def get_edx() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            edx = f.read_register('edx')
-            return int(edx) & MASK_32BIT
-        except Exception as e:
-            print(f"Error reading edx register: {e}")
-
-
-def get_dx() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            dx = f.read_register('dx')
-            return int(dx) & MASK_16BIT
-        except Exception as e:
-            print(f"Error reading dx register: {e}")
-
-
-def get_dl() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            dl = f.read_register('dl')
-            return int(dl) & MASK_8BIT
-        except Exception as e:
-            print(f"Error reading dl register: {e}")
-
-
-def set_rdx(value: int) -> None:
-    try:
-        gdb.execute(f"set $rdx = {value}")
-    except Exception as e:
-        print(f"Error setting rdx register: {e}")
-
-
-def set_edx(value: int) -> None:
-    try:
-        gdb.execute(f"set $edx = {value}")
-    except Exception as e:
-        print(f"Error setting edx register: {e}")
-
-
-def set_dx(value: int) -> None:
-    try:
-        gdb.execute(f"set $dx = {value}")
-    except Exception as e:
-        print(f"Error setting dx register: {e}")
-
-
-def set_dl(value: int) -> None:
-    try:
-        gdb.execute(f"set $dl = {value}")
-    except Exception as e:
-        print(f"Error setting dl register: {e}")
-
-
-def get_rsi() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            rsi = f.read_register('rsi')
-            return int(rsi) & MASK_64BIT
-        except Exception as e:
-            print(f"Error reading rsi register: {e}")
-
-
-def get_esi() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            esi = f.read_register('esi')
-            return int(esi) & MASK_32BIT
-        except Exception as e:
-            print(f"Error reading esi register: {e}")
-
-
-def get_si() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            si = f.read_register('si')
-            return int(si) & MASK_16BIT
-        except Exception as e:
-            print(f"Error reading si register: {e}")
-
-
-def get_sil() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            sil = f.read_register('sil')
-            return int(sil) & MASK_8BIT
-        except Exception as e:
-            print(f"Error reading sil register: {e}")
-
-
-def set_rsi(value: int) -> None:
-    try:
-        gdb.execute(f"set $rsi = {value}")
-    except Exception as e:
-        print(f"Error setting rsi register: {e}")
-
-
-def set_esi(value: int) -> None:
-    try:
-        gdb.execute(f"set $esi = {value}")
-    except Exception as e:
-        print(f"Error setting esi register: {e}")
-
-
-def set_si(value: int) -> None:
-    try:
-        gdb.execute(f"set $si = {value}")
-    except Exception as e:
-        print(f"Error setting si register: {e}")
-
-
-def set_sil(value: int) -> None:
-    try:
-        gdb.execute(f"set $sil = {value}")
-    except Exception as e:
-        print(f"Error setting sil register: {e}")
-
-
-def get_rdi() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            rdi = f.read_register('rdi')
-            return int(rdi) & MASK_64BIT
-        except Exception as e:
-            print(f"Error reading rdi register: {e}")
-
-
-def get_edi() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            edi = f.read_register('edi')
-            return int(edi) & MASK_32BIT
-        except Exception as e:
-            print(f"Error reading edi register: {e}")
-
-
-def get_di() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            di = f.read_register('di')
-            return int(di) & MASK_16BIT
-        except Exception as e:
-            print(f"Error reading di register: {e}")
-
-
-def get_dil() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            dil = f.read_register('dil')
-            return int(dil) & MASK_8BIT
-        except Exception as e:
-            print(f"Error reading dil register: {e}")
-
-
-def set_rdi(value: int) -> None:
-    try:
-        gdb.execute(f"set $rdi = {value}")
-    except Exception as e:
-        print(f"Error setting rdi register: {e}")
-
-
-def set_edi(value: int) -> None:
-    try:
-        gdb.execute(f"set $edi = {value}")
-    except Exception as e:
-        print(f"Error setting edi register: {e}")
-
-
-def set_di(value: int) -> None:
-    try:
-        gdb.execute(f"set $di = {value}")
-    except Exception as e:
-        print(f"Error setting di register: {e}")
-
-
-def set_dil(value: int) -> None:
-    try:
-        gdb.execute(f"set $dil = {value}")
-    except Exception as e:
-        print(f"Error setting dil register: {e}")
-
-
-def get_rbp() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            rbp = f.read_register('rbp')
-            return int(rbp) & MASK_64BIT
-        except Exception as e:
-            print(f"Error reading rbp register: {e}")
-
-
-def get_ebp() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            ebp = f.read_register('ebp')
-            return int(ebp) & MASK_32BIT
-        except Exception as e:
-            print(f"Error reading ebp register: {e}")
-
-
-def get_bp() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            bp = f.read_register('bp')
-            return int(bp) & MASK_16BIT
-        except Exception as e:
-            print(f"Error reading bp register: {e}")
-
-
-def get_bpl() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            bpl = f.read_register('bpl')
-            return int(bpl) & MASK_8BIT
-        except Exception as e:
-            print(f"Error reading bpl register: {e}")
-
-
-def set_rbp(value: int) -> None:
-    try:
-        gdb.execute(f"set $rbp = {value}")
-    except Exception as e:
-        print(f"Error setting rbp register: {e}")
-
-
-def set_ebp(value: int) -> None:
-    try:
-        gdb.execute(f"set $ebp = {value}")
-    except Exception as e:
-        print(f"Error setting ebp register: {e}")
-
-
-def set_bp(value: int) -> None:
-    try:
-        gdb.execute(f"set $bp = {value}")
-    except Exception as e:
-        print(f"Error setting bp register: {e}")
-
-
-def set_bpl(value: int) -> None:
-    try:
-        gdb.execute(f"set $bpl = {value}")
-    except Exception as e:
-        print(f"Error setting bpl register: {e}")
-
-
-def get_rsp() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            rsp = f.read_register('rsp')
-            return int(rsp) & MASK_64BIT
-        except Exception as e:
-            print(f"Error reading rsp register: {e}")
-
-
-def get_esp() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            esp = f.read_register('esp')
-            return int(esp) & MASK_32BIT
-        except Exception as e:
-            print(f"Error reading esp register: {e}")
-
-
-def get_sp() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            sp = f.read_register('sp')
-            return int(sp) & MASK_16BIT
-        except Exception as e:
-            print(f"Error reading sp register: {e}")
-
-
-def get_spl() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            spl = f.read_register('spl')
-            return int(spl) & MASK_8BIT
-        except Exception as e:
-            print(f"Error reading spl register: {e}")
-
-
-def set_rsp(value: int) -> None:
-    try:
-        gdb.execute(f"set $rsp = {value}")
-    except Exception as e:
-        print(f"Error setting rsp register: {e}")
-
-
-def set_esp(value: int) -> None:
-    try:
-        gdb.execute(f"set $esp = {value}")
-    except Exception as e:
-        print(f"Error setting esp register: {e}")
-
-
-def set_sp(value: int) -> None:
-    try:
-        gdb.execute(f"set $sp = {value}")
-    except Exception as e:
-        print(f"Error setting sp register: {e}")
-
-
-def set_spl(value: int) -> None:
-    try:
-        gdb.execute(f"set $spl = {value}")
-    except Exception as e:
-        print(f"Error setting spl register: {e}")
-
-
-def get_r8() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            r8 = f.read_register('r8')
-            return int(r8) & MASK_64BIT
-        except Exception as e:
-            print(f"Error reading r8 register: {e}")
-
-
-def get_r8d() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            r8d = f.read_register('r8d')
-            return int(r8d) & MASK_32BIT
-        except Exception as e:
-            print(f"Error reading r8d register: {e}")
-
-
-def get_r8w() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            r8w = f.read_register('r8w')
-            return int(r8w) & MASK_16BIT
-        except Exception as e:
-            print(f"Error reading r8w register: {e}")
-
-
-def get_r8b() -> int:
-    return get_r8w() & MASK_8BIT
-
-
-def set_r8(value: int) -> None:
-    try:
-        gdb.execute(f"set $r8 = {value}")
-    except Exception as e:
-        print(f"Error setting r8 register: {e}")
-
-
-def set_r8d(value: int) -> None:
-    try:
-        gdb.execute(f"set $r8d = {value}")
-    except Exception as e:
-        print(f"Error setting r8d register: {e}")
-
-
-def set_r8w(value: int) -> None:
-    try:
-        gdb.execute(f"set $r8w = {value}")
-    except Exception as e:
-        print(f"Error setting r8w register: {e}")
-
-
-def set_r8b(value: int) -> None:
-    try:
-        gdb.execute(f"set $r8b = {value}")
-    except Exception as e:
-        print(f"Error setting r8b register: {e}")
-
-
-def get_r9() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            r9 = f.read_register('r9')
-            return int(r9) & MASK_64BIT
-        except Exception as e:
-            print(f"Error reading r9 register: {e}")
-
-
-def get_r9d() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            r9d = f.read_register('r9d')
-            return int(r9d) & MASK_32BIT
-        except Exception as e:
-            print(f"Error reading r9d register: {e}")
-
-
-def get_r9w() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            r9w = f.read_register('r9w')
-            return int(r9w) & MASK_16BIT
-        except Exception as e:
-            print(f"Error reading r9w register: {e}")
-
-
-def get_r9b() -> int:
-    return get_r9w() & MASK_8BIT
-
-
-def set_r9(value: int) -> None:
-    try:
-        gdb.execute(f"set $r9 = {value}")
-    except Exception as e:
-        print(f"Error setting r9 register: {e}")
-
-
-def set_r9d(value: int) -> None:
-    try:
-        gdb.execute(f"set $r9d = {value}")
-    except Exception as e:
-        print(f"Error setting r9d register: {e}")
-
-
-def set_r9w(value: int) -> None:
-    try:
-        gdb.execute(f"set $r9w = {value}")
-    except Exception as e:
-        print(f"Error setting r9w register: {e}")
-
-
-def set_r9b(value: int) -> None:
-    try:
-        gdb.execute(f"set $r9b = {value}")
-    except Exception as e:
-        print(f"Error setting r9b register: {e}")
-
-
-def get_r10() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            r10 = f.read_register('r10')
-            return int(r10) & MASK_64BIT
-        except Exception as e:
-            print(f"Error reading r10 register: {e}")
-
-
-def get_r10d() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            r10d = f.read_register('r10d')
-            return int(r10d) & MASK_32BIT
-        except Exception as e:
-            print(f"Error reading r10d register: {e}")
-
-
-def get_r10w() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            r10w = f.read_register('r10w')
-            return int(r10w) & MASK_16BIT
-        except Exception as e:
-            print(f"Error reading r10w register: {e}")
-
-
-def get_r10b() -> int:
-    return get_r10w() & MASK_8BIT
-
-
-def set_r10(value: int) -> None:
-    try:
-        gdb.execute(f"set $r10 = {value}")
-    except Exception as e:
-        print(f"Error setting r10 register: {e}")
-
-
-def set_r10d(value: int) -> None:
-    try:
-        gdb.execute(f"set $r10d = {value}")
-    except Exception as e:
-        print(f"Error setting r10d register: {e}")
-
-
-def set_r10w(value: int) -> None:
-    try:
-        gdb.execute(f"set $r10w = {value}")
-    except Exception as e:
-        print(f"Error setting r10w register: {e}")
-
-
-def set_r10b(value: int) -> None:
-    try:
-        gdb.execute(f"set $r10b = {value}")
-    except Exception as e:
-        print(f"Error setting r10b register: {e}")
-
-
-def get_r11() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            r11 = f.read_register('r11')
-            return int(r11) & MASK_64BIT
-        except Exception as e:
-            print(f"Error reading r11 register: {e}")
+PC_REGISTER = 'pc'
 
+# 64-bit, 32-bit, 16-bit, low 8-bit, high 8-bit
+GENERAL_PURPOSE_REGISTER_FAMILIES = (
+    ('rax', 'eax', 'ax', 'al', 'ah'),
+    ('rbx', 'ebx', 'bx', 'bl', 'bh'),
+    ('rcx', 'ecx', 'cx', 'cl', 'ch'),
+    ('rdx', 'edx', 'dx', 'dl', 'dh'),
+    ('rsi', 'esi', 'si', 'sil', None),
+    ('rdi', 'edi', 'di', 'dil', None),
+    ('rbp', 'ebp', 'bp', 'bpl', None),
+    ('rsp', 'esp', 'sp', 'spl', None),
+) + tuple(('r{}'.format(i), 'r{}d'.format(i), 'r{}w'.format(i), 'r{}b'.format(i), None) for i in range(8, 16))
 
-def get_r11d() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            r11d = f.read_register('r11d')
-            return int(r11d) & MASK_32BIT
-        except Exception as e:
-            print(f"Error reading r11d register: {e}")
-
-
-def get_r11w() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            r11w = f.read_register('r11w')
-            return int(r11w) & MASK_16BIT
-        except Exception as e:
-            print(f"Error reading r11w register: {e}")
-
-
-def get_r11b() -> int:
-    return get_r11w() & MASK_8BIT
-
-
-def set_r11(value: int) -> None:
-    try:
-        gdb.execute(f"set $r11 = {value}")
-    except Exception as e:
-        print(f"Error setting r11 register: {e}")
-
-
-def set_r11d(value: int) -> None:
-    try:
-        gdb.execute(f"set $r11d = {value}")
-    except Exception as e:
-        print(f"Error setting r11d register: {e}")
-
-
-def set_r11w(value: int) -> None:
-    try:
-        gdb.execute(f"set $r11w = {value}")
-    except Exception as e:
-        print(f"Error setting r11w register: {e}")
-
-
-def set_r11b(value: int) -> None:
-    try:
-        gdb.execute(f"set $r11b = {value}")
-    except Exception as e:
-        print(f"Error setting r11b register: {e}")
-
-
-def get_r12() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            r12 = f.read_register('r12')
-            return int(r12) & MASK_64BIT
-        except Exception as e:
-            print(f"Error reading r12 register: {e}")
-
-
-def get_r12d() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            r12d = f.read_register('r12d')
-            return int(r12d) & MASK_32BIT
-        except Exception as e:
-            print(f"Error reading r12d register: {e}")
-
-
-def get_r12w() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            r12w = f.read_register('r12w')
-            return int(r12w) & MASK_16BIT
-        except Exception as e:
-            print(f"Error reading r12w register: {e}")
-
-
-def get_r12b() -> int:
-    return get_r12w() & MASK_8BIT
-
-
-def set_r12(value: int) -> None:
-    try:
-        gdb.execute(f"set $r12 = {value}")
-    except Exception as e:
-        print(f"Error setting r12 register: {e}")
-
-
-def set_r12d(value: int) -> None:
-    try:
-        gdb.execute(f"set $r12d = {value}")
-    except Exception as e:
-        print(f"Error setting r12d register: {e}")
-
-
-def set_r12w(value: int) -> None:
-    try:
-        gdb.execute(f"set $r12w = {value}")
-    except Exception as e:
-        print(f"Error setting r12w register: {e}")
-
-
-def set_r12b(value: int) -> None:
-    try:
-        gdb.execute(f"set $r12b = {value}")
-    except Exception as e:
-        print(f"Error setting r12b register: {e}")
+SEGMENT_REGISTERS = ('cs', 'ss', 'ds', 'es', 'fs', 'gs')
 
 
-def get_r13() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            r13 = f.read_register('r13')
-            return int(r13) & MASK_64BIT
-        except Exception as e:
-            print(f"Error reading r13 register: {e}")
-
-
-def get_r13d() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            r13d = f.read_register('r13d')
-            return int(r13d) & MASK_32BIT
-        except Exception as e:
-            print(f"Error reading r13d register: {e}")
-
-
-def get_r13w() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            r13w = f.read_register('r13w')
-            return int(r13w) & MASK_16BIT
-        except Exception as e:
-            print(f"Error reading r13w register: {e}")
-
-
-def get_r13b() -> int:
-    return get_r13w() & MASK_8BIT
-
-
-def set_r13(value: int) -> None:
-    try:
-        gdb.execute(f"set $r13 = {value}")
-    except Exception as e:
-        print(f"Error setting r13 register: {e}")
-
-
-def set_r13d(value: int) -> None:
-    try:
-        gdb.execute(f"set $r13d = {value}")
-    except Exception as e:
-        print(f"Error setting r13d register: {e}")
-
-
-def set_r13w(value: int) -> None:
-    try:
-        gdb.execute(f"set $r13w = {value}")
-    except Exception as e:
-        print(f"Error setting r13w register: {e}")
-
-
-def set_r13b(value: int) -> None:
-    try:
-        gdb.execute(f"set $r13b = {value}")
-    except Exception as e:
-        print(f"Error setting r13b register: {e}")
-
-
-def get_r14() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            r14 = f.read_register('r14')
-            return int(r14) & MASK_64BIT
-        except Exception as e:
-            print(f"Error reading r14 register: {e}")
+def _describe(name, width, parent=None, offset=0, zero_extend=False) -> RegisterDescriptor:
+    return RegisterDescriptor(name, width, (1 << width) - 1, parent or name, offset, zero_extend)
 
 
-def get_r14d() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            r14d = f.read_register('r14d')
-            return int(r14d) & MASK_32BIT
-        except Exception as e:
-            print(f"Error reading r14d register: {e}")
+def _build_register_table() -> dict:
+    descriptors = []
+    for full, dword, word, low_byte, high_byte in GENERAL_PURPOSE_REGISTER_FAMILIES:
+        descriptors += [_describe(full, 64), _describe(dword, 32, full), _describe(word, 16, full),
+                        _describe(low_byte, 8, full)]
+        if high_byte:
+            descriptors.append(_describe(high_byte, 8, full, offset=8))
 
+    # The instruction pointer is read through gdb.Frame.pc(), which works for every architecture
+    descriptors += [_describe(PC_REGISTER, 64),
+                    _describe('rip', 64, PC_REGISTER, zero_extend=True),
+                    _describe('eip', 32, PC_REGISTER, zero_extend=True),
+                    _describe('ip', 16, PC_REGISTER, zero_extend=True),
+                    _describe('eflags', 32)]
+    descriptors += [_describe(segment, 16) for segment in SEGMENT_REGISTERS]
 
-def get_r14w() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            r14w = f.read_register('r14w')
-            return int(r14w) & MASK_16BIT
-        except Exception as e:
-            print(f"Error reading r14w register: {e}")
+    return {descriptor.name: descriptor for descriptor in descriptors}
 
 
-def get_r14b() -> int:
-    return get_r14w() & MASK_8BIT
+REGISTERS = _build_register_table()
 
 
-def set_r14(value: int) -> None:
-    try:
-        gdb.execute(f"set $r14 = {value}")
-    except Exception as e:
-        print(f"Error setting r14 register: {e}")
+def _read_raw_register(frame: gdb.Frame, name: str) -> int:
+    if name == PC_REGISTER:
+        return frame.pc()
+    return int(frame.read_register(name))
 
 
-def set_r14d(value: int) -> None:
-    try:
-        gdb.execute(f"set $r14d = {value}")
-    except Exception as e:
-        print(f"Error setting r14d register: {e}")
+# A register read on its own - a 'p' packet. The reads of a fetch are answered by GDB from the single 'g' packet
+# of the first one, so the fetch is recorded as a whole instead (see ``RegisterSnapshot.fetch``)
+_read_single_register = stats.instrument('read_register', skip=1)(_read_raw_register)
 
 
-def set_r14w(value: int) -> None:
-    try:
-        gdb.execute(f"set $r14w = {value}")
-    except Exception as e:
-        print(f"Error setting r14w register: {e}")
+@stats.instrument('write_register')
+def _write_raw_register(name: str, value: int) -> None:
+    gdb.execute(f"set ${name} = {value}")
+    return
 
 
-def set_r14b(value: int) -> None:
-    try:
-        gdb.execute(f"set $r14b = {value}")
-    except Exception as e:
-        print(f"Error setting r14b register: {e}")
+class RegisterSnapshot:
+    """
+    Raw register values of one frame, fetched together and served until the target stops or resumes again.
+    The general-purpose register file is fetched on the first read, other registers on their own first read.
+    """
 
+    def __init__(self, names):
+        self.enabled = True
+        self.names = tuple(names)
+        self.frame = None
+        self.values = {}
+        self.hits = 0
+        self.misses = 0
+        self.writing = False
+
+    def invalidate(self, *_event) -> None:
+        """
+        Forget every value. Also used as a gdb.events handler, hence the ignored event argument
+        :return:
+        """
+        # Our own writes keep the snapshot coherent by themselves - see ``write``
+        if not self.writing:
+            self.frame = None
+            self.values = {}
+        return
+
+    @stats.instrument('fetch_registers', skip=2)
+    def fetch(self, frame: gdb.Frame) -> None:
+        """
+        Read the whole general-purpose register file of ``frame``
+        :return:
+        """
+        self.frame = frame
+        self.values = {}
+        for name in self.names:
+            try:
+                self.values[name] = _read_raw_register(frame, name)
+            except ValueError:
+                # Doesn't exist on this architecture (e.g. rax on i386)
+                self.values[name] = None
+        return
+
+    def read(self, frame: gdb.Frame, name: str) -> int:
+        """
+        :return int: The raw value of register ``name`` in ``frame``
+        """
+        if not self.enabled:
+            return _read_single_register(frame, name)
+
+        missed = False
+        if self.frame is None or self.frame != frame:
+            missed = True
+            self.fetch(frame)
+
+        if name not in self.values:
+            missed = True
+            try:
+                self.values[name] = _read_single_register(frame, name)
+            except ValueError:
+                self.values[name] = None
 
-def get_r15() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            r15 = f.read_register('r15')
-            return int(r15) & MASK_64BIT
-        except Exception as e:
-            print(f"Error reading r15 register: {e}")
+        if missed:
+            self.misses += 1
+        else:
+            self.hits += 1
 
+        value = self.values[name]
+        if value is None:
+            raise ValueError(f"Bad register: {name}")
+        return value
 
-def get_r15d() -> int:
-    f = get_curr_frame()
-    if f:
+    def write(self, frame: gdb.Frame, name: str, value: int) -> None:
+        """
+        Write a raw register through to the target, then update the snapshot with the written value
+        :return:
+        """
+        self.writing = True
         try:
-            r15d = f.read_register('r15d')
-            return int(r15d) & MASK_32BIT
-        except Exception as e:
-            print(f"Error reading r15d register: {e}")
+            _write_raw_register(name, value)
+        finally:
+            self.writing = False
 
+        if name == PC_REGISTER:
+            # A new pc means a new frame
+            self.invalidate()
+        elif self.frame is not None and self.frame == frame:
+            self.values[name] = value
+        return
 
-def get_r15w() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            r15w = f.read_register('r15w')
-            return int(r15w) & MASK_16BIT
-        except Exception as e:
-            print(f"Error reading r15w register: {e}")
 
+REGISTER_SNAPSHOT = RegisterSnapshot(dict.fromkeys(descriptor.parent for descriptor in REGISTERS.values()))
 
-def get_r15b() -> int:
-    return get_r15w() & MASK_8BIT
+gdb.events.stop.connect(REGISTER_SNAPSHOT.invalidate)
+gdb.events.cont.connect(REGISTER_SNAPSHOT.invalidate)
+# gdb.events.register_changed is missing from older GDB versions
+if hasattr(gdb.events, 'register_changed'):
+    gdb.events.register_changed.connect(REGISTER_SNAPSHOT.invalidate)
 
 
-def set_r15(value: int) -> None:
+def _read_parent(frame: gdb.Frame, descriptor: RegisterDescriptor) -> tuple[int, bool]:
+    """
+    :return tuple[int, bool]: The raw value, and whether it was read from the parent (False for 32-bit targets,
+    where the 64-bit parents don't exist and the register is read by its own name)
+    """
     try:
-        gdb.execute(f"set $r15 = {value}")
-    except Exception as e:
-        print(f"Error setting r15 register: {e}")
+        return REGISTER_SNAPSHOT.read(frame, descriptor.parent), True
+    except ValueError:
+        if descriptor.parent == descriptor.name:
+            raise
+        return REGISTER_SNAPSHOT.read(frame, descriptor.name), False
 
 
-def set_r15d(value: int) -> None:
+def get_register_value(descriptor: RegisterDescriptor) -> int:
+    """
+    :param RegisterDescriptor descriptor: Entry of ``REGISTERS``
+    :return int: The register's (unsigned) value in the selected frame
+    """
+    f = gdb.selected_frame()
     try:
-        gdb.execute(f"set $r15d = {value}")
+        value, from_parent = _read_parent(f, descriptor)
+        if from_parent:
+            value >>= descriptor.offset
+        return value & descriptor.mask
     except Exception as e:
-        print(f"Error setting r15d register: {e}")
+        print(f"Error reading {descriptor.name} register: {e}")
 
 
-def set_r15w(value: int) -> None:
+def set_register_value(descriptor: RegisterDescriptor, value: int) -> None:
+    """
+    :param RegisterDescriptor descriptor: Entry of ``REGISTERS``
+    :param int value: Value to write to the register
+    """
     try:
-        gdb.execute(f"set $r15w = {value}")
-    except Exception as e:
-        print(f"Error setting r15w register: {e}")
+        value &= descriptor.mask
+        f = gdb.selected_frame()
+        if descriptor.parent == descriptor.name or descriptor.zero_extend:
+            REGISTER_SNAPSHOT.write(f, descriptor.parent, value)
+            return
 
+        parent_value, from_parent = _read_parent(f, descriptor)
+        if not from_parent:
+            REGISTER_SNAPSHOT.write(f, descriptor.name, value)
+            return
 
-def set_r15b(value: int) -> None:
-    try:
-        gdb.execute(f"set $r15b = {value}")
+        parent_mask = descriptor.mask << descriptor.offset
+        parent_value = (parent_value & ~parent_mask) | (value << descriptor.offset)
+        REGISTER_SNAPSHOT.write(f, descriptor.parent, parent_value & MASK_64BIT)
     except Exception as e:
-        print(f"Error setting r15b register: {e}")
-
+        print(f"Error setting {descriptor.name} register: {e}")
 
-def get_pc() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            pc = f.pc()
-            return pc
-        except Exception as e:
-            print(f"Error reading pc register: {e}")
 
+def _make_getter(descriptor: RegisterDescriptor):
+    def getter() -> int:
+        return get_register_value(descriptor)
 
-def get_rip() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            pc = f.pc()
-            return pc & MASK_64BIT
-        except Exception as e:
-            print(f"Error reading rip register: {e}")
+    getter.__name__ = getter.__qualname__ = 'get_' + descriptor.name
+    getter.__doc__ = f"""
+    :return int: Value of the {descriptor.name} register in the selected frame
+    """
+    return getter
 
 
-def get_eip() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            pc = f.pc()
-            return pc & MASK_32BIT
-        except Exception as e:
-            print(f"Error reading eip register: {e}")
+def _make_setter(descriptor: RegisterDescriptor):
+    def setter(value: int) -> None:
+        set_register_value(descriptor, value)
 
+    setter.__name__ = setter.__qualname__ = 'set_' + descriptor.name
+    setter.__doc__ = f"""
+    :param int value: Value to write to the {descriptor.name} register
+    """
+    return setter
 
-def get_ip() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            pc = f.pc()
-            return pc & MASK_16BIT
-        except Exception as e:
-            print(f"Error reading ip register: {e}")
 
+# Generates get_rax(), set_eax(), get_r8b(), get_eflags(), set_cs() etc.
+for _descriptor in REGISTERS.values():
+    globals()['get_' + _descriptor.name] = _make_getter(_descriptor)
+    globals()['set_' + _descriptor.name] = _make_setter(_descriptor)
+del _descriptor
 
-def set_pc(value: int) -> None:
-    try:
-        gdb.execute(f"set $pc = {value}")
-    except Exception as e:
-        print(f"Error setting pc register: {e}")
 
+LDTR_FIELDS = ('sel', 'base', 'limit', 'type', 's', 'dpl', 'p')
 
-def set_rip(value: int) -> None:
-    try:
-        value = value & MASK_64BIT
-        set_pc(value)
-    except Exception as e:
-        print(f"Error setting rip register: {e}")
 
+def _parse_hex(match) -> int:
+    return int(match.group(1), 16)
 
-def set_eip(value: int) -> None:
-    try:
-        value = value & MASK_32BIT
-        set_pc(value)
-    except Exception as e:
-        print(f"Error setting eip register: {e}")
 
+def _parse_table_register(match) -> tuple[int, int]:
+    return int(match.group(1), 16), int(match.group(2), 16)
 
-def set_ip(value: int) -> None:
-    try:
-        value = value & MASK_16BIT
-        set_pc(value)
-    except Exception as e:
-        print(f"Error setting ip register: {e}")
 
+def _parse_ldtr(match) -> dict:
+    return dict(zip(LDTR_FIELDS, (int(field, 16) for field in match.groups())))
 
-def get_eflags() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            eflags = f.read_register('eflags')
-            return int(eflags) & MASK_64BIT
-        except Exception as e:
-            print(f"Error reading eflags register: {e}")
+_HEX = r'((?:0x)?[0-9a-fA-F]+)'
+_TABLE_REGISTER = r'base=' + _HEX + r'\s+limit=' + _HEX
+_LDTR = r'\s+'.join(field + r'\s+' + _HEX for field in LDTR_FIELDS)
 
+# name: (pattern for the output of "monitor r <name>", pattern for the output of a bare "monitor r", parser)
+SYSTEM_REGISTER_PARSERS = {
+    'cr0': (re.compile(r'cr0=' + _HEX), re.compile(r'\bcr0=' + _HEX), _parse_hex),
+    'cr2': (re.compile(r'cr2=' + _HEX), re.compile(r'\bcr2=' + _HEX), _parse_hex),
+    'cr3': (re.compile(r'cr3=' + _HEX), re.compile(r'\bcr3=' + _HEX), _parse_hex),
+    'cr4': (re.compile(r'cr4=' + _HEX), re.compile(r'\bcr4=' + _HEX), _parse_hex),
+    'efer': (re.compile(r'efer=' + _HEX), re.compile(r'\befer=' + _HEX), _parse_hex),
+    'gdtr': (re.compile(_TABLE_REGISTER), re.compile(r'\bgdtr\b[^\n]*?' + _TABLE_REGISTER), _parse_table_register),
+    'idtr': (re.compile(_TABLE_REGISTER), re.compile(r'\bidtr\b[^\n]*?' + _TABLE_REGISTER), _parse_table_register),
+    'ldtr': (re.compile(_LDTR), re.compile(r'\bldtr\b[^\n]*?' + _LDTR), _parse_ldtr),
+}
 
-def set_eflags(value: int) -> None:
-    try:
-        gdb.execute(f"set $eflags = {value}")
-    except Exception as e:
-        print(f"Error setting eflags register: {e}")
 
+class SystemRegisterSnapshot:
+    """
+    VMware only!
+    Control and descriptor-table registers of the current logical processor, parsed out of the monitor's output
+    once and served until the target stops or resumes again
+    """
 
-def get_cs() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            cs = f.read_register('cs')
-            return int(cs) & MASK_16BIT
-        except Exception as e:
-            print(f"Error reading cs register: {e}")
+    def __init__(self):
+        self.values = {}
+        self.thread = None
+        self.fetched = False
+        # Whether a bare "monitor r" reports the registers - unknown until tried once
+        self.combined = None
+
+    def invalidate(self, *_event) -> None:
+        """
+        Forget every value. Also used as a gdb.events handler, hence the ignored event argument
+        :return:
+        """
+        self.values = {}
+        self.fetched = False
+        return
+
+    def refresh(self) -> None:
+        """
+        Re-read the registers now, for callers that can't wait for the next stop.
+        Also drops ``REGISTER_SNAPSHOT``, which serves the control registers on QEMU
+        :return:
+        """
+        self.invalidate()
+        REGISTER_SNAPSHOT.invalidate()
+        if GDBP_OBJ.is_vmware():
+            self.fetch()
+        return
+
+    def fetch(self) -> None:
+        """
+        Parse every register out of a single bare "monitor r", if the monitor supports it
+        :return:
+        """
+        self.values = {}
+        self.thread = _selected_thread_key()
+        self.fetched = True
+        if self.combined is False:
+            return
+
+        try:
+            out = get_rsp_channel().monitor("r")
+        except (gdb.error, GdbpRspError):
+            out = ''
+
+        self.values = _parse_system_registers(out)
+        self.combined = bool(self.values)
+        return
+
+    def get(self, name: str):
+        """
+        :param str name: Key of ``SYSTEM_REGISTER_PARSERS``
+        :return: The parsed value of the register
+        """
+        if not self.fetched or self.thread != _selected_thread_key():
+            self.fetch()
+
+        if name not in self.values:
+            self.values[name] = _parse_system_register(name, get_rsp_channel().monitor(f"r {name}"))
+
+        return self.values[name]
+
+
+@stats.instrument('parse', lambda args, _result: len(args[0]))
+def _parse_system_registers(out: str) -> dict:
+    """
+    :return dict: Every register of ``SYSTEM_REGISTER_PARSERS`` found in the output of a bare "monitor r"
+    """
+    values = {}
+    for name, (_, combined_pattern, parse) in SYSTEM_REGISTER_PARSERS.items():
+        match = combined_pattern.search(out)
+        if match:
+            values[name] = parse(match)
+    return values
 
 
-def get_ss() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            ss = f.read_register('ss')
-            return int(ss) & MASK_16BIT
-        except Exception as e:
-            print(f"Error reading ss register: {e}")
+@stats.instrument('parse', lambda args, _result: len(args[1]))
+def _parse_system_register(name: str, out: str):
+    """
+    :return: Register ``name`` parsed out of the output of "monitor r <name>"
+    """
+    pattern, _, parse = SYSTEM_REGISTER_PARSERS[name]
+    match = pattern.search(out)
+    if not match:
+        raise ValueError(f"Unexpected output of monitor r {name}: {out!r}")
+    return parse(match)
 
 
-def get_ds() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            ds = f.read_register('ds')
-            return int(ds) & MASK_16BIT
-        except Exception as e:
-            print(f"Error reading ds register: {e}")
+def _selected_thread_key():
+    # Every vCPU is a thread - monitor commands report the registers of the selected one
+    thread = gdb.selected_thread()
+    return thread.ptid if thread else None
 
 
-def get_es() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            es = f.read_register('es')
-            return int(es) & MASK_16BIT
-        except Exception as e:
-            print(f"Error reading es register: {e}")
+SYSTEM_REGISTERS = SystemRegisterSnapshot()
 
+gdb.events.stop.connect(SYSTEM_REGISTERS.invalidate)
+gdb.events.cont.connect(SYSTEM_REGISTERS.invalidate)
 
-def get_fs() -> int:
-    f = get_curr_frame()
-    if f:
-        try:
-            fs = f.read_register('fs')
-            return int(fs) & MASK_16BIT
-        except Exception as e:
-            print(f"Error reading fs register: {e}")
 
+def _get_control_register(name: str) -> int:
+    if GDBP_OBJ.is_vmware():
+        return SYSTEM_REGISTERS.get(name)
 
-def get_gs() -> int:
     f = get_curr_frame()
     if f:
         try:
-            gs = f.read_register('gs')
-            return int(gs) & MASK_16BIT
+            return REGISTER_SNAPSHOT.read(f, name) & MASK_64BIT
         except Exception as e:
-            print(f"Error reading gs register: {e}")
-
-
-def set_cs(value: int) -> None:
-    try:
-        gdb.execute(f"set $cs = {value}")
-    except Exception as e:
-        print(f"Error setting cs register: {e}")
-
-
-def set_ss(value: int) -> None:
-    try:
-        gdb.execute(f"set $ss = {value}")
-    except Exception as e:
-        print(f"Error setting cs register: {e}")
-
-
-def set_ds(value: int) -> None:
-    try:
-        gdb.execute(f"set $ds = {value}")
-    except Exception as e:
-        print(f"Error setting ds register: {e}")
-
-
-def set_es(value: int) -> None:
-    try:
-        gdb.execute(f"set $es = {value}")
-    except Exception as e:
-        print(f"Error setting es register: {e}")
-
-
-def set_fs(value: int) -> None:
-    try:
-        gdb.execute(f"set $fs = {value}")
-    except Exception as e:
-        print(f"Error setting fs register: {e}")
-
-
-def set_gs(value: int) -> None:
-    try:
-        gdb.execute(f"set $gs = {value}")
-    except Exception as e:
-        print(f"Error setting gs register: {e}")
+            print(f"Error reading {name} register: {e}")
 
 
 def get_cr0() -> int:
@@ -1318,21 +480,7 @@ def get_cr0() -> int:
     Get the CR0 of the current logical processor
     :return: int: value of the CR0 register
     """
-    global GDBP_OBJ
-
-    if GDBP_OBJ.is_vmware():
-        read_cr0 = gdb.execute("monitor r cr0", to_string=True)
-        cr0 = int(splice(read_cr0, "cr0=", "\n"), 16)
-        return cr0
-
-    else:
-        f = get_curr_frame()
-        if f:
-            try:
-                cr0 = f.read_register('cr0')
-                return int(cr0) & MASK_64BIT
-            except Exception as e:
-                print(f"Error reading cr0 register: {e}")
+    return _get_control_register('cr0')
 
 
 def get_cr2() -> int:
@@ -1340,21 +488,7 @@ def get_cr2() -> int:
     Get the CR2 of the current logical processor
     :return: int: value of the CR2 register
     """
-    global GDBP_OBJ
-
-    if GDBP_OBJ.is_vmware():
-        read_cr2 = gdb.execute("monitor r cr2", to_string=True)
-        cr2 = int(splice(read_cr2, "cr2=", "\n"), 16)
-        return cr2
-
-    else:
-        f = get_curr_frame()
-        if f:
-            try:
-                cr2 = f.read_register('cr2')
-                return int(cr2) & MASK_64BIT
-            except Exception as e:
-                print(f"Error reading cr2 register: {e}")
+    return _get_control_register('cr2')
 
 
 def get_cr3() -> int:
@@ -1362,21 +496,7 @@ def get_cr3() -> int:
     Get the CR3 of the current logical processor
     :return: int: value of the CR3 register
     """
-    global GDBP_OBJ
-
-    if GDBP_OBJ.is_vmware():
-        read_cr3 = gdb.execute("monitor r cr3", to_string=True)
-        cr3 = int(splice(read_cr3, "cr3=", "\n"), 16)
-        return cr3
-
-    else:
-        f = get_curr_frame()
-        if f:
-            try:
-                cr3 = f.read_register('cr3')
-                return int(cr3) & MASK_64BIT
-            except Exception as e:
-                print(f"Error reading cr3 register: {e}")
+    return _get_control_register('cr3')
 
 
 def get_cr4() -> int:
@@ -1384,21 +504,15 @@ def get_cr4() -> int:
     Get the CR4 of the current logical processor
     :return: int: value of the CR4 register
     """
-    global GDBP_OBJ
+    return _get_control_register('cr4')
 
-    if GDBP_OBJ.is_vmware():
-        read_cr4 = gdb.execute("monitor r cr4", to_string=True)
-        cr4 = int(splice(read_cr4, "cr4=", "\n"), 16)
-        return cr4
 
-    else:
-        f = get_curr_frame()
-        if f:
-            try:
-                cr4 = f.read_register('cr4')
-                return int(cr4) & MASK_64BIT
-            except Exception as e:
-                print(f"Error reading cr4 register: {e}")
+def get_efer() -> int:
+    """
+    Get the IA32_EFER MSR of the current logical processor
+    :return: int: value of the IA32_EFER register
+    """
+    return _get_control_register('efer')
 
 
 def get_gdtr() -> tuple[int, int]:
@@ -1410,10 +524,7 @@ def get_gdtr() -> tuple[int, int]:
     global GDBP_OBJ
 
     if GDBP_OBJ.is_vmware():
-        read_gdtr = gdb.execute("monitor r gdtr", to_string=True)
-        gdtr_base = int(splice(read_gdtr, "base=", " "), 16)
-        gdtr_limit = int(splice(read_gdtr, "limit=", "\n"), 16)
-        return gdtr_base, gdtr_limit
+        return SYSTEM_REGISTERS.get('gdtr')
 
     else:
         raise Exception("Not supported in QEMU :(")
@@ -1428,10 +539,7 @@ def get_idtr() -> tuple[int, int]:
     global GDBP_OBJ
 
     if GDBP_OBJ.is_vmware():
-        read_idtr = gdb.execute("monitor r idtr", to_string=True)
-        idtr_base = int(splice(read_idtr, "base=", " "), 16)
-        idtr_limit = int(splice(read_idtr, "limit=", "\n"), 16)
-        return idtr_base, idtr_limit
+        return SYSTEM_REGISTERS.get('idtr')
 
     else:
         raise Exception("Not supported in QEMU :(")
@@ -1445,29 +553,11 @@ def get_ldtr() -> dict:
     """
     global GDBP_OBJ
     if GDBP_OBJ.is_vmware():
-        ldtr_info = {}
-
-        read_ldtr = gdb.execute("monitor r ldtr", to_string=True)
         try:
-            ldtr_sel = int(splice(read_ldtr, "sel ", " base"), 16)
-            ldtr_base = int(splice(read_ldtr, "base ", " limit"), 16)
-            ldtr_limit = int(splice(read_ldtr, "limit ", " type"), 16)
-            ldtr_type = int(splice(read_ldtr, "type ", " s"), 16)
-            ldtr_s = int(splice(read_ldtr, "s ", " dpl"), 16)
-            ldtr_dpl = int(splice(read_ldtr, "dpl ", " p"), 16)
-            ldtr_p = int(splice(read_ldtr, "p ", "\n"), 16)
-
-            ldtr_info["sel"] = ldtr_sel
-            ldtr_info["base"] = ldtr_base
-            ldtr_info["limit"] = ldtr_limit
-            ldtr_info["type"] = ldtr_type
-            ldtr_info["s"] = ldtr_s
-            ldtr_info["dpl"] = ldtr_dpl
-            ldtr_info["p"] = ldtr_p
+            return dict(SYSTEM_REGISTERS.get('ldtr'))
         except ValueError as e:
             print(f"Error parsing ldtr register: {e}")
-
-        return ldtr_info
+            return {}
 
     else:
         raise Exception("Not supported in QEMU :(")
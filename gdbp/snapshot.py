@@ -0,0 +1,384 @@
+import contextlib
+import hashlib
+import mmap
+
+from .backend import gdb
+from .general import GDBP_OBJ
+from .rsp import GdbpRspError, get_rsp_channel
+from .rw_memory import PAGE_MASK, PAGE_SIZE, WRITE_BUFFER, _read_run
+
+# Table of GDB's CRC-32 (polynomial 0x04c11db7, MSB first, no final xor) - the checksum the qCRC packet uses
+_CRC32_TABLE = []
+for _byte in range(256):
+    _crc = _byte << 24
+    for _ in range(8):
+        _crc = ((_crc << 1) ^ 0x04c11db7 if _crc & 0x80000000 else _crc << 1) & 0xFFFFFFFF
+    _CRC32_TABLE.append(_crc)
+del _byte, _crc
+
+
+def gdb_crc32(data, crc: int = 0xFFFFFFFF) -> int:
+    """
+    :param data: Buffer to checksum
+    :param int crc: CRC of the preceding data, to checksum a buffer in parts. default = the initial value.
+    :return int: GDB's CRC-32 of ``data``, as the stub computes it for ``qCRC``
+    """
+    table = _CRC32_TABLE
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ table[(crc >> 24) ^ byte]
+    return crc
+
+
+class _QCrcState:
+    # None until the first probe tells whether the stub implements qCRC
+    supported = None
+
+
+def probe_crc(address: int, length: int):
+    """
+    Ask the stub for the CRC of a memory range, without transferring the memory itself
+    :param int address: Start of the range
+    :param int length: Length of the range
+    :return int: CRC of the range (see ``gdb_crc32``), or None if the stub couldn't compute it
+    """
+    if _QCrcState.supported is False:
+        return None
+
+    try:
+        reply = get_rsp_channel().send(f'qCRC:{address:x},{length:x}').decode('latin-1')
+    except (gdb.error, GdbpRspError):
+        _QCrcState.supported = False
+        return None
+
+    if not reply:
+        # An empty reply means the packet isn't supported
+        _QCrcState.supported = False
+        return None
+    if not reply.startswith('C'):
+        # Error reply - e.g. part of the range is unreadable
+        return None
+
+    _QCrcState.supported = True
+    return int(reply[1:], 16)
+
+
+class PageStore:
+    """
+    Append-only store of page contents, deduplicated by hash. Kept in memory, or in a file that is memory-mapped for
+    reading. Snapshots taken from one another share their store.
+    """
+
+    def __init__(self, path: str = None):
+        """
+        :param str path: Backing file. default = keep the pages in memory.
+        """
+        self.path = path
+        self.indexes = {}
+        self.digests = []
+        self.crcs = {}
+        if path is None:
+            self.pages = []
+            self.file = None
+        else:
+            self.pages = None
+            self.file = open(path, 'w+b')
+        self.map = None
+
+    def add(self, data: bytes) -> int:
+        """
+        :param bytes data: Contents of a page
+        :return int: Index of the page in the store. Pages with the same contents get the same index
+        """
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        index = self.indexes.get(digest)
+        if index is not None:
+            return index
+
+        index = self.indexes[digest] = len(self.digests)
+        self.digests.append(digest)
+        if self.file is None:
+            self.pages.append(bytes(data))
+        else:
+            self.file.seek(index * PAGE_SIZE)
+            self.file.write(data)
+        return index
+
+    def get(self, index: int):
+        """
+        :return: Contents of the page at ``index``
+        """
+        if self.file is None:
+            return self.pages[index]
+
+        if self.map is None or len(self.map) < (index + 1) * PAGE_SIZE:
+            self.file.flush()
+            if self.map is not None:
+                self.map.close()
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.map[index * PAGE_SIZE:(index + 1) * PAGE_SIZE]
+
+    def crc(self, index: int) -> int:
+        """
+        :return int: GDB's CRC-32 of the page at ``index``
+        """
+        crc = self.crcs.get(index)
+        if crc is None:
+            crc = self.crcs[index] = gdb_crc32(self.get(index))
+        return crc
+
+    def close(self) -> None:
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+        return
+
+    def __len__(self):
+        return len(self.digests)
+
+
+class Snapshot:
+    """
+    Contents of a set of memory ranges at one point in time, stored page by page in a ``PageStore``
+    """
+
+    def __init__(self, ranges: list, physical: bool, store: PageStore):
+        self.ranges = ranges
+        self.physical = physical
+        self.store = store
+        # Page address -> store index, or None if the page was unreadable
+        self.pages = {}
+        self.read_pages = 0
+        self.reused_pages = 0
+
+    def page(self, page: int):
+        """
+        :return: Contents of the page at ``page``, or None if it wasn't captured or was unreadable
+        """
+        index = self.pages.get(page)
+        return None if index is None else self.store.get(index)
+
+    def read(self, address: int, length: int) -> bytes:
+        """
+        :return bytes: ``length`` bytes at ``address``, as they were when the snapshot was taken
+        """
+        chunks = []
+        end = address + length
+        while address < end:
+            data = self.page(address & PAGE_MASK)
+            if data is None:
+                raise KeyError(f"{hex(address)} is not in the snapshot")
+            chunk_end = min((address & PAGE_MASK) + PAGE_SIZE, end)
+            chunks.append(data[address & (PAGE_SIZE - 1):chunk_end - (address & PAGE_MASK)])
+            address = chunk_end
+        return b''.join(chunks)
+
+    def __repr__(self):
+        return f'<Snapshot {len(self.pages)} pages, {len(self.store)} stored>'
+
+
+def _merge_ranges(ranges) -> list:
+    """
+    :param ranges: (address, length) pairs
+    :return list: The ranges as sorted, non-overlapping [start, end) pairs
+    """
+    merged = []
+    for start, end in sorted((address, address + length) for address, length in ranges if length > 0):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(item) for item in merged]
+
+
+def _intersect_ranges(ranges_a: list, ranges_b: list) -> list:
+    """
+    :return list: The [start, end) ranges covered by both sorted, non-overlapping range lists
+    """
+    result = []
+    index_a = index_b = 0
+    while index_a < len(ranges_a) and index_b < len(ranges_b):
+        start = max(ranges_a[index_a][0], ranges_b[index_b][0])
+        end = min(ranges_a[index_a][1], ranges_b[index_b][1])
+        if start < end:
+            result.append((start, end))
+        if ranges_a[index_a][1] < ranges_b[index_b][1]:
+            index_a += 1
+        else:
+            index_b += 1
+    return result
+
+
+def _page_runs(ranges: list) -> list:
+    """
+    :return list: The page-aligned [start, end) runs covering ``ranges``
+    """
+    runs = []
+    for start, end in ranges:
+        start &= PAGE_MASK
+        end = (end + PAGE_SIZE - 1) & PAGE_MASK
+        if runs and start <= runs[-1][1]:
+            runs[-1][1] = max(runs[-1][1], end)
+        else:
+            runs.append([start, end])
+    return runs
+
+
+def _capture(snap: Snapshot, start: int, end: int) -> None:
+    for piece_start, data in _read_run(start, end):
+        if data is None:
+            snap.pages[piece_start] = None
+            continue
+        for offset in range(0, len(data), PAGE_SIZE):
+            snap.pages[piece_start + offset] = snap.store.add(data[offset:offset + PAGE_SIZE])
+        snap.read_pages += len(data) // PAGE_SIZE
+    return
+
+
+def _reuse_or_capture(snap: Snapshot, base: Snapshot, pages: list) -> None:
+    """
+    Capture the consecutive ``pages``, reusing every sub-run whose CRC the stub reports unchanged since ``base``
+    """
+    if len(pages) == 1:
+        crc = base.store.crc(base.pages[pages[0]])
+    else:
+        crc = 0xFFFFFFFF
+        for page in pages:
+            crc = gdb_crc32(base.page(page), crc)
+
+    if probe_crc(pages[0], len(pages) * PAGE_SIZE) == crc:
+        for page in pages:
+            if snap.store is base.store:
+                snap.pages[page] = base.pages[page]
+            else:
+                snap.pages[page] = snap.store.add(base.page(page))
+        snap.reused_pages += len(pages)
+        return
+
+    if len(pages) == 1 or _QCrcState.supported is False:
+        _capture(snap, pages[0], pages[-1] + PAGE_SIZE)
+        return
+
+    middle = len(pages) // 2
+    _reuse_or_capture(snap, base, pages[:middle])
+    _reuse_or_capture(snap, base, pages[middle:])
+    return
+
+
+def snapshot(ranges, base: Snapshot = None, path: str = None, physical=None) -> Snapshot:
+    """
+    Capture memory ranges, page by page, into a deduplicating page store.
+    With ``base``, pages the stub reports unchanged (by ``qCRC``) are taken from ``base`` instead of being read again;
+    a changed run is bisected so only the changed pages are transferred.
+    :param ranges: (address, length) pairs to capture
+    :param Snapshot base: Earlier snapshot to take unchanged pages from. Its store is shared.
+    :param str path: Memory-map the page store from this file. default = keep it in memory.
+    :param physical: capture physical memory. default = the mode of ``base``, or False.
+    :return Snapshot: The new snapshot
+    """
+    if physical is None:
+        physical = base.physical if base is not None else False
+    if base is not None and base.physical != bool(physical):
+        raise ValueError("Can't compare physical and virtual snapshots")
+
+    if path is not None:
+        store = PageStore(path)
+    elif base is not None:
+        store = base.store
+    else:
+        store = PageStore()
+
+    snap = Snapshot(_merge_ranges(ranges), bool(physical), store)
+
+    # qCRC sees the target's memory, not writes still waiting in batch_writes()
+    WRITE_BUFFER.flush()
+
+    with GDBP_OBJ.phys_mode() if physical else contextlib.nullcontext():
+        for start, end in _page_runs(snap.ranges):
+            if base is None or _QCrcState.supported is False:
+                _capture(snap, start, end)
+                continue
+
+            # Probe the runs of pages base has; unreadable or new pages are just read
+            run = []
+            for page in range(start, end, PAGE_SIZE):
+                if base.pages.get(page) is not None:
+                    run.append(page)
+                    continue
+                if run:
+                    _reuse_or_capture(snap, base, run)
+                    run = []
+                _capture(snap, page, page + PAGE_SIZE)
+            if run:
+                _reuse_or_capture(snap, base, run)
+
+    return snap
+
+
+def _changed_in_page(page: int, old, new) -> list:
+    """
+    :return list: [start, end) ranges of the bytes that differ between two versions of a page
+    """
+    if old is None or new is None:
+        return [[page, page + PAGE_SIZE]]
+
+    changes = []
+    for block in range(0, PAGE_SIZE, 64):
+        if old[block:block + 64] == new[block:block + 64]:
+            continue
+        for offset in range(block, block + 64):
+            if old[offset] == new[offset]:
+                continue
+            address = page + offset
+            if changes and changes[-1][1] == address:
+                changes[-1][1] += 1
+            else:
+                changes.append([address, address + 1])
+    return changes
+
+
+def diff(snap_a: Snapshot, snap_b: Snapshot) -> list:
+    """
+    :param Snapshot snap_a: The older snapshot
+    :param Snapshot snap_b: The newer snapshot
+    :return list: Sorted [start, end) tuples of the bytes captured by both snapshots that differ. A page readable in
+    only one of the snapshots counts as changed.
+    """
+    same_store = snap_a.store is snap_b.store
+    ranges = _intersect_ranges(snap_a.ranges, snap_b.ranges)
+
+    changes = []
+    for page in sorted(set(snap_a.pages) & set(snap_b.pages)):
+        index_a = snap_a.pages.get(page)
+        index_b = snap_b.pages.get(page)
+        if index_a is None and index_b is None:
+            continue
+        if index_a is not None and index_b is not None:
+            if same_store and index_a == index_b:
+                continue
+            if snap_a.store.digests[index_a] == snap_b.store.digests[index_b]:
+                continue
+
+        for start, end in _changed_in_page(page, snap_a.page(page), snap_b.page(page)):
+            if changes and changes[-1][1] == start:
+                changes[-1][1] = end
+            else:
+                changes.append([start, end])
+
+    # Only report bytes that were asked for - the snapshots hold whole pages
+    clipped = []
+    range_index = 0
+    for start, end in changes:
+        while range_index < len(ranges) and ranges[range_index][1] <= start:
+            range_index += 1
+        index = range_index
+        while index < len(ranges) and ranges[index][0] < end:
+            clipped_start, clipped_end = max(start, ranges[index][0]), min(end, ranges[index][1])
+            if clipped and clipped[-1][1] == clipped_start:
+                clipped[-1] = (clipped[-1][0], clipped_end)
+            else:
+                clipped.append((clipped_start, clipped_end))
+            index += 1
+
+    return clipped
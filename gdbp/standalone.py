@@ -0,0 +1,373 @@
+"""
+Stand-in for the parts of GDB's ``gdb`` module that gdbp uses, served over a direct RSP connection to the gdbstub.
+Selected by ``backend`` when GDB isn't loaded (or GDBP_BACKEND=rsp), so gdbp runs from a plain Python process.
+"""
+import re
+import shlex
+import xml.etree.ElementTree
+
+TYPE_CODE_VOID = 1
+TYPE_CODE_INT = 8
+
+BP_BREAKPOINT = 1
+BP_HARDWARE_BREAKPOINT = 2
+
+COMMAND_DATA = 1
+COMMAND_USER = 13
+COMPLETE_FILENAME = 1
+
+TARGET_XML = 'target.xml'
+
+# Register layout of GDB's amd64 'g' packet - used when the stub doesn't describe its registers
+DEFAULT_ARCHITECTURE = 'i386:x86-64'
+DEFAULT_REGISTERS = ([(name, 64) for name in ('rax', 'rbx', 'rcx', 'rdx', 'rsi', 'rdi', 'rbp', 'rsp')] +
+                     [(f'r{index}', 64) for index in range(8, 16)] +
+                     [('rip', 64), ('eflags', 32)] +
+                     [(name, 32) for name in ('cs', 'ss', 'ds', 'es', 'fs', 'gs')])
+PC_NAMES = ('rip', 'eip', 'pc')
+
+_SET_REGISTER_PATTERN = re.compile(r'set \$(\w+)\s*=\s*(.+)')
+# Stubs use the xi prefix without declaring it (the DTD does) - ElementTree would reject it
+_XINCLUDE_PATTERN = re.compile(rb'<(/?)xi:include\b')
+
+
+class error(RuntimeError):
+    pass
+
+
+class MemoryError(error):
+    pass
+
+
+class GdbError(Exception):
+    pass
+
+
+class _EventRegistry:
+    def __init__(self):
+        self.handlers = []
+
+    def connect(self, handler) -> None:
+        self.handlers.append(handler)
+        return
+
+    def disconnect(self, handler) -> None:
+        self.handlers.remove(handler)
+        return
+
+    def fire(self, event=None) -> None:
+        """
+        Call every connected handler - the standalone backend has no event loop, so events are fired explicitly
+        :return:
+        """
+        for handler in list(self.handlers):
+            handler(event)
+        return
+
+
+class _Events:
+    def __init__(self):
+        for name in ('stop', 'cont', 'exited', 'memory_changed', 'register_changed', 'new_objfile',
+                     'clear_objfiles', 'breakpoint_created', 'breakpoint_deleted'):
+            setattr(self, name, _EventRegistry())
+
+
+events = _Events()
+
+
+def _channel():
+    # Imported here - rsp imports the backend, which imports this module
+    from .rsp import get_rsp_channel
+    return get_rsp_channel()
+
+
+def _parse_xml(data: bytes):
+    return xml.etree.ElementTree.fromstring(_XINCLUDE_PATTERN.sub(rb'<\1include', data))
+
+
+class _Register:
+    def __init__(self, name: str, number: int, size: int, offset: int):
+        self.name = name
+        self.number = number
+        self.size = size
+        self.offset = offset
+
+
+def _add_registers(read_xml, element, registers: dict, number: int) -> tuple[str, int]:
+    architecture = None
+    for child in element:
+        if child.tag == 'include':
+            included = read_xml(child.get('href'))
+            if included is not None:
+                included_architecture, number = _add_registers(read_xml, _parse_xml(included), registers, number)
+                architecture = included_architecture or architecture
+        elif child.tag == 'architecture':
+            architecture = child.text.strip()
+        elif child.tag == 'reg':
+            number = int(child.get('regnum', number))
+            registers[child.get('name')] = (number, int(child.get('bitsize')) // 8)
+            number += 1
+        else:
+            child_architecture, number = _add_registers(read_xml, child, registers, number)
+            architecture = child_architecture or architecture
+    return architecture, number
+
+
+def register_layout(read_xml) -> tuple[str, dict]:
+    """
+    :param read_xml: Callable returning the contents of a target description annex ('target.xml', ...), or None
+    :return tuple[str, dict]: The architecture name, and the registers by name. Offsets are into the 'g' block
+    """
+    registers = {}
+    architecture = None
+    description = read_xml(TARGET_XML)
+    if description is not None:
+        architecture, _ = _add_registers(read_xml, _parse_xml(description), registers, 0)
+    if not registers:
+        registers = {name: (number, bits // 8) for number, (name, bits) in enumerate(DEFAULT_REGISTERS)}
+
+    # The 'g' block holds the registers in number order
+    offset = 0
+    layout = {}
+    for name, (number, size) in sorted(registers.items(), key=lambda item: item[1][0]):
+        layout[name] = _Register(name, number, size, offset)
+        offset += size
+    return architecture or DEFAULT_ARCHITECTURE, layout
+
+
+def read_xml_annex(channel, annex: str):
+    """
+    :return bytes: The target description annex, read with qXfer over ``channel``, or None if the stub has none
+    """
+    data = b''
+    while True:
+        reply = channel.send(f'qXfer:features:read:{annex}:{len(data):x},fff')
+        if not reply or reply[:1] not in b'ml':
+            return None
+        data += reply[1:]
+        if reply[:1] == b'l':
+            return data
+
+
+class _Target:
+    """
+    Register layout of the connected stub (from its target description) and its 'g' register block
+    """
+
+    def __init__(self):
+        self.channel = None
+        self.architecture = DEFAULT_ARCHITECTURE
+        self.registers = {}
+        self.block = None
+
+    def invalidate(self, *_event) -> None:
+        self.block = None
+        return
+
+    def load(self) -> None:
+        """
+        Fetch the register layout, if the channel changed since the last time
+        :return:
+        """
+        channel = _channel()
+        if channel is self.channel:
+            return
+
+        self.channel = channel
+        self.block = None
+        self.architecture, self.registers = register_layout(lambda annex: read_xml_annex(channel, annex))
+        return
+
+    def register(self, name: str) -> _Register:
+        self.load()
+        register = self.registers.get(name)
+        if register is None and name == 'pc':
+            register = next((self.registers[alias] for alias in PC_NAMES if alias in self.registers), None)
+        if register is None:
+            raise ValueError(f"Bad register: {name}")
+        return register
+
+    def read_register(self, name: str) -> int:
+        register = self.register(name)
+        if self.block is None:
+            self.block = self.channel.read_registers()
+
+        # Registers past the end of the 'g' block are only available one by one
+        if register.offset + register.size <= len(self.block):
+            raw = self.block[register.offset:register.offset + register.size]
+        else:
+            raw = self.channel.read_register(register.number)
+        return int.from_bytes(raw, 'little')
+
+    def write_register(self, name: str, value: int) -> None:
+        register = self.register(name)
+        raw = (value & ((1 << (register.size * 8)) - 1)).to_bytes(register.size, 'little')
+        reply = self.channel.send(f'P{register.number:x}={raw.hex()}')
+        if reply != b'OK':
+            raise error(f"Couldn't write register {name}: {reply.decode('latin-1')!r}")
+        self.block = None
+        return
+
+
+_TARGET = _Target()
+events.stop.connect(_TARGET.invalidate)
+events.cont.connect(_TARGET.invalidate)
+events.register_changed.connect(_TARGET.invalidate)
+
+
+class _Type:
+    def __init__(self, code: int, sizeof: int):
+        self.code = code
+        self.sizeof = sizeof
+
+
+class Value(int):
+    """
+    An int with a ``type``, like the gdb.Value objects gdbp gets from parse_and_eval
+    """
+
+    def __new__(cls, value: int, code: int = TYPE_CODE_INT, sizeof: int = 8):
+        obj = super(Value, cls).__new__(cls, value)
+        obj.type = _Type(code, sizeof)
+        return obj
+
+
+class Architecture:
+    def __init__(self, name: str):
+        self._name = name
+
+    def name(self) -> str:
+        return self._name
+
+
+class Frame:
+    """
+    The stub's current register state. There is no unwinding, so every frame is the innermost one
+    """
+
+    def is_valid(self) -> bool:
+        return True
+
+    def read_register(self, name: str) -> Value:
+        return Value(_TARGET.read_register(name), TYPE_CODE_INT, _TARGET.register(name).size)
+
+    def pc(self) -> int:
+        return _TARGET.read_register('pc')
+
+    def architecture(self) -> Architecture:
+        _TARGET.load()
+        return Architecture(_TARGET.architecture)
+
+    def __eq__(self, other):
+        return isinstance(other, Frame)
+
+    def __hash__(self):
+        return 0
+
+
+def selected_frame() -> Frame:
+    return Frame()
+
+
+class InferiorThread:
+    # The stub's current thread - the standalone backend doesn't switch threads
+    num = 1
+    ptid = (1, 1, 0)
+
+
+def selected_thread() -> InferiorThread:
+    return InferiorThread()
+
+
+class Inferior:
+    def read_memory(self, address: int, length: int) -> memoryview:
+        return memoryview(_channel().read_memory(address, length))
+
+    def write_memory(self, address: int, buffer, length: int = None) -> None:
+        data = bytes(buffer)
+        if length is not None:
+            data = data[:length]
+        _channel().write_memory(address, data)
+        events.memory_changed.fire()
+        return
+
+
+def selected_inferior() -> Inferior:
+    return Inferior()
+
+
+def _escape_packet(data: bytes) -> str:
+    # The way "maint packet" prints a reply
+    return ''.join(chr(byte) if 0x20 <= byte < 0x7F and byte not in b'\\"' else f'\\x{byte:02x}' for byte in data)
+
+
+def execute(command: str, from_tty=False, to_string=False):
+    """
+    Run the few GDB commands gdbp itself uses: monitor, maint packet, set $register and the packet size query
+    :return str: The output, if ``to_string``
+    """
+    command = command.strip()
+    if command.startswith('monitor '):
+        out = _channel().monitor(command[len('monitor '):])
+    elif command.startswith('maint packet '):
+        packet = command[len('maint packet '):]
+        out = f'sending: "{packet}"\nreceived: "{_escape_packet(_channel().send(packet))}"\n'
+    elif _SET_REGISTER_PATTERN.match(command):
+        match = _SET_REGISTER_PATTERN.match(command)
+        _TARGET.write_register(match.group(1), int(parse_and_eval(match.group(2))))
+        events.register_changed.fire()
+        out = ''
+    elif command.startswith('show remote memory-read-packet-size'):
+        packet_size = getattr(_channel(), 'packet_size', 0x1000)
+        out = f'The memory-read-packet-size is {packet_size}. Packets are limited to {packet_size} bytes.\n'
+    else:
+        raise error(f'"{command}" needs GDB - the standalone backend only talks to the stub')
+
+    if to_string:
+        return out
+    print(out, end='')
+    return None
+
+
+def parse_and_eval(expression: str) -> Value:
+    """
+    Evaluate an integer literal or a $register
+    :return Value: The value. Unknown registers evaluate to void, like unset convenience variables in GDB
+    """
+    expression = expression.strip()
+    if expression.startswith('$'):
+        try:
+            register = _TARGET.register(expression[1:])
+        except ValueError:
+            return Value(0, TYPE_CODE_VOID, 1)
+        return Value(_TARGET.read_register(register.name), TYPE_CODE_INT, register.size)
+
+    try:
+        return Value(int(expression, 0))
+    except ValueError:
+        raise error(f'No symbol table is loaded - can\'t evaluate "{expression}"') from None
+
+
+def lookup_symbol(name: str, block=None, domain=None):
+    return None, False
+
+
+def string_to_argv(argument: str) -> list:
+    return shlex.split(argument)
+
+
+class Command:
+    """
+    Commands only exist inside GDB - defining one in standalone mode does nothing
+    """
+
+    def __init__(self, name: str, command_class: int, completer_class: int = None, prefix=False):
+        self.name = name
+
+    def dont_repeat(self) -> None:
+        return
+
+
+class Breakpoint:
+    def __init__(self, spec: str, type: int = BP_BREAKPOINT, *args, **kwargs):
+        raise error("Breakpoints need GDB - the standalone backend can't run the target")
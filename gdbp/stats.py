@@ -0,0 +1,256 @@
+import collections
+import functools
+import json
+import threading
+import time
+
+from .backend import gdb
+
+# Bucket i of a latency histogram counts the calls that took less than 2**i microseconds (and at least half that)
+HISTOGRAM_BUCKETS = 32
+# Trace entries kept in memory when tracing without a file
+TRACE_LIMIT = 100000
+# Characters of a packet (or of any other argument) kept in a trace entry
+TRACE_DETAIL_LENGTH = 80
+
+
+class ApiStats:
+    """
+    Calls, bytes and latencies of one instrumented API
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.histogram = [0] * HISTOGRAM_BUCKETS
+
+    def add(self, seconds: float, size: int, failed: bool) -> None:
+        self.calls += 1
+        self.errors += failed
+        self.bytes += size
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.histogram[min(int(seconds * 1e6).bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+        return
+
+    def percentile(self, fraction: float) -> int:
+        """
+        :return int: Upper bound, in microseconds, of the latency ``fraction`` of the calls stayed under
+        """
+        wanted = fraction * self.calls
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= wanted:
+                return 2 ** bucket
+        return 0
+
+    def as_dict(self) -> dict:
+        return {'calls': self.calls, 'errors': self.errors, 'bytes': self.bytes, 'seconds': self.seconds,
+                'max_seconds': self.max_seconds,
+                'histogram': {f'<{2 ** bucket}us': count for bucket, count in enumerate(self.histogram) if count}}
+
+
+class Stats:
+    """
+    Everything recorded since the last ``reset``. Calls from ParallelReader's threads are recorded too, hence the lock
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.tracing = False
+        self.apis = {}
+        self.trace = collections.deque(maxlen=TRACE_LIMIT)
+        self.trace_file = None
+        self.lock = threading.Lock()
+
+    def record(self, api: str, started: float, seconds: float, size: int, failed: bool, detail) -> None:
+        with self.lock:
+            if api not in self.apis:
+                self.apis[api] = ApiStats()
+            self.apis[api].add(seconds, size, failed)
+            if self.tracing:
+                entry = (started, api, detail(), seconds, size, failed)
+                if self.trace_file is not None:
+                    self.trace_file.write(_format_trace_entry(entry) + '\n')
+                else:
+                    self.trace.append(entry)
+        return
+
+
+STATS = Stats()
+
+
+def _describe_argument(argument) -> str:
+    if isinstance(argument, bool):
+        return str(argument)
+    if isinstance(argument, int):
+        return hex(argument)
+    if isinstance(argument, (bytes, bytearray, memoryview)):
+        return f'<{len(argument)} bytes>'
+    return str(argument)[:TRACE_DETAIL_LENGTH]
+
+
+def _format_trace_entry(entry: tuple) -> str:
+    started, api, detail, seconds, size, failed = entry
+    return f"{started:.6f} {api} {detail} {seconds * 1e6:.0f}us {size}B{' FAILED' if failed else ''}"
+
+
+def instrument(api: str, size=None, skip: int = 0):
+    """
+    Record every call of the decorated function under ``api`` while ``STATS.enabled``.
+    Disabled, the wrapper only checks the flag.
+    :param str api: Name the calls are recorded under
+    :param size: (args, result) -> bytes transferred by the call. default = 0.
+    :param int skip: Leading arguments left out of trace entries (1 for ``self``)
+    :return: The decorator
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not STATS.enabled:
+                return function(*args, **kwargs)
+
+            result = None
+            failed = True
+            # time.time() only once per call, and only for the trace
+            started = time.time() if STATS.tracing else 0.0
+            counter = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                seconds = time.perf_counter() - counter
+                STATS.record(api, started, seconds, size(args, result) if size is not None else 0, failed,
+                             lambda: ','.join(_describe_argument(argument) for argument in args[skip:]))
+        return wrapper
+    return decorator
+
+
+def enable(trace=False, trace_path: str = None) -> None:
+    """
+    Start recording every stub interaction
+    :param trace: Also log every call (packets, monitor commands, memory and register accesses, parsing) with a timestamp.
+    default = False.
+    :param str trace_path: Append the trace to this file rather than keeping the last ``TRACE_LIMIT`` entries in memory
+    :return:
+    """
+    with STATS.lock:
+        if STATS.trace_file is not None:
+            STATS.trace_file.close()
+            STATS.trace_file = None
+        if trace_path is not None:
+            trace = True
+            STATS.trace_file = open(trace_path, 'a', buffering=1)
+        STATS.tracing = bool(trace)
+        STATS.enabled = True
+    return
+
+
+def disable() -> None:
+    """
+    Stop recording. What was recorded so far is kept until ``reset``
+    :return:
+    """
+    with STATS.lock:
+        STATS.enabled = False
+        STATS.tracing = False
+        if STATS.trace_file is not None:
+            STATS.trace_file.close()
+            STATS.trace_file = None
+    return
+
+
+def reset() -> None:
+    """
+    Forget everything recorded
+    :return:
+    """
+    with STATS.lock:
+        STATS.apis = {}
+        STATS.trace.clear()
+    return
+
+
+def get_stats() -> dict:
+    """
+    :return dict: api: {'calls', 'errors', 'bytes', 'seconds', 'max_seconds', 'histogram'}
+    """
+    with STATS.lock:
+        return {api: api_stats.as_dict() for api, api_stats in sorted(STATS.apis.items())}
+
+
+def get_trace() -> list:
+    """
+    :return list: (time.time() at the call, api, arguments, seconds, bytes, failed) for the traced calls kept in memory
+    """
+    with STATS.lock:
+        return list(STATS.trace)
+
+
+def to_json(path: str = None) -> str:
+    """
+    :param str path: Also write the JSON to this file
+    :return str: ``get_stats()`` as JSON
+    """
+    out = json.dumps(get_stats(), indent=2)
+    if path is not None:
+        with open(path, 'w') as f:
+            f.write(out)
+    return out
+
+
+def format_table() -> str:
+    """
+    :return str: A line per API - calls, errors, bytes, total time, mean, p50\\p99 (histogram bucket bounds) and max
+    """
+    with STATS.lock:
+        rows = sorted(STATS.apis.items(), key=lambda item: item[1].seconds, reverse=True)
+        lines = [f"{'api':<16}{'calls':>10}{'errors':>8}{'bytes':>14}{'total ms':>12}{'mean us':>10}"
+                 f"{'p50 us':>10}{'p99 us':>10}{'max us':>10}"]
+        for api, api_stats in rows:
+            lines.append(f'{api:<16}{api_stats.calls:>10}{api_stats.errors:>8}{api_stats.bytes:>14}'
+                         f'{api_stats.seconds * 1e3:>12.2f}{api_stats.seconds * 1e6 / api_stats.calls:>10.0f}'
+                         f'{"<" + str(api_stats.percentile(0.5)):>10}{"<" + str(api_stats.percentile(0.99)):>10}'
+                         f'{api_stats.max_seconds * 1e6:>10.0f}')
+    return '\n'.join(lines)
+
+
+class StatsCommand(gdb.Command):
+    """
+    Show what gdbp sent to the stub: calls, bytes and latencies per API.
+    Usage: gdbp-stats [on | off | reset | trace [PATH] | json [PATH]]
+    on\\off: start\\stop recording, trace: record and log every call (to PATH, or in memory), json: print or save as JSON
+    """
+
+    def __init__(self):
+        super(StatsCommand, self).__init__("gdbp-stats", gdb.COMMAND_DATA, gdb.COMPLETE_FILENAME)
+
+    def invoke(self, argument, from_tty):
+        self.dont_repeat()
+        argv = gdb.string_to_argv(argument)
+        action = argv[0] if argv else None
+        path = argv[1] if len(argv) > 1 else None
+        if action is None:
+            print(format_table())
+        elif action == 'on':
+            enable()
+        elif action == 'off':
+            disable()
+        elif action == 'reset':
+            reset()
+        elif action == 'trace':
+            enable(trace=True, trace_path=path)
+        elif action == 'json':
+            out = to_json(path)
+            if path is None:
+                print(out)
+        else:
+            raise gdb.GdbError("Usage: gdbp-stats [on | off | reset | trace [PATH] | json [PATH]]")
+
+
+StatsCommand()
@@ -0,0 +1,315 @@
+import struct
+
+from .rw_memory import SCALAR_FORMATS, read_bytes, read_many
+
+CHAR = 'char'
+
+
+class Pointer:
+    """
+    Type of a pointer field. Reading the field gives a ``LazyPointer``, which reads the pointee on first use
+    """
+
+    def __init__(self, target=None, size: int = 8):
+        """
+        :param target: Pointee type - a ``Struct``, a scalar type name ('u32', ...) or None for void*
+        :param int size: Size of the pointer in bytes (8 or 4)
+        """
+        if size not in (4, 8):
+            raise ValueError(f"Bad pointer size: {size}")
+        self.target = target
+        self.size = size
+
+
+class Field:
+    def __init__(self, name: str, offset: int, type, count: int = None, big=None):
+        """
+        :param str name: Field name
+        :param int offset: Offset from the start of the structure
+        :param type: A scalar type name ('u8', 's32', 'f64', ... - see ``SCALAR_FORMATS``), 'char' for a byte string,
+        a nested ``Struct`` or a ``Pointer``
+        :param int count: Make the field an array of ``count`` elements ('char' fields: the string length)
+        :param big: byte order big-endian. default = the byte order of the structure.
+        """
+        self.name = name
+        self.offset = offset
+        self.type = type
+        self.count = count
+        self.big = big
+
+
+class _Leaf:
+    """
+    One run of values in the flattened layout - a scalar, scalar array, pointer or string
+    """
+
+    def __init__(self, offset, piece, values, size, big, slot):
+        self.offset = offset
+        self.piece = piece
+        self.values = values
+        self.size = size
+        self.big = big
+        self.slot = slot
+
+
+class Struct:
+    """
+    A structure layout, compiled into a single ``struct.Struct``, so that a whole object is read with one
+    ``read_bytes`` and decoded with one ``unpack_from``.
+    Overlapping fields (unions) and fields of the other byte order are decoded from the same buffer.
+    """
+
+    def __init__(self, name: str, fields, size: int = None, big=False):
+        """
+        :param str name: Name of the structure
+        :param fields: ``Field`` objects or (name, offset, type[, count[, big]]) tuples
+        :param int size: Size of the structure. default = the end of the last field.
+        :param big: byte order big-endian. default = False.
+        """
+        self.name = name
+        self.big = big
+        self.fields = {}
+        self.leaves = []
+        self.slot_count = 0
+
+        for field in fields:
+            if not isinstance(field, Field):
+                field = Field(*field)
+            if field.name in self.fields:
+                raise ValueError(f"{name}: duplicate field {field.name}")
+            self.fields[field.name] = (field, self.slot_count)
+            self._add_leaves(field)
+
+        self._compile(size)
+
+    def _add_leaves(self, field: Field) -> None:
+        big = self.big if field.big is None else field.big
+        field_type = field.type
+
+        if isinstance(field_type, Struct):
+            for index in range(field.count or 1):
+                base = field.offset + index * field_type.size
+                for leaf in field_type.leaves:
+                    self.leaves.append(_Leaf(base + leaf.offset, leaf.piece, leaf.values, leaf.size, leaf.big,
+                                             self.slot_count + leaf.slot))
+                self.slot_count += field_type.slot_count
+            return
+
+        if field_type == CHAR:
+            length = field.count or 1
+            self.leaves.append(_Leaf(field.offset, f'{length}s', 1, length, big, self.slot_count))
+            self.slot_count += 1
+            return
+
+        if isinstance(field_type, Pointer):
+            code = 'Q' if field_type.size == 8 else 'L'
+        elif field_type in SCALAR_FORMATS:
+            code = SCALAR_FORMATS[field_type]
+        else:
+            raise ValueError(f"{self.name}.{field.name}: unknown type {field_type!r}")
+
+        count = field.count or 1
+        piece = f'{count}{code}' if count > 1 else code
+        self.leaves.append(_Leaf(field.offset, piece, count, struct.calcsize('<' + piece), big, self.slot_count))
+        self.slot_count += count
+
+    def _compile(self, size) -> None:
+        main_leaves = []
+        self.extras = []
+        cursor = 0
+        end = 0
+        pieces = ['>' if self.big else '<']
+        for leaf in sorted(self.leaves, key=lambda item: item.offset):
+            end = max(end, leaf.offset + leaf.size)
+            if leaf.offset < cursor or leaf.big != self.big:
+                self.extras.append((struct.Struct(('>' if leaf.big else '<') + leaf.piece), leaf))
+                continue
+            if leaf.offset > cursor:
+                pieces.append(f'{leaf.offset - cursor}x')
+            pieces.append(leaf.piece)
+            cursor = leaf.offset + leaf.size
+            main_leaves.append(leaf)
+
+        self.size = end if size is None else size
+        if self.size < end:
+            raise ValueError(f"{self.name}: fields end at {hex(end)}, after the size {hex(self.size)}")
+        self.struct = struct.Struct(''.join(pieces))
+
+        # Slot of every unpacked value - main values first, then every extra in turn
+        self.slot_order = []
+        for leaf in main_leaves + [leaf for _, leaf in self.extras]:
+            self.slot_order.extend(range(leaf.slot, leaf.slot + leaf.values))
+        self.identity_order = self.slot_order == list(range(self.slot_count))
+
+    def unpack(self, data, address: int = 0, offset: int = 0):
+        """
+        :param data: Buffer holding the structure
+        :param int address: Target address of the structure, used for pointer fields and ``_address``
+        :param int offset: Offset of the structure inside ``data``
+        :return StructValue: The decoded structure
+        """
+        values = self.struct.unpack_from(data, offset)
+        for extra_struct, leaf in self.extras:
+            values += extra_struct.unpack_from(data, offset + leaf.offset)
+
+        if not self.identity_order:
+            ordered = [None] * self.slot_count
+            for slot, value in zip(self.slot_order, values):
+                ordered[slot] = value
+            values = ordered
+
+        return StructValue(self, address, values, 0)
+
+    def read(self, address: int):
+        """
+        :param int address: Address of the structure
+        :return StructValue: The structure, read with a single ``read_bytes``
+        """
+        return self.unpack(read_bytes(address, self.size), address)
+
+    def read_many(self, addresses) -> list:
+        """
+        :param addresses: Addresses of structures of this type
+        :return list: The structures, read with as few round-trips as ``read_many`` can manage
+        """
+        addresses = list(addresses)
+        buffers = read_many([(address, self.size) for address in addresses])
+        return [self.unpack(data, address) for address, data in zip(addresses, buffers)]
+
+    def offsetof(self, name: str) -> int:
+        """
+        :param str name: Field name
+        :return int: Offset of the field
+        """
+        return self.fields[name][0].offset
+
+    def __repr__(self):
+        return f'<Struct {self.name} size={hex(self.size)}>'
+
+
+class StructValue:
+    """
+    A decoded structure. Fields are attributes; gdbp's own attributes start with an underscore, like namedtuple's
+    """
+
+    __slots__ = ('_struct', '_address', '_values', '_base', '_pointers')
+
+    def __init__(self, struct_type: Struct, address: int, values, base: int):
+        self._struct = struct_type
+        self._address = address
+        self._values = values
+        self._base = base
+        # Pointer fields keep their LazyPointer, so the pointee is read only once
+        self._pointers = {}
+
+    def __getattr__(self, name):
+        try:
+            field, slot = self._struct.fields[name]
+        except KeyError:
+            raise AttributeError(f"{self._struct.name} has no field {name}") from None
+
+        slot += self._base
+        field_type = field.type
+        count = field.count or 1
+        address = self._address + field.offset
+
+        if isinstance(field_type, Struct):
+            elements = [StructValue(field_type, address + index * field_type.size, self._values,
+                                    slot + index * field_type.slot_count) for index in range(count)]
+            return elements[0] if field.count is None else tuple(elements)
+
+        if field_type == CHAR:
+            return self._values[slot]
+
+        if isinstance(field_type, Pointer):
+            pointers = self._pointers.get(name)
+            if pointers is None:
+                big = self._struct.big if field.big is None else field.big
+                pointers = [LazyPointer(self._values[slot + index], field_type.target, big) for index in range(count)]
+                pointers = self._pointers[name] = pointers[0] if field.count is None else tuple(pointers)
+            return pointers
+
+        if field.count is None:
+            return self._values[slot]
+        return tuple(self._values[slot:slot + count])
+
+    def _field_address(self, name: str) -> int:
+        """
+        :return int: Target address of field ``name``
+        """
+        return self._address + self._struct.offsetof(name)
+
+    def _asdict(self) -> dict:
+        """
+        :return dict: Every field, with nested structures as dicts and pointers as ints
+        """
+        result = {}
+        for name in self._struct.fields:
+            value = getattr(self, name)
+            if isinstance(value, StructValue):
+                value = value._asdict()
+            elif isinstance(value, LazyPointer):
+                value = int(value)
+            elif isinstance(value, tuple) and value and isinstance(value[0], (StructValue, LazyPointer)):
+                value = tuple(item._asdict() if isinstance(item, StructValue) else int(item) for item in value)
+            result[name] = value
+        return result
+
+    def __repr__(self):
+        return f'<{self._struct.name} at {hex(self._address)}>'
+
+
+class LazyPointer:
+    """
+    Value of a pointer field. Acts as an int (the address); the pointee is read on the first ``deref()`` or attribute
+    access and then kept
+    """
+
+    __slots__ = ('address', 'target', 'big', '_pointee')
+
+    def __init__(self, address: int, target, big=False):
+        """
+        :param int address: The pointer's value
+        :param target: Pointee type, as in ``Pointer``
+        :param big: byte order of a scalar pointee big-endian (a ``Struct`` pointee has its own). default = False.
+        """
+        self.address = address
+        self.target = target
+        self.big = big
+        self._pointee = None
+
+    def deref(self):
+        """
+        :return: The pointee - a ``StructValue`` or an int, according to the pointer's target type
+        """
+        if self._pointee is None:
+            if not self.address:
+                raise ValueError("NULL pointer dereference")
+            if isinstance(self.target, Struct):
+                self._pointee = self.target.read(self.address)
+            elif self.target in SCALAR_FORMATS:
+                scalar = struct.Struct(('>' if self.big else '<') + SCALAR_FORMATS[self.target])
+                self._pointee = scalar.unpack(read_bytes(self.address, scalar.size))[0]
+            else:
+                raise TypeError("Can't dereference a void pointer")
+        return self._pointee
+
+    def __getattr__(self, name):
+        return getattr(self.deref(), name)
+
+    def __int__(self):
+        return self.address
+
+    __index__ = __int__
+
+    def __bool__(self):
+        return self.address != 0
+
+    def __eq__(self, other):
+        return int(self) == int(other) if isinstance(other, (int, LazyPointer)) else NotImplemented
+
+    def __hash__(self):
+        return hash(self.address)
+
+    def __repr__(self):
+        return f'<pointer {hex(self.address)}>'
@@ -13,7 +13,8 @@ setup(name='gdbp',
       version='0.1.0',
       packages=find_packages(),
       extras_require={
-        'test': ['pytest']
+        'test': ['pytest'],
+        'numpy': ['numpy']
       },
       classifiers=[
         'Programming Language :: Python :: 3',
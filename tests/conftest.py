@@ -1,11 +1,98 @@
-import gdb
+import os
+import struct
+import sys
+
 import pytest
 
-from common import TEST_PROGRAM_MAIN_FUNCTION, TEST_PROGRAM_SOURCE_FILE, TEST_PROGRAM_LABEL_NAME
+from common import (TEST_PROGRAM_MAIN_FUNCTION, TEST_PROGRAM_SOURCE_FILE, TEST_PROGRAM_LABEL_NAME, TEST_VARIABLE_NAME,
+                    TEST_VARIABLE_ADDRESS, TEST_VARIABLE_BYTES, TEST_REGISTER_ORIGINAL_VALUE)
+
+# So that ``cd tests && python -m pytest`` finds gdbp without installing it
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Without GDB the tests run against tests/fake_gdb.py - a simulated VMware (or QEMU) target.
+# With GDBP_BACKEND=rsp only the standalone tests (against tests/fake_stub.py) run
+FAKE_TARGET_ENV = 'GDBP_FAKE_TARGET'
+FAKE_LATENCY_ENV = 'GDBP_FAKE_LATENCY'
+
+STANDALONE_TESTS = ('test_standalone.py', 'test_parallel.py', 'test_aio.py')
+# Run their checks at import time, against VMware only (GDTR\IDTR\LDTR)
+VMWARE_ONLY_TESTS = ('test_gdbp.py',)
+
+# Where the fake test program lives - virtual address: physical address
+FAKE_CODE = (0x401000, 0x200000)
+FAKE_DATA = (TEST_VARIABLE_ADDRESS, 0x300000)
+FAKE_STACK = (0x7FFFFFFDE000, 0x400000)
+FAKE_GDT = (0xFFFFFE0000001000, 0x500000)
+FAKE_IDT = (0xFFFFFE0000000000, 0x501000)
+FAKE_KERNEL_TEXT = 0xFFFFFFFF81000000
+
+FAKE_GDT_ENTRIES = (0, 0x00AF9B000000FFFF, 0x00CF93000000FFFF, 0x00CFFB000000FFFF, 0x00CFF3000000FFFF,
+                    0x00AFFB000000FFFF)
+
+
+def _interrupt_gate(handler: int) -> bytes:
+    low = ((handler & 0xFFFF) | (0x10 << 16) | (0x8E << 40) | (((handler >> 16) & 0xFFFF) << 48))
+    return struct.pack('<QQ', low, handler >> 32)
+
+
+def load_test_program(target) -> None:
+    """
+    Set the fake target up like tests/test_program stopped at its label, on a long-mode guest
+    :return:
+    """
+    main = FAKE_CODE[0] + 0x126
+    target.symbols.update({TEST_PROGRAM_MAIN_FUNCTION: main, TEST_PROGRAM_LABEL_NAME: main + 0x13,
+                           'set_test_register_value': FAKE_CODE[0] + 0x106, TEST_VARIABLE_NAME: TEST_VARIABLE_ADDRESS})
+
+    target.map_virtual(*FAKE_CODE, data=b'\xC3' * 0x200)
+    target.map_virtual(*FAKE_DATA, data=TEST_VARIABLE_BYTES)
+    target.map_virtual(*FAKE_STACK)
+    target.map_virtual(*FAKE_GDT, data=struct.pack(f'<{len(FAKE_GDT_ENTRIES)}Q', *FAKE_GDT_ENTRIES))
+    target.map_virtual(*FAKE_IDT, data=b''.join(_interrupt_gate(FAKE_KERNEL_TEXT + vector * 0x10)
+                                                for vector in range(256)))
+
+    target.registers.update(rdx=TEST_REGISTER_ORIGINAL_VALUE, rip=main + 0x13, rsp=FAKE_STACK[0] + 0xF00,
+                            rbp=FAKE_STACK[0] + 0xF10, eflags=0x246, cs=0x33, ss=0x2B, fs_base=0x7FFFF7D8A740)
+    target.registers['cr0'] |= 0x80050033
+    target.registers['cr4'] |= 0x3506F0
+    target.registers['efer'] |= 0xD01
+    target.system['gdtr'] = (FAKE_GDT[0], len(FAKE_GDT_ENTRIES) * 8 - 1)
+    target.system['idtr'] = (FAKE_IDT[0], 256 * 16 - 1)
+    return
+
+
+try:
+    import gdb
+except ImportError:
+    gdb = None
+    if os.environ.get('GDBP_BACKEND') != 'rsp':
+        import fake_gdb
+        from fake_target import VMWARE, FakeTarget
+
+        fake_gdb.install(FakeTarget(os.environ.get(FAKE_TARGET_ENV, VMWARE),
+                                    float(os.environ.get(FAKE_LATENCY_ENV, 0))))
+        fake_gdb.TARGET.program = load_test_program
+        fake_gdb.execute('run')
+        gdb = fake_gdb
+
+
+def pytest_ignore_collect(collection_path, config):
+    if collection_path.suffix != '.py' or not collection_path.name.startswith('test_'):
+        return None
+    if gdb is None:
+        return collection_path.name not in STANDALONE_TESTS
+    if getattr(gdb, 'TARGET', None) is not None and not gdb.TARGET.vmware:
+        return collection_path.name in VMWARE_ONLY_TESTS or None
+    return None
 
 
 @pytest.fixture(autouse=True)
 def break_on_label_and_start_program():
+    if gdb is None:
+        yield
+        return
+
     gdb.execute('break {}:{}:{}'.format(
         TEST_PROGRAM_SOURCE_FILE, TEST_PROGRAM_MAIN_FUNCTION, TEST_PROGRAM_LABEL_NAME))
     gdb.execute('r')
@@ -0,0 +1,666 @@
+"""
+A stand-in for GDB's ``gdb`` module, connected in process to a ``FakeTarget``, so that gdbp and its tests run on
+a machine without GDB or a VM. Install it with ``install()`` before gdbp is imported.
+Traffic is modeled on GDB's: memory goes in 'm'\\'M' packets of the stub's packet size, the core registers come
+in one 'g' packet per stop, the others in 'p' packets - and every packet costs the target's latency.
+"""
+import binascii
+import re
+import shlex
+import sys
+
+from fake_target import CORE_REGISTERS, PACKET_SIZE, FakeTarget
+
+TYPE_CODE_PTR = 1
+TYPE_CODE_VOID = 2
+TYPE_CODE_INT = 8
+TYPE_CODE_FLAGS = 5
+TYPE_CODE_FUNC = 7
+
+BP_BREAKPOINT = 1
+BP_HARDWARE_BREAKPOINT = 2
+BP_WATCHPOINT = 6
+
+COMMAND_DATA = 1
+COMMAND_USER = 13
+COMPLETE_FILENAME = 1
+
+# Used when the test program "runs" - see conftest
+TARGET = FakeTarget()
+
+_SET_REGISTER_PATTERN = re.compile(r'set \$(\w+)\s*=\s*(.+)')
+_DPRINTF_PATTERN = re.compile(r'dprintf ([^,]+),(.+)', re.DOTALL)
+_PRINTF_PATTERN = re.compile(r'printf\s*"((?:[^"\\]|\\.)*)"\s*(?:,(.*))?')
+# C length modifiers Python's % doesn't know
+_FORMAT_LENGTH_PATTERN = re.compile(r'%([#0-9.-]*)(?:ll|l|h|hh|z)([diouxX])')
+
+# "set logging" - while enabled, the output of commands run without to_string goes to the file
+_LOGGING = {'file': 'gdb.txt', 'overwrite': False, 'redirect': False, 'enabled': False}
+
+# name: (parent, bit offset, width, signed). GDB's amd64 pseudo registers
+_PSEUDO_REGISTERS = {'pc': ('rip', 0, 64, False)}
+for _full, _dword, _word, _low, _high in (('rax', 'eax', 'ax', 'al', 'ah'), ('rbx', 'ebx', 'bx', 'bl', 'bh'),
+                                          ('rcx', 'ecx', 'cx', 'cl', 'ch'), ('rdx', 'edx', 'dx', 'dl', 'dh'),
+                                          ('rsi', 'esi', 'si', 'sil', None), ('rdi', 'edi', 'di', 'dil', None),
+                                          ('rbp', 'ebp', 'bp', 'bpl', None), ('rsp', 'esp', 'sp', 'spl', None)):
+    _PSEUDO_REGISTERS.update({_dword: (_full, 0, 32, True), _word: (_full, 0, 16, True), _low: (_full, 0, 8, True)})
+    if _high:
+        _PSEUDO_REGISTERS[_high] = (_full, 8, 8, True)
+for _index in range(8, 16):
+    _PSEUDO_REGISTERS.update({f'r{_index}d': (f'r{_index}', 0, 32, True), f'r{_index}w': (f'r{_index}', 0, 16, True),
+                              f'r{_index}l': (f'r{_index}', 0, 8, True)})
+# Registers GDB types as signed integers
+_SIGNED_REGISTERS = set(CORE_REGISTERS[:16]) | {'fs_base', 'gs_base'}
+
+
+class error(RuntimeError):
+    pass
+
+
+class MemoryError(error):
+    pass
+
+
+class GdbError(Exception):
+    pass
+
+
+class _EventRegistry:
+    def __init__(self):
+        self.handlers = []
+
+    def connect(self, handler) -> None:
+        self.handlers.append(handler)
+        return
+
+    def disconnect(self, handler) -> None:
+        self.handlers.remove(handler)
+        return
+
+    def fire(self, event=None) -> None:
+        for handler in list(self.handlers):
+            handler(event)
+        return
+
+
+class _Events:
+    def __init__(self):
+        for name in ('stop', 'cont', 'exited', 'memory_changed', 'register_changed', 'new_objfile',
+                     'clear_objfiles', 'free_objfile', 'breakpoint_created', 'breakpoint_modified', 'breakpoint_deleted'):
+            setattr(self, name, _EventRegistry())
+
+
+events = _Events()
+
+
+class StopEvent:
+    pass
+
+
+class BreakpointEvent(StopEvent):
+    def __init__(self, breakpoints: list):
+        self.breakpoints = breakpoints
+        self.breakpoint = breakpoints[0]
+
+
+class Type:
+    def __init__(self, code: int, sizeof: int):
+        self.code = code
+        self.sizeof = sizeof
+
+
+class Value(int):
+    def __new__(cls, value: int, code: int = TYPE_CODE_INT, sizeof: int = 8, address=None):
+        obj = super(Value, cls).__new__(cls, value)
+        obj.type = Type(code, sizeof)
+        obj.address = address
+        return obj
+
+
+def _signed(value: int, bits: int) -> int:
+    return value - (1 << bits) if value >> (bits - 1) & 1 else value
+
+
+class _Connection:
+    """
+    GDB's side of the remote connection: its register cache and the packets it sends
+    """
+
+    def __init__(self):
+        self.generation = 0
+        self.registers = {}
+        # Console output ('O' packets) of the last packet
+        self.output = ''
+
+    def invalidate(self) -> None:
+        self.generation += 1
+        self.registers = {}
+        return
+
+    def send(self, packet: str) -> str:
+        replies = TARGET.exchange(packet)
+        output = [reply for reply in replies[:-1] if reply.startswith('O')]
+        self.output = ''.join(binascii.unhexlify(reply[1:]).decode('latin-1') for reply in output)
+        return replies[-1]
+
+    def register_number(self, name: str) -> int:
+        names = TARGET.register_names()
+        if name not in names:
+            raise ValueError("Bad register")
+        return names.index(name)
+
+    def read_register(self, name: str) -> int:
+        number = self.register_number(name)
+        if name not in self.registers:
+            if name in CORE_REGISTERS:
+                block = bytes.fromhex(self.send('g'))
+                offset = 0
+                for core_name in CORE_REGISTERS:
+                    size = TARGET.register_size(core_name)
+                    self.registers[core_name] = int.from_bytes(block[offset:offset + size], 'little')
+                    offset += size
+            else:
+                reply = self.send(f'p{number:x}')
+                if reply.startswith('E'):
+                    raise error(f"Could not fetch register \"{name}\"; remote failure reply '{reply}'")
+                self.registers[name] = int.from_bytes(bytes.fromhex(reply), 'little')
+        return self.registers[name]
+
+    def write_register(self, name: str, value: int) -> None:
+        number = self.register_number(name)
+        size = TARGET.register_size(name)
+        value &= (1 << (size * 8)) - 1
+        reply = self.send(f'P{number:x}={value.to_bytes(size, "little").hex()}')
+        if reply != 'OK':
+            raise error(f"Could not write register \"{name}\"; remote failure reply '{reply}'")
+        self.registers[name] = value
+        return
+
+    def max_memory_payload(self) -> int:
+        return (PACKET_SIZE - 32) // 2
+
+
+_CONNECTION = _Connection()
+
+
+def _register_value(name: str) -> Value:
+    """
+    :return Value: The register, typed like GDB types it. Raises ValueError for unknown registers
+    """
+    if name in _PSEUDO_REGISTERS:
+        parent, offset, width, signed = _PSEUDO_REGISTERS[name]
+        value = (_CONNECTION.read_register(parent) >> offset) & ((1 << width) - 1)
+        if name == 'pc':
+            return Value(value, TYPE_CODE_PTR, 8)
+    else:
+        value = _CONNECTION.read_register(name)
+        width = TARGET.register_size(name) * 8
+        signed = name in _SIGNED_REGISTERS
+    return Value(_signed(value, width) if signed else value, TYPE_CODE_INT, width // 8)
+
+
+def _write_register(name: str, value: int) -> None:
+    if name in _PSEUDO_REGISTERS:
+        parent, offset, width, _ = _PSEUDO_REGISTERS[name]
+        mask = ((1 << width) - 1) << offset
+        value = (_CONNECTION.read_register(parent) & ~mask) | ((value << offset) & mask)
+        name = parent
+    _CONNECTION.write_register(name, value)
+    return
+
+
+class Architecture:
+    def name(self) -> str:
+        return 'i386:x86-64'
+
+
+class Frame:
+    def __init__(self):
+        self.generation = _CONNECTION.generation
+
+    def is_valid(self) -> bool:
+        return self.generation == _CONNECTION.generation
+
+    def read_register(self, name: str) -> Value:
+        return _register_value(name)
+
+    def pc(self) -> int:
+        return _CONNECTION.read_register('rip')
+
+    def name(self):
+        pc = self.pc()
+        return next((name for name, address in TARGET.symbols.items() if address == pc), None)
+
+    def architecture(self) -> Architecture:
+        return Architecture()
+
+    def __eq__(self, other):
+        return isinstance(other, Frame) and other.generation == self.generation
+
+    def __hash__(self):
+        return self.generation
+
+
+def selected_frame() -> Frame:
+    return Frame()
+
+
+def newest_frame() -> Frame:
+    return Frame()
+
+
+class InferiorThread:
+    num = 1
+    global_num = 1
+    ptid = (1, 1, 0)
+
+    def is_valid(self) -> bool:
+        return True
+
+
+def selected_thread() -> InferiorThread:
+    return InferiorThread()
+
+
+class Inferior:
+    num = 1
+    pid = 1
+
+    def read_memory(self, address: int, length: int) -> memoryview:
+        chunks = []
+        for chunk in range(address, address + length, _CONNECTION.max_memory_payload()):
+            chunk_length = min(_CONNECTION.max_memory_payload(), address + length - chunk)
+            reply = _CONNECTION.send(f'm{chunk:x},{chunk_length:x}')
+            if reply.startswith('E') or not reply:
+                raise MemoryError(f"Cannot access memory at address {hex(chunk)}")
+            chunks.append(binascii.unhexlify(reply))
+        return memoryview(b''.join(chunks))
+
+    def write_memory(self, address: int, buffer, length: int = None) -> None:
+        data = bytes(buffer)
+        if length is not None:
+            data = data[:length]
+        for offset in range(0, len(data), _CONNECTION.max_memory_payload()):
+            chunk = data[offset:offset + _CONNECTION.max_memory_payload()]
+            reply = _CONNECTION.send(f'M{address + offset:x},{len(chunk):x}:{chunk.hex()}')
+            if reply != 'OK':
+                raise MemoryError(f"Cannot access memory at address {hex(address + offset)}")
+        events.memory_changed.fire()
+        return
+
+    def threads(self) -> tuple:
+        return (InferiorThread(),)
+
+
+def selected_inferior() -> Inferior:
+    return Inferior()
+
+
+def inferiors() -> tuple:
+    return (Inferior(),)
+
+
+class Objfile:
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._valid = True
+
+    def is_valid(self) -> bool:
+        return self._valid
+
+
+class Symtab:
+    def __init__(self, objfile: Objfile):
+        self.objfile = objfile
+
+
+class NewObjFileEvent:
+    def __init__(self, new_objfile: Objfile):
+        self.new_objfile = new_objfile
+
+
+class FreeObjFileEvent:
+    def __init__(self, objfile: Objfile):
+        self.objfile = objfile
+
+
+PROGRAM_OBJFILE = Objfile('test_program')
+# Symbol name: the objfile defining it - the program, unless load_objfile() says otherwise
+_SYMBOL_OBJFILES = {}
+
+
+def load_objfile(filename: str, symbols: dict) -> Objfile:
+    """
+    Like GDB loading a shared library or a kernel module's symbols: they become visible, then new_objfile fires
+    :param dict symbols: Address by name
+    :return Objfile: The new objfile
+    """
+    objfile = Objfile(filename)
+    for name, address in symbols.items():
+        TARGET.symbols[name] = address
+        _SYMBOL_OBJFILES[name] = objfile
+    events.new_objfile.fire(NewObjFileEvent(objfile))
+    return objfile
+
+
+def unload_objfile(objfile: Objfile) -> None:
+    """
+    Drop the symbols of a ``load_objfile`` objfile, firing free_objfile
+    :return:
+    """
+    events.free_objfile.fire(FreeObjFileEvent(objfile))
+    objfile._valid = False
+    for name in [name for name, owner in _SYMBOL_OBJFILES.items() if owner is objfile]:
+        del _SYMBOL_OBJFILES[name]
+        del TARGET.symbols[name]
+    return
+
+
+class Symbol:
+    def __init__(self, name: str, address: int):
+        self.name = name
+        self.address = address
+        self.symtab = Symtab(_SYMBOL_OBJFILES.get(name, PROGRAM_OBJFILE))
+
+    def value(self, frame=None) -> Value:
+        return Value(0, TYPE_CODE_INT, 8, address=Value(self.address, TYPE_CODE_PTR, 8))
+
+
+def lookup_symbol(name: str, block=None, domain=None) -> tuple:
+    address = TARGET.symbols.get(name)
+    return (Symbol(name, address) if address is not None else None), False
+
+
+def lookup_global_symbol(name: str, domain=None):
+    return lookup_symbol(name)[0]
+
+
+def parse_and_eval(expression: str) -> Value:
+    """
+    Evaluate an integer literal, a $register or &symbol
+    :return Value: The value. Unknown $names are void, like unset convenience variables
+    """
+    expression = expression.strip()
+    if expression.startswith('$'):
+        try:
+            return _register_value(expression[1:])
+        except ValueError:
+            return Value(0, TYPE_CODE_VOID, 1)
+    if expression.startswith('&'):
+        address = TARGET.symbols.get(expression[1:].strip())
+        if address is None:
+            raise error(f'No symbol "{expression[1:].strip()}" in current context.')
+        return Value(address, TYPE_CODE_PTR, 8)
+    try:
+        return Value(int(expression, 0))
+    except ValueError:
+        raise error(f'No symbol "{expression}" in current context.') from None
+
+
+class Breakpoint:
+    _next_number = 1
+    _all = []
+
+    def __init__(self, spec: str, type: int = BP_BREAKPOINT, wp_class=None, internal=False, temporary=False):
+        self.address = _resolve_location(spec)
+        self.location = spec
+        self.type = type
+        self.number = Breakpoint._next_number
+        Breakpoint._next_number += 1
+        self.enabled = True
+        self.silent = False
+        self.thread = None
+        self.task = None
+        self.ignore_count = 0
+        self.hit_count = 0
+        self.condition = None
+        self.commands = None
+        self.temporary = temporary
+        self.visible = not internal
+        self.pending = False
+        self._valid = True
+        Breakpoint._all.append(self)
+        events.breakpoint_created.fire(self)
+
+    def is_valid(self) -> bool:
+        return self._valid
+
+    def delete(self) -> None:
+        if not self._valid:
+            raise RuntimeError("Breakpoint is invalid.")
+        self._valid = False
+        Breakpoint._all.remove(self)
+        events.breakpoint_deleted.fire(self)
+        return
+
+
+def breakpoints() -> tuple:
+    return tuple(Breakpoint._all)
+
+
+def _resolve_location(spec: str) -> int:
+    spec = spec.strip()
+    if spec.startswith('*'):
+        return int(parse_and_eval(spec[1:]))
+    # file:function:label, function or label
+    name = spec.split(':')[-1]
+    if name not in TARGET.symbols:
+        raise error(f'Function "{name}" not defined.')
+    return TARGET.symbols[name]
+
+
+class Command:
+    _all = {}
+
+    def __init__(self, name: str, command_class: int, completer_class: int = None, prefix=False):
+        self.name = name
+        Command._all[name] = self
+
+    def dont_repeat(self) -> None:
+        return
+
+    def invoke(self, argument: str, from_tty: bool) -> None:
+        raise error(f'Command "{self.name}" has no invoke')
+
+
+def string_to_argv(argument: str) -> list:
+    return shlex.split(argument)
+
+
+def post_event(event) -> None:
+    # GDB runs it later from its event loop; there is no loop here
+    event()
+    return
+
+
+def _run() -> None:
+    """
+    "run": start the program again - reset the target, then stop at the first enabled breakpoint on its pc
+    """
+    _CONNECTION.invalidate()
+    TARGET.reset()
+    events.cont.fire()
+    pc = TARGET.registers['rip']
+    hit = [bp for bp in Breakpoint._all if bp.enabled and bp.address == pc]
+    for bp in hit:
+        bp.hit_count += 1
+    events.stop.fire(BreakpointEvent(hit) if hit else StopEvent())
+    return
+
+
+def _step() -> None:
+    """
+    "stepi": the target runs and stops again; nothing in it changes, but every cache is stale
+    """
+    _CONNECTION.invalidate()
+    events.cont.fire()
+    events.stop.fire(StopEvent())
+    return
+
+
+def _printf(line: str) -> str:
+    """
+    :return str: The output of a "printf" command of $registers
+    """
+    match = _PRINTF_PATTERN.match(line)
+    if not match:
+        raise error(f'Bad format string: {line}')
+    line_format = _FORMAT_LENGTH_PATTERN.sub(r'%\1\2', match.group(1)).replace('\\n', '\n')
+    arguments = [argument.strip() for argument in (match.group(2) or '').split(',') if argument.strip()]
+    return line_format % tuple(int(parse_and_eval(argument)) & 0xFFFFFFFFFFFFFFFF for argument in arguments)
+
+
+def _hit(bp: Breakpoint) -> tuple:
+    """
+    Run the command list of a breakpoint that was hit
+    :return tuple: The output, and whether the commands resume the target
+    """
+    out = ''
+    for line in (bp.commands or '').splitlines():
+        line = line.strip()
+        if line.startswith('printf'):
+            out += _printf(line)
+        elif line in ('continue', 'c'):
+            return out, True
+    return out, False
+
+
+def _continue() -> str:
+    """
+    "continue": the target goes through ``TARGET.execution`` and stops at the first enabled breakpoint it passes that
+    isn't ignored and doesn't resume by itself (a dprintf), or at the end
+    :return str: What the breakpoints' commands printed
+    """
+    events.cont.fire()
+    out = ''
+    hit = []
+    while TARGET.execution and not hit:
+        TARGET.registers.update(TARGET.execution.pop(0))
+        _CONNECTION.invalidate()
+        for bp in list(Breakpoint._all):
+            if not bp.enabled or bp.address != TARGET.registers['rip']:
+                continue
+            bp.hit_count += 1
+            if bp.ignore_count:
+                bp.ignore_count -= 1
+                continue
+            printed, resumes = _hit(bp)
+            out += printed
+            if not resumes:
+                hit.append(bp)
+    _CONNECTION.invalidate()
+    events.stop.fire(BreakpointEvent(hit) if hit else StopEvent())
+    return out
+
+
+def _set_logging(words: list) -> None:
+    if words[:1] == ['file']:
+        _LOGGING['file'] = ' '.join(words[1:])
+    elif words[:1] in (['overwrite'], ['redirect']):
+        _LOGGING[words[0]] = words[1:] != ['off']
+    elif words in (['on'], ['enabled', 'on']):
+        if _LOGGING['overwrite']:
+            open(_LOGGING['file'], 'w').close()
+        _LOGGING['enabled'] = True
+    elif words in (['off'], ['enabled', 'off']):
+        _LOGGING['enabled'] = False
+    return
+
+
+def _breakpoint_numbers(argument: str) -> list:
+    numbers = [int(number) for number in argument.split() if number != 'breakpoints']
+    return [bp for bp in Breakpoint._all if not numbers or bp.number in numbers]
+
+
+def _info_registers(argument: str) -> str:
+    names = argument.split() or TARGET.register_names()
+    lines = []
+    for name in names:
+        try:
+            value = _register_value(name)
+        except ValueError:
+            raise error(f'Invalid register `{name}\'') from None
+        lines.append(f'{name:<15}{hex(int(value) & ((1 << (value.type.sizeof * 8)) - 1)):<19}{int(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def execute(command: str, from_tty=False, to_string=False):
+    """
+    Run the GDB commands gdbp and its tests use
+    :return str: The output, if ``to_string``
+    """
+    command = command.strip()
+    word, _, argument = command.partition(' ')
+    out = ''
+    if word == 'monitor':
+        _CONNECTION.send('qRcmd,' + binascii.hexlify(argument.encode()).decode())
+        out = _CONNECTION.output
+    elif command.startswith('maint packet '):
+        packet = command[len('maint packet '):]
+        reply = _CONNECTION.send(packet)
+        escaped = reply.replace('\\', '\\\\').replace('"', '\\"')
+        out = f'sending: "{packet}"\nreceived: "{escaped}"\n'
+    elif _SET_REGISTER_PATTERN.match(command):
+        match = _SET_REGISTER_PATTERN.match(command)
+        _write_register(match.group(1), int(parse_and_eval(match.group(2))))
+        events.register_changed.fire()
+    elif command.startswith('show remote memory-read-packet-size'):
+        out = f'The memory-read-packet-size is 0. Packets are limited to {PACKET_SIZE - 1} bytes.\n'
+    elif word == 'set' and argument.split()[:1] == ['logging']:
+        _set_logging(argument.split()[1:])
+    elif word in ('set', 'show') and argument.split()[:1] in (['logging'], ['pagination'], ['confirm'], ['width'],
+                                                              ['height']):
+        pass
+    elif word in ('break', 'b'):
+        Breakpoint(argument)
+    elif word == 'hbreak':
+        Breakpoint(argument, BP_HARDWARE_BREAKPOINT)
+    elif word == 'dprintf':
+        match = _DPRINTF_PATTERN.match(command)
+        if not match:
+            raise error('Format string required')
+        bp = Breakpoint(match.group(1))
+        bp.commands = f'printf {match.group(2).strip()}\ncontinue'
+    elif word in ('run', 'r'):
+        _run()
+    elif word in ('continue', 'c'):
+        out = _continue()
+    elif word in ('stepi', 'si'):
+        _step()
+    elif word in ('delete', 'd'):
+        for bp in _breakpoint_numbers(argument):
+            bp.delete()
+    elif word in ('enable', 'disable'):
+        for bp in _breakpoint_numbers(argument):
+            bp.enabled = word == 'enable'
+    elif word in ('info', 'i') and argument.split()[:1] in (['registers'], ['r']):
+        out = _info_registers(argument.partition(' ')[2])
+    elif command in ('flushregs', 'maint flush register-cache'):
+        _CONNECTION.invalidate()
+    elif word in Command._all:
+        Command._all[word].invoke(argument, from_tty)
+    else:
+        raise error(f'Undefined command: "{word}".  Try "help".')
+
+    # Like GDB, to_string captures the output before logging sees it
+    if to_string:
+        return out
+    if _LOGGING['enabled'] and out:
+        with open(_LOGGING['file'], 'a') as log_file:
+            log_file.write(out)
+    if not (_LOGGING['enabled'] and _LOGGING['redirect']):
+        print(out, end='')
+    return None
+
+
+def install(target: FakeTarget = None) -> None:
+    """
+    Make ``import gdb`` load this module
+    :param FakeTarget target: The target to connect to. default = the module's own TARGET.
+    :return:
+    """
+    global TARGET
+    if target is not None:
+        TARGET = target
+    sys.modules['gdb'] = sys.modules[__name__]
+    return
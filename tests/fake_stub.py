@@ -0,0 +1,85 @@
+import socket
+import threading
+
+from fake_target import QEMU, FakeTarget
+
+
+class FakeStub:
+    """
+    A gdbstub on a local TCP socket, serving a ``FakeTarget``: memory, registers, target description, qRcmd and qCRC.
+    Every connection is served by its own thread; they all share the same target.
+    """
+
+    def __init__(self, latency: float = 0, target: FakeTarget = None, personality: str = QEMU):
+        """
+        :param float latency: Seconds the stub takes to answer each packet (when ``target`` isn't given)
+        :param FakeTarget target: The guest to serve. default = a new, empty one.
+        :param str personality: QEMU or VMWARE, for a new target
+        """
+        self.target = target if target is not None else FakeTarget(personality, latency)
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(16)
+        self.address = self.server.getsockname()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    @property
+    def pages(self) -> dict:
+        return self.target.pages
+
+    @property
+    def registers(self) -> dict:
+        return self.target.registers
+
+    @property
+    def phys(self) -> bool:
+        return self.target.phys
+
+    @property
+    def packets(self) -> list:
+        return self.target.packets
+
+    def map(self, address: int, data: bytes) -> None:
+        self.target.map(address, data)
+        return
+
+    def read(self, address: int, length: int):
+        return self.target.read(address, length)
+
+    def close(self) -> None:
+        self.server.close()
+        return
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                connection, _ = self.server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _serve(self, connection) -> None:
+        buffer = b''
+        ack = True
+        while True:
+            try:
+                data = connection.recv(0x10000)
+            except OSError:
+                return
+            if not data:
+                return
+            buffer += data
+            while True:
+                buffer = buffer.lstrip(b'+-')
+                end = buffer.find(b'#')
+                if not buffer.startswith(b'$') or end < 0 or len(buffer) < end + 3:
+                    break
+                packet = buffer[1:end].decode('latin-1')
+                buffer = buffer[end + 3:]
+                if ack:
+                    connection.sendall(b'+')
+                for reply in self.target.exchange(packet):
+                    payload = reply.encode('latin-1')
+                    connection.sendall(b'$' + payload + b'#' + b'%02x' % (sum(payload) & 0xFF))
+                if packet == 'QStartNoAckMode':
+                    ack = False
@@ -0,0 +1,377 @@
+import binascii
+import struct
+import threading
+import time
+
+PAGE_SIZE = 0x1000
+PAGE_MASK = ~(PAGE_SIZE - 1)
+ENTRY_ADDRESS_MASK = 0x000FFFFFFFFFF000
+PTE_PRESENT = 0x1
+PTE_WRITABLE = 0x2
+
+CR0_PE = 1 << 0
+CR0_PG = 1 << 31
+CR4_PAE = 1 << 5
+EFER_LME = 1 << 8
+EFER_LMA = 1 << 10
+
+# Physical pages for the page tables built by map_virtual - away from anything the tests map
+PAGE_TABLES_BASE = 0x7F000000
+
+PACKET_SIZE = 0x4000
+
+VMWARE = 'vmware'
+QEMU = 'qemu'
+
+# Exactly what general.VMWARE_MONITOR_OUT expects
+VMWARE_MONITOR_HELP = ('Supported monitor commands:\n   help\n   r\n   phys\n   virt\nPlease use "monitor help '
+                       '<command>" to get details.\n')
+QEMU_MONITOR_HELP = ('help|? [cmd] -- show the help for all commands or just for [cmd]\n'
+                     'info [subcommand] -- show various information about the system state\n'
+                     'xp /fmt addr -- physical memory dump starting at \'addr\'\n')
+
+TARGET_XML = '''<?xml version="1.0"?>
+<!DOCTYPE target SYSTEM "gdb-target.dtd">
+<target version="1.0">
+  <architecture>i386:x86-64</architecture>
+{includes}</target>
+'''
+
+CORE_REGISTERS = (['rax', 'rbx', 'rcx', 'rdx', 'rsi', 'rdi', 'rbp', 'rsp'] + [f'r{index}' for index in range(8, 16)] +
+                  ['rip', 'eflags', 'cs', 'ss', 'ds', 'es', 'fs', 'gs'])
+SEGMENT_BASE_REGISTERS = ['fs_base', 'gs_base']
+# QEMU only - VMware serves these through "monitor r"
+SYS_REGISTERS = ['cr0', 'cr2', 'cr3', 'cr4', 'efer']
+REGISTERS_32BIT = ('eflags', 'cs', 'ss', 'ds', 'es', 'fs', 'gs')
+
+SYSTEM_TABLE_REGISTERS = ('gdtr', 'idtr')
+LDTR_FIELDS = ('sel', 'base', 'limit', 'type', 's', 'dpl', 'p')
+
+
+def gdb_crc32(data: bytes) -> int:
+    crc = 0xFFFFFFFF
+    for byte in data:
+        crc ^= byte << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04c11db7 if crc & 0x80000000 else crc << 1) & 0xFFFFFFFF
+    return crc
+
+
+def _feature(name: str, registers: list, first: int) -> str:
+    regs = ''.join(f'<reg name="{register}" bitsize="{32 if register in REGISTERS_32BIT else 64}"'
+                   f' regnum="{first + index}"/>' for index, register in enumerate(registers))
+    return f'<?xml version="1.0"?><feature name="{name}">{regs}</feature>'
+
+
+class FakeTarget:
+    """
+    An in-memory x86-64 guest behind a QEMU- or VMware-like gdbstub: sparse physical memory, optional 4-level
+    paging, a register file, the descriptor-table registers and the monitor commands of each stub.
+    ``exchange`` answers one remote-protocol packet, after ``latency`` seconds, and counts the traffic - both
+    ``FakeStub`` (over TCP) and ``fake_gdb`` (in process) go through it.
+    """
+
+    def __init__(self, personality: str = QEMU, latency: float = 0):
+        if personality not in (QEMU, VMWARE):
+            raise ValueError(f"Bad personality: {personality}")
+        self.personality = personality
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.packets = []
+        self.record = True
+        self.symbols = {}
+        # Called by reset() to set the guest up again, e.g. by "run" in fake_gdb
+        self.program = None
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Forget the memory, registers and traffic counters, then load ``program`` (if any)
+        :return:
+        """
+        self.pages = {}
+        self.registers = {name: 0 for name in CORE_REGISTERS + SEGMENT_BASE_REGISTERS + SYS_REGISTERS}
+        self.system = {'gdtr': (0, 0xFFFF), 'idtr': (0, 0xFFF),
+                       'ldtr': dict.fromkeys(LDTR_FIELDS, 0)}
+        self.phys = False
+        self.next_table = PAGE_TABLES_BASE
+        # Registers the stub can't read - sent as 'xx' bytes
+        self.unavailable = set()
+        # What the guest does when resumed - register updates, each with the 'rip' it passes through
+        self.execution = []
+        self.reset_counters()
+        if self.program is not None:
+            self.program(self)
+        return
+
+    def reset_counters(self) -> None:
+        self.round_trips = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.packets.clear()
+        return
+
+    @property
+    def vmware(self) -> bool:
+        return self.personality == VMWARE
+
+    # Memory
+
+    def map(self, address: int, data: bytes) -> None:
+        """
+        Write ``data`` to physical memory, creating the pages it touches
+        :return:
+        """
+        offset = 0
+        while offset < len(data):
+            current = address + offset
+            page = self.pages.setdefault(current & PAGE_MASK, bytearray(PAGE_SIZE))
+            piece = data[offset:offset + PAGE_SIZE - (current & (PAGE_SIZE - 1))]
+            page[current & (PAGE_SIZE - 1):(current & (PAGE_SIZE - 1)) + len(piece)] = piece
+            offset += len(piece)
+        return
+
+    def _read_physical(self, address: int, length: int):
+        data = bytearray()
+        while length > 0:
+            page = self.pages.get(address & PAGE_MASK)
+            if page is None:
+                return None
+            offset = address & (PAGE_SIZE - 1)
+            piece = page[offset:offset + length]
+            data += piece
+            address += len(piece)
+            length -= len(piece)
+        return bytes(data)
+
+    def paging(self) -> bool:
+        return bool(self.registers['cr0'] & CR0_PG)
+
+    def translate(self, vaddr: int):
+        """
+        Walk the 4-level page tables in physical memory, like the MMU would
+        :return int: The physical address of ``vaddr``, or None if it isn't mapped
+        """
+        table = self.registers['cr3'] & ENTRY_ADDRESS_MASK
+        for shift in (39, 30, 21, 12):
+            raw = self._read_physical(table + ((vaddr >> shift) & 0x1FF) * 8, 8)
+            if raw is None:
+                return None
+            entry = struct.unpack('<Q', raw)[0]
+            if not entry & PTE_PRESENT:
+                return None
+            table = entry & ENTRY_ADDRESS_MASK
+        return table | (vaddr & (PAGE_SIZE - 1))
+
+    def _physical_ranges(self, address: int, length: int, phys):
+        """
+        :return list: (physical address, length) pieces of the range, or None if part of it isn't mapped
+        """
+        if phys is None:
+            phys = self.phys
+        if phys or not self.paging():
+            return [(address, length)]
+
+        ranges = []
+        while length > 0:
+            piece = min(length, PAGE_SIZE - (address & (PAGE_SIZE - 1)))
+            physical = self.translate(address)
+            if physical is None:
+                return None
+            ranges.append((physical, piece))
+            address += piece
+            length -= piece
+        return ranges
+
+    def read(self, address: int, length: int, phys=None):
+        """
+        :param phys: read physical memory. default = the stub's current mode.
+        :return bytes: The memory, or None if part of it isn't mapped
+        """
+        ranges = self._physical_ranges(address, length, phys)
+        if ranges is None:
+            return None
+        pieces = [self._read_physical(start, piece_length) for start, piece_length in ranges]
+        if any(piece is None for piece in pieces):
+            return None
+        return b''.join(pieces)
+
+    def write(self, address: int, data: bytes, phys=None) -> bool:
+        """
+        :return bool: Whether the whole range is mapped (nothing is written otherwise)
+        """
+        ranges = self._physical_ranges(address, len(data), phys)
+        if ranges is None or any(self._read_physical(start, length) is None for start, length in ranges):
+            return False
+        offset = 0
+        for start, length in ranges:
+            self.map(start, data[offset:offset + length])
+            offset += length
+        return True
+
+    def _allocate_table(self) -> int:
+        table = self.next_table
+        self.next_table += PAGE_SIZE
+        self.pages[table] = bytearray(PAGE_SIZE)
+        return table
+
+    def map_virtual(self, vaddr: int, paddr: int, length: int = PAGE_SIZE, data: bytes = None) -> None:
+        """
+        Map [vaddr, vaddr + length) to ``paddr`` with 4 KiB pages, and turn long-mode paging on.
+        The physical pages are created (zeroed, or holding ``data``) if they don't exist yet
+        :return:
+        """
+        if not self.registers['cr3']:
+            self.registers['cr3'] = self._allocate_table()
+        self.registers['cr0'] |= CR0_PE | CR0_PG
+        self.registers['cr4'] |= CR4_PAE
+        self.registers['efer'] |= EFER_LME | EFER_LMA
+
+        for offset in range(0, length, PAGE_SIZE):
+            page_vaddr = (vaddr + offset) & PAGE_MASK
+            page_paddr = (paddr + offset) & PAGE_MASK
+            self.pages.setdefault(page_paddr, bytearray(PAGE_SIZE))
+            table = self.registers['cr3'] & ENTRY_ADDRESS_MASK
+            for shift in (39, 30, 21):
+                entry_address = table + ((page_vaddr >> shift) & 0x1FF) * 8
+                entry = struct.unpack('<Q', self._read_physical(entry_address, 8))[0]
+                if not entry & PTE_PRESENT:
+                    entry = self._allocate_table() | PTE_PRESENT | PTE_WRITABLE
+                    self.map(entry_address, struct.pack('<Q', entry))
+                table = entry & ENTRY_ADDRESS_MASK
+            self.map(table + ((page_vaddr >> 12) & 0x1FF) * 8,
+                     struct.pack('<Q', page_paddr | PTE_PRESENT | PTE_WRITABLE))
+
+        if data is not None:
+            self.write(vaddr, data, phys=False)
+        return
+
+    # Registers
+
+    def register_names(self) -> list:
+        """
+        :return list: The registers in target-description order - their index is the register number
+        """
+        names = CORE_REGISTERS + SEGMENT_BASE_REGISTERS
+        if not self.vmware:
+            names = names + SYS_REGISTERS
+        return names
+
+    @staticmethod
+    def register_size(name: str) -> int:
+        return 4 if name in REGISTERS_32BIT else 8
+
+    def _register_bytes(self, name: str) -> bytes:
+        size = self.register_size(name)
+        return (self.registers[name] & ((1 << (size * 8)) - 1)).to_bytes(size, 'little')
+
+    def _register_hex(self, name: str) -> str:
+        if name in self.unavailable:
+            return 'xx' * self.register_size(name)
+        return self._register_bytes(name).hex()
+
+    def _description(self) -> dict:
+        includes = ['64bit-core.xml', '64bit-segments.xml'] + ([] if self.vmware else ['64bit-sys.xml'])
+        files = {
+            'target.xml': TARGET_XML.format(includes=''.join(f'  <xi:include href="{name}"/>\n' for name in includes)),
+            '64bit-core.xml': _feature('org.gnu.gdb.i386.core', CORE_REGISTERS, 0),
+            '64bit-segments.xml': _feature('org.gnu.gdb.i386.segments', SEGMENT_BASE_REGISTERS, len(CORE_REGISTERS)),
+        }
+        if not self.vmware:
+            files['64bit-sys.xml'] = _feature('org.gnu.gdb.i386.sys', SYS_REGISTERS,
+                                              len(CORE_REGISTERS) + len(SEGMENT_BASE_REGISTERS))
+        return files
+
+    # Monitor
+
+    def _monitor_register(self, name: str) -> str:
+        if name in SYSTEM_TABLE_REGISTERS:
+            base, limit = self.system[name]
+            return f'{name} base=0x{base:x} limit=0x{limit:x}\n'
+        if name == 'ldtr':
+            return 'ldtr ' + ' '.join(f'{field} 0x{self.system["ldtr"][field]:x}' for field in LDTR_FIELDS) + '\n'
+        return f'{name}=0x{self.registers[name]:x}\n'
+
+    def monitor(self, command: str) -> str:
+        """
+        :return str: What the stub's monitor prints for ``command``
+        """
+        words = command.split()
+        if not self.vmware:
+            if words and words[0] in ('help', '?'):
+                return QEMU_MONITOR_HELP
+            return f"unknown command: '{command}'\n"
+
+        if words == ['help']:
+            return VMWARE_MONITOR_HELP
+        if words == ['phys'] or words == ['virt']:
+            self.phys = words[0] == 'phys'
+            return ''
+        if words == ['r']:
+            return ''.join(self._monitor_register(name) for name in SYS_REGISTERS + ['gdtr', 'idtr', 'ldtr'])
+        if len(words) == 2 and words[0] == 'r' and words[1] in SYS_REGISTERS + ['gdtr', 'idtr', 'ldtr']:
+            return self._monitor_register(words[1])
+        return f'Unrecognized command: {command}\n'
+
+    # Remote protocol
+
+    def exchange(self, packet: str) -> list:
+        """
+        Answer one packet, after ``latency`` seconds
+        :return list: The reply packets - several for monitor output
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            replies = self.handle(packet)
+            self.round_trips += 1
+            self.bytes_sent += len(packet)
+            self.bytes_received += sum(len(reply) for reply in replies)
+            if self.record:
+                self.packets.append(packet)
+        return replies
+
+    def handle(self, packet: str) -> list:
+        names = self.register_names()
+        if packet.startswith('qSupported'):
+            return [f'PacketSize={PACKET_SIZE:x};qXfer:features:read+;QStartNoAckMode+']
+        if packet == 'QStartNoAckMode':
+            return ['OK']
+        if packet.startswith('qXfer:features:read:'):
+            annex, span = packet[len('qXfer:features:read:'):].split(':')
+            offset, length = (int(value, 16) for value in span.split(','))
+            content = self._description().get(annex)
+            if content is None:
+                return ['E00']
+            chunk = content[offset:offset + length]
+            return [('l' if offset + length >= len(content) else 'm') + chunk]
+        if packet.startswith('m'):
+            address, length = (int(value, 16) for value in packet[1:].split(','))
+            data = self.read(address, length)
+            return ['E14' if data is None else binascii.hexlify(data).decode()]
+        if packet.startswith('M'):
+            header, data = packet[1:].split(':')
+            address, length = (int(value, 16) for value in header.split(','))
+            return ['OK' if self.write(address, binascii.unhexlify(data)[:length]) else 'E14']
+        if packet == 'g':
+            return [''.join(self._register_hex(name) for name in CORE_REGISTERS)]
+        if packet.startswith('p'):
+            number = int(packet[1:], 16)
+            return [self._register_hex(names[number]) if number < len(names) else 'E00']
+        if packet.startswith('P'):
+            number, value = packet[1:].split('=')
+            if int(number, 16) >= len(names):
+                return ['E00']
+            self.registers[names[int(number, 16)]] = int.from_bytes(bytes.fromhex(value), 'little')
+            return ['OK']
+        if packet.startswith('qCRC:'):
+            address, length = (int(value, 16) for value in packet[5:].split(','))
+            data = self.read(address, length)
+            return ['E01' if data is None else f'C{gdb_crc32(data):08x}']
+        if packet.startswith('Qqemu.PhyMemMode:') and not self.vmware:
+            self.phys = packet.endswith('1')
+            return ['OK']
+        if packet.startswith('qRcmd,'):
+            output = self.monitor(binascii.unhexlify(packet[6:]).decode()).encode()
+            return (['O' + output.hex()] if output else []) + ['OK']
+        return ['']
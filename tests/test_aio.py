@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+from gdbp import aio
+from gdbp.rsp import GdbpRspError
+from fake_stub import FakeStub
+from fake_target import VMWARE, FakeTarget
+
+TEST_ADDRESS = 0x10000
+TEST_BYTES = bytes(range(256)) * 32
+
+
+def test_aio_two_stubs():
+    stubs = [FakeStub(latency=0.001), FakeStub(latency=0.001)]
+    for index, stub in enumerate(stubs):
+        stub.map(TEST_ADDRESS, TEST_BYTES)
+        stub.registers.update(rax=index + 1, cr3=0x1000 * (index + 1))
+
+    async def read_target(stub):
+        channel = await aio.connect(stub.address)
+        try:
+            data = await aio.read_bytes(channel, TEST_ADDRESS, len(TEST_BYTES))
+            many = await aio.read_many(channel, [(TEST_ADDRESS + 0x10, '<H'), (TEST_ADDRESS + 0x2000, 4),
+                                                 (TEST_ADDRESS, 2)], skip_errors=True)
+            registers = await aio.get_registers(channel)
+            cr3 = await aio.get_register(channel, 'cr3')
+            return data, many, registers['rax'], cr3
+        finally:
+            await channel.close()
+
+    async def read_all():
+        return await asyncio.gather(*(read_target(stub) for stub in stubs))
+
+    try:
+        for index, (data, many, rax, cr3) in enumerate(asyncio.run(read_all())):
+            assert data == TEST_BYTES
+            assert many == [0x1110, None, b'\x00\x01']
+            assert rax == index + 1
+            assert cr3 == 0x1000 * (index + 1)
+    finally:
+        for stub in stubs:
+            stub.close()
+
+
+def test_aio_connection_lost():
+    stub = FakeStub()
+
+    async def send_after_eof():
+        channel = await aio.connect(stub.address)
+        try:
+            # The stub hangs up: the receiver stops, and later packets fail instead of waiting forever
+            channel.reader.feed_eof()
+            await asyncio.wait_for(channel.receiver, 1)
+            with pytest.raises(GdbpRspError):
+                await asyncio.wait_for(channel.send('g'), 1)
+        finally:
+            await channel.close()
+
+    try:
+        asyncio.run(send_after_eof())
+    finally:
+        stub.close()
+
+
+def test_aio_phys_mode_vmware():
+    stub = FakeStub(personality=VMWARE)
+
+    async def switch():
+        channel = await aio.connect(stub.address)
+        try:
+            await channel.set_phys_mode(True)
+            assert channel.vmware and stub.phys
+            await channel.set_phys_mode(False)
+            assert not stub.phys
+        finally:
+            await channel.close()
+
+        channel = await aio.connect(stub.address, vmware=False)
+        try:
+            # VMware ignores the QEMU packet - that must not pass silently
+            with pytest.raises(GdbpRspError):
+                await channel.set_phys_mode(True)
+        finally:
+            await channel.close()
+
+    try:
+        asyncio.run(switch())
+    finally:
+        stub.close()
+
+
+class _FailingTarget(FakeTarget):
+    def handle(self, packet: str) -> list:
+        return ['E01'] if packet == 'g' else super(_FailingTarget, self).handle(packet)
+
+
+def test_aio_register_errors():
+    stub = FakeStub()
+    stub.target.unavailable.add('rbx')
+    failing_stub = FakeStub(target=_FailingTarget())
+
+    async def read():
+        channel = await aio.connect(stub.address)
+        try:
+            registers = await aio.get_registers(channel)
+            assert 'rbx' not in registers and 'rax' in registers
+            with pytest.raises(GdbpRspError):
+                await aio.get_register(channel, 'rbx')
+        finally:
+            await channel.close()
+
+        channel = await aio.connect(failing_stub.address)
+        try:
+            with pytest.raises(GdbpRspError):
+                await aio.get_registers(channel)
+        finally:
+            await channel.close()
+
+    try:
+        asyncio.run(read())
+    finally:
+        stub.close()
+        failing_stub.close()
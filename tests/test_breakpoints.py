@@ -0,0 +1,119 @@
+import gdb
+import pytest
+
+import gdbp
+from common import TEST_PROGRAM_MAIN_FUNCTION
+
+
+def test_hw_breakpoint_slots():
+    main_address = gdbp.get_symbol_address(TEST_PROGRAM_MAIN_FUNCTION)
+    manager = gdbp.HwBreakpointManager(slots=2)
+    try:
+        first, second = manager.add_many([main_address, main_address + 1])
+        with pytest.raises(gdbp.GdbpNoFreeHwSlot):
+            manager.add(main_address + 2)
+
+        manager.disable([main_address])
+        assert not first.bp.enabled
+        third = manager.add(main_address + 2)
+        assert third.active and third.bp.enabled
+        assert manager.lookup(main_address + 1) is second
+    finally:
+        manager.clear()
+
+
+def test_hw_breakpoint_rotation():
+    main_address = gdbp.get_symbol_address(TEST_PROGRAM_MAIN_FUNCTION)
+    manager = gdbp.HwBreakpointManager(slots=2, multiplex=True)
+    try:
+        entries = manager.add_many(main_address + offset for offset in range(3))
+        assert [entry.active for entry in entries] == [True, True, False]
+
+        manager.rotate()
+        assert [entry.active for entry in entries] == [False, True, True]
+        assert [entry.bp.enabled for entry in entries] == [False, True, True]
+    finally:
+        manager.clear()
+
+
+def test_hw_breakpoint_manager_close():
+    main_address = gdbp.get_symbol_address(TEST_PROGRAM_MAIN_FUNCTION)
+    with gdbp.HwBreakpointManager(slots=1, multiplex=True) as manager:
+        entries = manager.add_many([main_address, main_address + 1])
+    assert not any(entry.bp.is_valid() for entry in entries)
+    # No longer rotating on stops
+    assert not manager.multiplex and len(manager) == 0
+
+
+def test_hw_bp_takes_a_manager_slot():
+    main_address = gdbp.get_symbol_address(TEST_PROGRAM_MAIN_FUNCTION)
+    manager = gdbp.HwBreakpointManager(slots=2)
+    bp = gdbp.hw_bp(main_address)
+    try:
+        assert gdbp.HW_BREAKPOINTS.lookup(main_address).bp is bp
+        assert manager.free_slots() == 1
+        manager.add(main_address + 1)
+        with pytest.raises(gdbp.GdbpNoFreeHwSlot):
+            manager.add(main_address + 2)
+
+        gdbp.disable_bp(bp)
+        assert manager.free_slots() == 1
+    finally:
+        gdbp.delete_bp(bp)
+        manager.clear()
+    assert gdbp.HW_BREAKPOINTS.lookup(main_address) is None
+
+
+def test_hw_bp_deleted_by_gdb():
+    main_address = gdbp.get_symbol_address(TEST_PROGRAM_MAIN_FUNCTION)
+    # More cycles than slots - each deletion must give its slot back
+    for _ in range(gdbp.HW_BREAKPOINT_SLOTS + 1):
+        bp = gdbp.hw_bp(main_address)
+        assert bp.is_valid()
+        gdb.execute('delete breakpoints')
+        assert gdbp.HW_BREAKPOINTS.lookup(main_address) is None
+
+    manager = gdbp.HwBreakpointManager(slots=1, multiplex=True)
+    try:
+        first, second = manager.add_many([main_address, main_address + 1])
+        first.bp.delete()
+        assert len(manager) == 1 and not second.active
+        # The waiting breakpoint takes the slot on the next stop
+        manager.rotate()
+        assert second.active and second.bp.enabled
+    finally:
+        manager.close()
+
+
+def test_trace_hits():
+    main_address = gdbp.get_symbol_address(TEST_PROGRAM_MAIN_FUNCTION)
+    tracer = gdbp.trace_hits([main_address])
+    try:
+        assert tracer.bps[0].ignore_count == gdbp.IGNORE_FOREVER
+        assert tracer.counts() == {main_address: 0}
+    finally:
+        tracer.stop()
+    assert not tracer.bps[0].is_valid()
+    assert tracer.counts() == {main_address: 0}
+
+
+@pytest.mark.skipif(not hasattr(gdb, 'TARGET'), reason="Runs the program through the fake gdb")
+@pytest.mark.parametrize('hardware', [False, True])
+def test_trace_hits_samples(tmp_path, hardware):
+    main_address = gdbp.get_symbol_address(TEST_PROGRAM_MAIN_FUNCTION)
+    other_address = main_address + 0x10
+    gdb.TARGET.execution = [{'rip': main_address, 'rdi': iteration} for iteration in range(3)] + \
+                           [{'rip': other_address, 'rdi': 0x1234}]
+    counter = gdbp.trace_hits([main_address, other_address])
+    sampler = gdbp.trace_hits([main_address, other_address], registers=('rdi', 'rip'), hardware=hardware,
+                              log_path=str(tmp_path / 'trace.log'))
+    try:
+        gdb.execute('continue')
+        assert counter.counts() == {main_address: 3, other_address: 1}
+        assert sampler.collect() == 4
+        assert list(sampler.samples[main_address]) == [0, main_address, 1, main_address, 2, main_address]
+        assert list(sampler.samples[other_address]) == [0x1234, other_address]
+    finally:
+        counter.stop()
+        sampler.stop()
+    assert sampler.counts() == {main_address: 3, other_address: 1}
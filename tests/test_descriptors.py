@@ -0,0 +1,69 @@
+import struct
+
+import pytest
+
+import gdbp
+from common import TEST_VARIABLE_ADDRESS
+
+KERNEL_CODE = 0x00AF9B000000FFFF
+KERNEL_DATA = 0x00CF93000000FFFF
+USER_CODE_32 = 0x00CFFB000000FFFF
+
+
+def _tss(base: int, limit: int) -> bytes:
+    low = ((limit & 0xFFFF) | ((base & 0xFFFFFF) << 16) | (0x89 << 40) | (((limit >> 16) & 0xF) << 48)
+           | (((base >> 24) & 0xFF) << 56))
+    return struct.pack('<QQ', low, base >> 32)
+
+
+def _interrupt_gate(offset: int, selector: int = 0x10, ist: int = 0) -> bytes:
+    low = ((offset & 0xFFFF) | (selector << 16) | (ist << 32) | (0x8E << 40) | (((offset >> 16) & 0xFFFF) << 48))
+    return struct.pack('<QQ', low, offset >> 32)
+
+
+def test_decode_gdt():
+    data = struct.pack('<4Q', 0, KERNEL_CODE, KERNEL_DATA, USER_CODE_32) + _tss(0xFFFFF80012345000, 0x67)
+    gdt = gdbp.DescriptorTable(gdbp.GDT, 0x1000, len(data) - 1, data, long_mode=True)
+    assert len(gdt) == 6
+    assert not gdt[0].present
+
+    assert gdt[1].present and gdt[1].s and gdt[1].dpl == 0 and gdt[1].flags & gdbp.FLAG_L
+    assert gdt[2].base == 0 and gdt[2].limit == 0xFFFFFFFF
+    assert gdt[3].dpl == 3 and gdt[3].flags & gdbp.FLAG_DB
+    assert (gdt[4].type, gdt[4].s, gdt[4].base, gdt[4].limit) == (gdbp.TYPE_TSS_AVAILABLE, 0, 0xFFFFF80012345000, 0x67)
+
+
+def test_decode_idt():
+    handlers = [0xFFFFF80000001000 + vector * 0x10 for vector in range(32)]
+    handlers[14] = 0x4141414141
+    data = b''.join(_interrupt_gate(handler, ist=1 if vector == 2 else 0) for vector, handler in enumerate(handlers))
+    idt = gdbp.DescriptorTable(gdbp.IDT, 0x2000, len(data) - 1, data, long_mode=True)
+    assert len(idt) == 32
+    assert [entry.offset for entry in idt] == handlers
+    assert idt[2].ist == 1 and idt[2].selector == 0x10 and idt[2].type == 0xE
+    assert idt.handlers_outside(0xFFFFF80000000000, 0xFFFFF80000100000) == [(14, 0x4141414141)]
+
+
+def test_read_descriptor_table():
+    gdbp.write_bytes(TEST_VARIABLE_ADDRESS, struct.pack('<Q', KERNEL_CODE))
+    gdt = gdbp.read_descriptor_table(TEST_VARIABLE_ADDRESS, 7, gdbp.GDT, long_mode=True)
+    assert gdt[0].flags & gdbp.FLAG_L
+    assert gdbp.read_descriptor_table(TEST_VARIABLE_ADDRESS, 7, gdbp.GDT, long_mode=True) is gdt
+
+
+def test_resolve_selector():
+    gdbp.write_bytes(TEST_VARIABLE_ADDRESS, struct.pack('<3Q', 0, KERNEL_CODE, USER_CODE_32))
+    gdtr = (TEST_VARIABLE_ADDRESS, 3 * 8 - 1)
+    with pytest.raises(ValueError):
+        gdbp.resolve_selector(0x3, gdtr, long_mode=True)
+
+    user_code = gdbp.resolve_selector(0x13, gdtr, long_mode=True)
+    assert (user_code.index, user_code.dpl, user_code.limit) == (2, 3, 0xFFFFFFFF)
+    hits = gdbp.DESCRIPTOR_CACHE.hits
+    assert gdbp.resolve_selector(0x10, gdtr, long_mode=True) is user_code
+    assert gdbp.DESCRIPTOR_CACHE.hits == hits + 1
+
+
+def test_segment_to_linear():
+    assert gdbp.segment_to_linear('ds', 0x1234, long_mode=True) == 0x1234
+    assert gdbp.segment_to_linear('fs', 0x28, long_mode=True) == gdbp.read_register('fs_base') + 0x28
@@ -0,0 +1,31 @@
+import json
+
+import gdbp
+from common import TEST_VARIABLE_ADDRESS, TEST_VARIABLE_BYTES
+
+
+def test_dump_memory(tmp_path):
+    path = str(tmp_path / 'dump.bin')
+    result = gdbp.dump_memory(TEST_VARIABLE_ADDRESS, TEST_VARIABLE_ADDRESS + len(TEST_VARIABLE_BYTES), path)
+
+    with open(path, 'rb') as dump_file:
+        assert dump_file.read() == TEST_VARIABLE_BYTES
+    assert result['unreadable'] == []
+    assert result['done'] == TEST_VARIABLE_ADDRESS + len(TEST_VARIABLE_BYTES)
+
+
+def test_dump_memory_resume(tmp_path):
+    path = str(tmp_path / 'dump.bin')
+    end = TEST_VARIABLE_ADDRESS + len(TEST_VARIABLE_BYTES)
+    gdbp.dump_memory(TEST_VARIABLE_ADDRESS, end, path)
+
+    with open(path + gdbp.MAP_SUFFIX) as map_file:
+        dump_map = json.load(map_file)
+    dump_map['done'] = TEST_VARIABLE_ADDRESS
+    with open(path + gdbp.MAP_SUFFIX, 'w') as map_file:
+        json.dump(dump_map, map_file)
+
+    result = gdbp.dump_memory(TEST_VARIABLE_ADDRESS, end, path, resume=True)
+    assert result['read'] == len(TEST_VARIABLE_BYTES)
+    with open(path, 'rb') as dump_file:
+        assert dump_file.read() == TEST_VARIABLE_BYTES
@@ -194,6 +194,37 @@ def test_other_registers():
           f"p {hex(ldtr_info['p'])}\n")
 
 
+def test_system_register_snapshot():
+    cr3 = gdbp.get_cr3()
+    cr4 = gdbp.get_cr4()
+    gdbp.SYSTEM_REGISTERS.refresh()
+    assert gdbp.get_cr3() == cr3
+    assert gdbp.get_cr4() == cr4
+    print(f"test_system_register_snapshot: cr3: {hex(cr3)}, cr4: {hex(cr4)}\n")
+
+
+def test_translate():
+    rip = gdbp.get_rip()
+    paddr = gdbp.translate(rip)
+    virtual_bytes = gdbp.read_bytes(rip, 16)
+
+    physical_bytes = gdbp.read_phys(paddr, 16)
+
+    assert virtual_bytes == physical_bytes
+    assert gdbp.translate(rip) == paddr
+    print(f"test_translate: rip: {hex(rip)} -> {hex(paddr)}\n")
+
+
+def test_phys_mode():
+    with gdbp.phys_mode():
+        assert gdbp.GDBP_OBJ.phys
+        with gdbp.phys_mode():
+            assert gdbp.GDBP_OBJ.phys
+        assert gdbp.GDBP_OBJ.phys
+    assert not gdbp.GDBP_OBJ.phys
+    print("test_phys_mode: OK\n")
+
+
 def test_write_read_registers():
     try:
         print("test_write_read_registers():")
@@ -422,4 +453,7 @@ test_general_purpose_registers()
 test_segment_registers()
 test_control_registers()
 test_other_registers()
+test_system_register_snapshot()
+test_translate()
+test_phys_mode()
 test_write_read_registers()
@@ -1,6 +1,66 @@
+import gdb
+import pytest
+
 import gdbp
 from common import TEST_VARIABLE_NAME, TEST_VARIABLE_ADDRESS
 
+TEST_SYMBOL_MAP = '''ffffffff81000000 T _text
+ffffffff81001000 t gdbp_test_mapped_symbol
+ffffffffc0001000 t gdbp_test_module_symbol\t[gdbp_test]
+'''
+
 
 def test_get_symbol_address():
     assert gdbp.get_symbol_address(TEST_VARIABLE_NAME) == TEST_VARIABLE_ADDRESS
+
+
+def test_symbol_cache():
+    gdbp.clear_symbol_cache()
+    gdbp.get_symbol_address(TEST_VARIABLE_NAME)
+    hits = gdbp.SYMBOL_CACHE.hits
+    assert gdbp.get_symbol_address(TEST_VARIABLE_NAME) == TEST_VARIABLE_ADDRESS
+    assert gdbp.SYMBOL_CACHE.hits == hits + 1
+
+
+@pytest.mark.skipif(not hasattr(gdb, 'load_objfile'), reason="Loads object files through the fake gdb")
+def test_symbol_cache_per_objfile():
+    gdbp.clear_symbol_cache()
+    gdbp.get_symbol_address(TEST_VARIABLE_NAME)
+
+    # A new module only drops what it may change - not the program's symbols
+    module = gdb.load_objfile('gdbp_test.ko', {'gdbp_test_module_function': 0xffffffffc0001000})
+    try:
+        assert TEST_VARIABLE_NAME in gdbp.SYMBOL_CACHE.addresses
+        assert gdbp.get_symbol_address('gdbp_test_module_function') == 0xffffffffc0001000
+    finally:
+        gdb.unload_objfile(module)
+    assert 'gdbp_test_module_function' not in gdbp.SYMBOL_CACHE.addresses
+
+    # Loaded again, then reloaded at another address without an unload in between
+    module = gdb.load_objfile('gdbp_test.ko', {'gdbp_test_module_function': 0xffffffffc0001000})
+    reloaded = None
+    try:
+        assert gdbp.get_symbol_address('gdbp_test_module_function') == 0xffffffffc0001000
+        reloaded = gdb.load_objfile('gdbp_test.ko', {'gdbp_test_module_function': 0xffffffffc0005000})
+        assert gdbp.get_symbol_address('gdbp_test_module_function') == 0xffffffffc0005000
+        assert TEST_VARIABLE_NAME in gdbp.SYMBOL_CACHE.addresses
+    finally:
+        if reloaded is not None:
+            gdb.unload_objfile(reloaded)
+        gdb.unload_objfile(module)
+
+
+def test_resolve_symbols():
+    assert gdbp.resolve_symbols([TEST_VARIABLE_NAME, TEST_VARIABLE_NAME]) == {TEST_VARIABLE_NAME: TEST_VARIABLE_ADDRESS}
+    assert gdbp.resolve_symbols(['gdbp_no_such_symbol'], skip_errors=True) == {'gdbp_no_such_symbol': None}
+    with pytest.raises(gdb.error):
+        gdbp.resolve_symbols(['gdbp_no_such_symbol'])
+
+
+def test_load_symbol_map():
+    try:
+        assert gdbp.load_symbol_map(text=TEST_SYMBOL_MAP, slide=0x1000) == 3
+        assert gdbp.resolve_symbols(['gdbp_test_mapped_symbol', 'gdbp_test_module_symbol']) == {
+            'gdbp_test_mapped_symbol': 0xffffffff81002000, 'gdbp_test_module_symbol': 0xffffffffc0002000}
+    finally:
+        gdbp.clear_symbol_cache(index=True)
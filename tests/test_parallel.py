@@ -0,0 +1,57 @@
+import pytest
+
+import gdbp
+from fake_stub import FakeStub
+from fake_target import VMWARE
+
+TEST_ADDRESS = 0x100000
+TEST_PAGES = 8
+HOLE_PAGE = 5
+
+
+def _stub_with_hole():
+    stub = FakeStub()
+    for page in range(TEST_PAGES):
+        if page != HOLE_PAGE:
+            stub.map(TEST_ADDRESS + page * gdbp.PAGE_SIZE, bytes([page + 1]) * gdbp.PAGE_SIZE)
+    return stub
+
+
+def test_parallel_read(tmp_path):
+    stub = _stub_with_hole()
+    end = TEST_ADDRESS + TEST_PAGES * gdbp.PAGE_SIZE
+    hole = TEST_ADDRESS + HOLE_PAGE * gdbp.PAGE_SIZE
+    try:
+        with gdbp.ParallelReader(stub.address, connections=3, chunk=2 * gdbp.PAGE_SIZE) as reader:
+            result = reader.read(TEST_ADDRESS, end)
+            assert result['unreadable'] == [[hole, hole + gdbp.PAGE_SIZE]]
+            assert result['read'] == (TEST_PAGES - 1) * gdbp.PAGE_SIZE
+            for page in range(TEST_PAGES):
+                expected = 0 if page == HOLE_PAGE else page + 1
+                assert result['data'][page * gdbp.PAGE_SIZE] == expected
+
+            path = str(tmp_path / 'memory.bin')
+            reader.read(TEST_ADDRESS, end, path)
+            with open(path, 'rb') as dump_file:
+                assert dump_file.read() == bytes(result['data'])
+    finally:
+        stub.close()
+
+
+def test_parallel_read_physical_vmware():
+    stub = FakeStub(personality=VMWARE)
+    physical = 0x200000
+    data = bytes(range(256)) * (gdbp.PAGE_SIZE // 256)
+    # Paging on - the physical address isn't mapped as a virtual one
+    stub.target.map_virtual(0x7000000, physical, data=data)
+    try:
+        with pytest.raises(gdbp.GdbpRspError):
+            gdbp.ParallelReader(stub.address, connections=1, physical=True, vmware=False)
+
+        with gdbp.ParallelReader(stub.address, connections=2, physical=True) as reader:
+            assert reader.vmware
+            result = reader.read(physical, physical + gdbp.PAGE_SIZE)
+            assert result['unreadable'] == []
+            assert bytes(result['data']) == data
+    finally:
+        stub.close()
@@ -0,0 +1,42 @@
+import gdb
+import pytest
+
+import gdbp
+from common import TEST_VARIABLE_ADDRESS, TEST_VARIABLE_BYTES
+
+
+def test_channel_read_memory():
+    channel = gdbp.get_rsp_channel()
+    assert channel.read_memory(TEST_VARIABLE_ADDRESS, len(TEST_VARIABLE_BYTES)) == TEST_VARIABLE_BYTES
+
+
+def test_packet_framing():
+    assert gdbp.SocketRspChannel._frame(b'm1000,4') == b'$m1000,4#' + b'%02x' % (sum(b'm1000,4') & 0xFF)
+    assert gdbp.SocketRspChannel._frame(b'a#b') == b'$a}\x03b#' + b'%02x' % (sum(b'a}\x03b') & 0xFF)
+    assert gdbp.SocketRspChannel._decode(bytearray(b'0* 1}\x03')) == b'0000' + b'1#'
+
+
+class _CannedChannel(gdbp.RspChannel):
+    def __init__(self, *replies):
+        self.replies = list(replies)
+
+    def send(self, packet: str) -> bytes:
+        return self.replies.pop(0)
+
+    def receive(self) -> bytes:
+        return self.replies.pop(0)
+
+
+def test_error_replies():
+    assert gdbp.is_error_reply(b'E14')
+    assert not gdbp.is_error_reply(b'E0E1')
+    assert not gdbp.is_error_reply(b'EX1')
+    # Uppercase hex data that starts with 0xE?
+    assert _CannedChannel(b'E0E1').read_memory(0x1000, 2) == b'\xE0\xE1'
+    with pytest.raises(gdb.MemoryError):
+        _CannedChannel(b'E14').read_memory(0x1000, 2)
+
+
+def test_channel_is_abstract():
+    with pytest.raises(TypeError):
+        gdbp.RspChannel()
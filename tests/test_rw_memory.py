@@ -1,5 +1,8 @@
 import struct
 
+import gdb
+import pytest
+
 import gdbp
 from common import TEST_VARIABLE_ADDRESS, TEST_VARIABLE_BYTES
 
@@ -86,3 +89,137 @@ def test_read_int64ul():
 
 def test_read_int64sl():
     assert gdbp.read_int64sl(TEST_VARIABLE_ADDRESS) == struct.unpack_from('<q', TEST_VARIABLE_BYTES)[0]
+
+
+def test_read_bytes_cached():
+    gdbp.enable_read_cache()
+    try:
+        assert gdbp.read_bytes(TEST_VARIABLE_ADDRESS, len(TEST_VARIABLE_BYTES)) == TEST_VARIABLE_BYTES
+        assert gdbp.read_bytes(TEST_VARIABLE_ADDRESS, len(TEST_VARIABLE_BYTES)) == TEST_VARIABLE_BYTES
+        assert gdbp.READ_CACHE.hits >= 1
+    finally:
+        gdbp.disable_read_cache()
+
+
+def test_read_cache_invalidated_on_write():
+    gdbp.enable_read_cache()
+    try:
+        gdbp.read64(TEST_VARIABLE_ADDRESS)
+        gdbp.write8(TEST_VARIABLE_ADDRESS, 0x42)
+        assert gdbp.read8(TEST_VARIABLE_ADDRESS) == 0x42
+    finally:
+        gdbp.disable_read_cache()
+
+
+def test_read_many():
+    values = gdbp.read_many([(TEST_VARIABLE_ADDRESS, len(TEST_VARIABLE_BYTES)),
+                             (TEST_VARIABLE_ADDRESS + 4, '<L'),
+                             (TEST_VARIABLE_ADDRESS, '<HH')])
+    assert values == [TEST_VARIABLE_BYTES,
+                      struct.unpack_from('<L', TEST_VARIABLE_BYTES, 4)[0],
+                      struct.unpack_from('<HH', TEST_VARIABLE_BYTES)]
+
+
+def test_read_many_unreadable_page_before_readable():
+    # Merged into one run that starts in the (unmapped) page before the test variable's
+    before = TEST_VARIABLE_ADDRESS - 0x10
+    values = gdbp.read_many([(before, 8), (TEST_VARIABLE_ADDRESS, len(TEST_VARIABLE_BYTES))], skip_errors=True)
+    assert values == [None, TEST_VARIABLE_BYTES]
+
+
+def test_scan():
+    end = TEST_VARIABLE_ADDRESS + len(TEST_VARIABLE_BYTES)
+    assert list(gdbp.scan(TEST_VARIABLE_ADDRESS, end, TEST_VARIABLE_BYTES)) == [TEST_VARIABLE_ADDRESS]
+
+    signature = ' '.join('{:02X}'.format(byte) for byte in TEST_VARIABLE_BYTES[:2]) + ' ?? ?' + \
+        '{:X}'.format(TEST_VARIABLE_BYTES[3] & 0xF)
+    assert list(gdbp.scan(TEST_VARIABLE_ADDRESS, end, signature, chunk=2)) == [TEST_VARIABLE_ADDRESS]
+
+    # Matches spanning several chunks shorter than the pattern
+    for chunk in (1, 3):
+        assert list(gdbp.scan(TEST_VARIABLE_ADDRESS, end, TEST_VARIABLE_BYTES[1:7], chunk=chunk)) == \
+            [TEST_VARIABLE_ADDRESS + 1]
+
+
+def test_read_array():
+    values = gdbp.read_array(TEST_VARIABLE_ADDRESS, 4, 'u16')
+    assert list(values) == list(struct.unpack('<4H', TEST_VARIABLE_BYTES))
+
+    values = gdbp.read_array(TEST_VARIABLE_ADDRESS, 2, 'u16', stride=4)
+    assert list(values) == [struct.unpack_from('<H', TEST_VARIABLE_BYTES, 0)[0],
+                            struct.unpack_from('<H', TEST_VARIABLE_BYTES, 4)[0]]
+
+
+def test_compile_pattern():
+    length, find_all = gdbp.compile_pattern('4? ? ?5')
+    assert length == 3
+    assert list(find_all(b'\x00\x41\xAA\x35\x41\xAA\x36')) == [1]
+    for bad in ('5', '48 5', '123', 'G1'):
+        with pytest.raises(ValueError):
+            gdbp.compile_pattern(bad)
+
+
+def test_batch_writes():
+    with gdbp.batch_writes() as batch:
+        gdbp.write8(TEST_VARIABLE_ADDRESS, 0x11)
+        gdbp.write16(TEST_VARIABLE_ADDRESS + 1, 0x3322)
+        gdbp.write32(TEST_VARIABLE_ADDRESS + 3, 0x77665544)
+        assert len(batch.starts) == 1
+        assert gdbp.read64(TEST_VARIABLE_ADDRESS) == struct.unpack('<Q', b'\x11\x22\x33\x44\x55\x66\x77' +
+                                                                  TEST_VARIABLE_BYTES[7:])[0]
+    assert not gdbp.WRITE_BUFFER.starts
+    assert gdbp.read_bytes(TEST_VARIABLE_ADDRESS, 7) == b'\x11\x22\x33\x44\x55\x66\x77'
+
+
+def test_batch_writes_aborted():
+    with pytest.raises(RuntimeError):
+        with gdbp.batch_writes():
+            gdbp.write8(TEST_VARIABLE_ADDRESS, TEST_VARIABLE_BYTES[0] ^ 0xFF)
+            raise RuntimeError('abort the batch')
+    assert not gdbp.WRITE_BUFFER.starts
+    assert gdbp.read_bytes(TEST_VARIABLE_ADDRESS, len(TEST_VARIABLE_BYTES)) == TEST_VARIABLE_BYTES
+
+
+def test_batch_writes_failed_flush():
+    unmapped = TEST_VARIABLE_ADDRESS + 0x1000000
+    with gdbp.batch_writes() as batch:
+        gdbp.write8(TEST_VARIABLE_ADDRESS, 0x11)
+        gdbp.write8(unmapped, 0x22)
+        with pytest.raises(gdb.MemoryError):
+            batch.flush()
+        # Written up to the failure; the rest is still pending
+        assert batch.starts == [unmapped]
+        batch.discard()
+    assert gdbp.read8(TEST_VARIABLE_ADDRESS) == 0x11
+
+
+@pytest.mark.skipif(not hasattr(gdb, 'TARGET'), reason="Maps memory through the fake gdb")
+def test_batch_writes_failed_outermost_flush():
+    address = TEST_VARIABLE_ADDRESS + 0x2000000
+    with pytest.raises(gdb.MemoryError) as raised:
+        with gdbp.batch_writes():
+            gdbp.write8(TEST_VARIABLE_ADDRESS, 0x11)
+            gdbp.write8(address, 0x22)
+    # Nothing is left pending outside a batch - the unsent writes come with the error
+    assert raised.value.unsent_writes == [(address, b'\x22')]
+    assert not gdbp.WRITE_BUFFER.starts
+
+    # Reads match the memory again, not the dropped write
+    gdb.TARGET.map_virtual(address, 0x700000)
+    gdbp.write8(address, 0x33)
+    assert gdbp.read8(address) == 0x33
+
+
+def test_read_pieces():
+    unreadable_page = 0x3000
+
+    def read(address, length):
+        if address < unreadable_page + gdbp.PAGE_SIZE and address + length > unreadable_page:
+            raise gdb.MemoryError(f'Cannot access memory at address {hex(address)}')
+        return bytes(length)
+
+    read_pieces = gdbp.rw_memory._read_pieces
+    assert read_pieces(read, 0x1000, 0x2000) == [(0x1000, bytes(0x1000))]
+    # Inside one unreadable page - no page-by-page retry
+    assert read_pieces(read, 0x3100, 0x3200) == [(0x3100, None)]
+    assert read_pieces(read, 0x2800, 0x4100) == [(0x2800, bytes(0x800)), (0x3000, None), (0x4000, bytes(0x100))]
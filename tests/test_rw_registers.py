@@ -28,3 +28,25 @@ def test_read_register_larger_than_max_signed_value():
 def test_write_register():
     gdbp.write_register(TEST_REGISTER_NAME, TEST_REGISTER_NEW_VALUE)
     assert gdbp.read_register(TEST_REGISTER_NAME) == TEST_REGISTER_NEW_VALUE
+
+
+def test_sub_registers():
+    gdbp.set_edx(0x55667788)
+    assert gdbp.get_edx() == 0x55667788
+    assert gdbp.get_dx() == 0x7788
+    assert gdbp.get_dh() == 0x77
+    assert gdbp.get_dl() == 0x88
+
+    gdbp.set_dh(0x12)
+    assert gdbp.get_edx() == 0x55661288
+
+
+def test_register_snapshot():
+    gdbp.get_edx()
+    hits = gdbp.REGISTER_SNAPSHOT.hits
+    gdbp.get_edx()
+    assert gdbp.REGISTER_SNAPSHOT.hits > hits
+
+    gdbp.set_edx(TEST_REGISTER_NEW_VALUE)
+    assert gdbp.get_edx() == TEST_REGISTER_NEW_VALUE
+    assert gdbp.read_register(TEST_REGISTER_NAME) == TEST_REGISTER_NEW_VALUE
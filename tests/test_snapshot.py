@@ -0,0 +1,16 @@
+import gdbp
+from common import TEST_VARIABLE_ADDRESS, TEST_VARIABLE_BYTES
+
+
+def test_snapshot_diff(tmp_path):
+    ranges = [(TEST_VARIABLE_ADDRESS, len(TEST_VARIABLE_BYTES))]
+    before = gdbp.snapshot(ranges)
+    assert before.read(TEST_VARIABLE_ADDRESS, len(TEST_VARIABLE_BYTES)) == TEST_VARIABLE_BYTES
+
+    gdbp.write8(TEST_VARIABLE_ADDRESS + 2, TEST_VARIABLE_BYTES[2] ^ 0xFF)
+    after = gdbp.snapshot(ranges, base=before)
+    assert gdbp.diff(before, after) == [(TEST_VARIABLE_ADDRESS + 2, TEST_VARIABLE_ADDRESS + 3)]
+
+    on_disk = gdbp.snapshot(ranges, base=after, path=str(tmp_path / 'pages'))
+    assert gdbp.diff(after, on_disk) == []
+    on_disk.store.close()
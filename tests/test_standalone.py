@@ -0,0 +1,60 @@
+import pytest
+
+import gdbp
+from fake_stub import FakeStub
+from fake_target import QEMU_MONITOR_HELP
+
+TEST_ADDRESS = 0x10000
+TEST_BYTES = bytes(range(16))
+
+
+@pytest.fixture
+def stub():
+    fake_stub = FakeStub()
+    fake_stub.map(TEST_ADDRESS, TEST_BYTES + bytes(gdbp.PAGE_SIZE - len(TEST_BYTES)))
+    fake_stub.registers.update(rax=0x1122334455667788, cr3=0x1000, cr4=0x20)
+    channel = gdbp.SocketRspChannel(fake_stub.address)
+    yield fake_stub, channel
+    channel.close()
+    fake_stub.close()
+
+
+def test_socket_channel(stub):
+    fake_stub, channel = stub
+    assert channel.ack is False
+    assert channel.read_memory(TEST_ADDRESS, len(TEST_BYTES)) == TEST_BYTES
+    channel.write_memory(TEST_ADDRESS, b'\xAA')
+    assert fake_stub.read(TEST_ADDRESS, 1) == b'\xAA'
+    assert channel.monitor('help') == QEMU_MONITOR_HELP
+    with pytest.raises(gdbp.RspMemoryError):
+        channel.read_memory(TEST_ADDRESS + gdbp.PAGE_SIZE, 1)
+
+
+@pytest.mark.skipif(not gdbp.backend.STANDALONE, reason="GDB is loaded - the standalone backend isn't in use")
+def test_standalone_backend(stub):
+    fake_stub, channel = stub
+    gdbp.set_rsp_channel(channel)
+    try:
+        assert gdbp.read_bytes(TEST_ADDRESS, len(TEST_BYTES)) == TEST_BYTES
+        assert gdbp.get_rax() == 0x1122334455667788
+        assert gdbp.get_eax() == 0x55667788
+        assert gdbp.get_cr3() == 0x1000
+
+        gdbp.set_ax(0xBEEF)
+        assert fake_stub.registers['rax'] == 0x112233445566BEEF
+
+        with gdbp.phys_mode():
+            assert fake_stub.phys
+        assert not fake_stub.phys
+    finally:
+        gdbp.set_rsp_channel(None)
+
+
+def test_symbol_map_without_debug_info():
+    try:
+        gdbp.load_symbol_map(text='ffffffff81000000 T _text\nffffffff81001000 t gdbp_test_mapped_symbol\n')
+        assert gdbp.get_symbol_address('gdbp_test_mapped_symbol') == 0xffffffff81001000
+        assert gdbp.resolve_symbols(['_text', 'gdbp_no_such_symbol'], skip_errors=True) == {
+            '_text': 0xffffffff81000000, 'gdbp_no_such_symbol': None}
+    finally:
+        gdbp.clear_symbol_cache(index=True)
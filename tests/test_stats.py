@@ -0,0 +1,63 @@
+import json
+
+import gdb
+import gdbp
+from common import TEST_VARIABLE_ADDRESS, TEST_VARIABLE_BYTES
+
+
+def test_stats_disabled_by_default():
+    gdbp.stats.reset()
+    gdbp.read_bytes(TEST_VARIABLE_ADDRESS, len(TEST_VARIABLE_BYTES))
+    assert gdbp.stats.get_stats() == {}
+
+
+def test_stats_memory_and_registers():
+    gdbp.stats.reset()
+    gdbp.stats.enable()
+    try:
+        assert gdbp.read_bytes(TEST_VARIABLE_ADDRESS, len(TEST_VARIABLE_BYTES)) == TEST_VARIABLE_BYTES
+        gdb.execute('flushregs')
+        gdbp.REGISTER_SNAPSHOT.invalidate()
+        gdbp.get_rdx()
+    finally:
+        gdbp.stats.disable()
+
+    stats = gdbp.stats.get_stats()
+    assert stats['read_memory']['calls'] == 1
+    assert stats['read_memory']['bytes'] == len(TEST_VARIABLE_BYTES)
+    # GDB answers the reads of a fetch from one 'g' packet, so it is recorded once
+    assert stats['fetch_registers']['calls'] == 1
+    assert 'read_register' not in stats
+    assert sum(stats['read_memory']['histogram'].values()) == 1
+    assert 'read_memory' in gdbp.stats.format_table()
+    assert json.loads(gdbp.stats.to_json()) == stats
+
+    # Disabled again - nothing more is recorded
+    gdbp.read_bytes(TEST_VARIABLE_ADDRESS, len(TEST_VARIABLE_BYTES))
+    assert gdbp.stats.get_stats()['read_memory']['calls'] == 1
+
+
+def test_stats_trace(tmp_path):
+    gdbp.stats.reset()
+    gdbp.stats.enable(trace=True)
+    try:
+        gdbp.get_rsp_channel().send('qSupported')
+        assert gdbp.splice('[a]', '[', ']') == 'a'
+    finally:
+        gdbp.stats.disable()
+
+    trace = gdbp.stats.get_trace()
+    assert [entry[1] for entry in trace] == ['packet', 'parse']
+    assert trace[0][2] == 'qSupported'
+    assert gdbp.stats.get_stats()['packet']['bytes'] > len('qSupported')
+    # The text parsing is timed too
+    assert gdbp.stats.get_stats()['parse']['bytes'] == len('[a]')
+
+    path = str(tmp_path / 'trace.log')
+    gdb.execute(f'gdbp-stats trace {path}')
+    try:
+        gdbp.get_rsp_channel().send('qSupported')
+    finally:
+        gdb.execute('gdbp-stats off')
+    with open(path) as trace_file:
+        assert ' packet qSupported ' in trace_file.read()
@@ -0,0 +1,45 @@
+import struct
+
+import gdbp
+from common import TEST_VARIABLE_ADDRESS, TEST_VARIABLE_BYTES
+
+TEST_STRUCT = gdbp.Struct('test_struct', [
+    ('low', 0, 'u32'),
+    ('high', 4, 's32'),
+    ('as_bytes', 0, 'u8', 8),
+    ('first_word_big', 0, 'u16', None, True),
+    ('as_string', 0, 'char', 8),
+])
+
+TEST_OUTER_STRUCT = gdbp.Struct('test_outer_struct', [
+    ('inner', 0, TEST_STRUCT),
+    ('pointer', 0, gdbp.Pointer()),
+])
+
+
+def test_struct_read():
+    value = TEST_STRUCT.read(TEST_VARIABLE_ADDRESS)
+    assert value.low == struct.unpack_from('<L', TEST_VARIABLE_BYTES)[0]
+    assert value.high == struct.unpack_from('<l', TEST_VARIABLE_BYTES, 4)[0]
+    assert value.as_bytes == tuple(TEST_VARIABLE_BYTES)
+    assert value.first_word_big == struct.unpack_from('>H', TEST_VARIABLE_BYTES)[0]
+    assert value.as_string == TEST_VARIABLE_BYTES
+
+
+def test_struct_nested_and_pointer():
+    value = TEST_OUTER_STRUCT.read(TEST_VARIABLE_ADDRESS)
+    assert value.inner.low == struct.unpack_from('<L', TEST_VARIABLE_BYTES)[0]
+    assert int(value.pointer) == struct.unpack_from('<Q', TEST_VARIABLE_BYTES)[0]
+    assert value._asdict()['inner']['as_string'] == TEST_VARIABLE_BYTES
+
+
+def test_struct_big_endian_pointer():
+    big_struct = gdbp.Struct('test_big_struct', [
+        ('pointer', 0, gdbp.Pointer('u32')),
+        ('little_pointer', 8, gdbp.Pointer('u32'), None, False),
+    ], big=True)
+    value = big_struct.unpack(struct.pack('>Q', TEST_VARIABLE_ADDRESS) + struct.pack('<Q', TEST_VARIABLE_ADDRESS))
+    assert int(value.pointer) == TEST_VARIABLE_ADDRESS
+    # The pointee is decoded in the byte order of the pointer field
+    assert value.pointer.deref() == struct.unpack_from('>L', TEST_VARIABLE_BYTES)[0]
+    assert value.little_pointer.deref() == struct.unpack_from('<L', TEST_VARIABLE_BYTES)[0]